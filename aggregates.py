@@ -0,0 +1,104 @@
+import os
+
+from storage import TOTALS_SUFFIX, SidecarIndex, expense_cell, read_json
+
+
+def to_cents(amount):
+    return round(float(amount) * 100)
+
+
+class AggregateIndex(SidecarIndex):
+    # Totals in cents and row counts per "YYYY-MM" and category, kept next to the ledger.
+    key = "totals"
+    suffix = TOTALS_SUFFIX
+
+    def __init__(self, totals=None, source=None):
+        self.totals = totals if totals is not None else {}
+        self.source = source
+        self.dirty = False
+
+    @classmethod
+    def from_rows(cls, expenses):
+        index = cls()
+        for month_key, category, cents in expenses.iter_cells():
+            index.add_cell(month_key, category, cents)
+        return index
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(content["totals"])
+
+    def to_content(self):
+        return {"totals": self.totals}
+
+    def add(self, expense, sign=1):
+        cell = expense_cell(expense)
+        if cell is None:
+            return False
+        self.add_cell(*cell, sign)
+        return True
+
+    def add_cell(self, month_key, category, cents, sign=1):
+        categories = self.totals.setdefault(month_key, {})
+        cell = categories.setdefault(category, [0, 0])
+        cell[0] += sign * cents
+        cell[1] += sign
+        if cell[1] == 0:
+            del categories[category]
+            if not categories:
+                del self.totals[month_key]
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        if old_expense is not None:
+            self.add(old_expense, sign=-1)
+        if new_expense is not None:
+            self.add(new_expense)
+
+    def cents(self, month_key, category=None):
+        categories = self.totals.get(month_key, {})
+        if category is not None:
+            return categories.get(category, [0, 0])[0]
+        return sum(cell[0] for cell in categories.values())
+
+    def total(self, month=None, category=None, year=None):
+        if month is not None and year is not None:
+            # One month of one year is a single cell lookup, which is what every budget check asks for.
+            return round(self.cents(f"{year:04d}-{month:02d}", category) / 100, 2)
+        cents = 0
+        for month_key, categories in self.totals.items():
+            if (year is not None) and (int(month_key[:4]) != year):
+                continue
+            if (month is not None) and (int(month_key[5:]) != month):
+                continue
+            if category is not None:
+                cents += categories.get(category, [0, 0])[0]
+            else:
+                cents += sum(cell[0] for cell in categories.values())
+        return round(cents / 100, 2)
+
+    def diff(self, other):
+        mismatches = []
+        for month_key in sorted(set(self.totals) | set(other.totals)):
+            categories = self.totals.get(month_key, {})
+            other_categories = other.totals.get(month_key, {})
+            for category in sorted(set(categories) | set(other_categories), key=str):
+                cell = categories.get(category, [0, 0])
+                other_cell = other_categories.get(category, [0, 0])
+                if list(cell) != list(other_cell):
+                    mismatches.append((month_key, category, cell, other_cell))
+        return mismatches
+
+
+def rebuild_index(expenses):
+    index = expenses.cache["totals"] = AggregateIndex.build(expenses)
+    expenses.commit()
+    return index
+
+def check_index(expenses):
+    path = AggregateIndex.index_path(expenses)
+    if not os.path.exists(path):
+        return None
+    content = read_json(path)
+    stored = AggregateIndex(content.get("totals", {}), content.get("source"))
+    return stored.diff(AggregateIndex.build(expenses))
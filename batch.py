@@ -0,0 +1,54 @@
+import json
+import shlex
+
+from storage import session
+
+
+def parse_batch_line(line):
+    # Returns the argv for one line, or None for blank lines and comments.
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line[0] not in "[{":
+        try:
+            return shlex.split(line)
+        except ValueError as e:
+            raise ValueError(f"Could not parse the command: {e}")
+    try:
+        command = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(command, list) and all(isinstance(arg, str) for arg in command):
+        return command
+    if isinstance(command, dict) and isinstance(command.get("command"), str):
+        argv = [command["command"]]
+        for option, value in command.items():
+            if option == "command" or value is None or value is False:
+                continue
+            argv.append(f"--{option}")
+            if value is not True:
+                argv.append(str(value))
+        return argv
+    raise ValueError('Expected a list of arguments or an object with a "command" key.')
+
+
+def run_batch(lines, execute, output, flush_every=None):
+    ran, failed, flushes = 0, 0, 0
+    with session() as current:
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                argv = parse_batch_line(line)
+            except ValueError as e:
+                result = {"code": 1, "stdout": "", "stderr": f"[ERROR] Input error: {e}\n"}
+                argv = []
+            else:
+                if argv is None:
+                    continue
+                result = execute(argv)
+            ran += 1
+            failed += result["code"] != 0
+            output.write(json.dumps({"line": line_number, "argv": argv, **result}) + "\n")
+            if flush_every and ran % flush_every == 0:
+                flushes += bool(current.flush())
+        flushes += bool(current.dirty)
+    return ran, failed, flushes
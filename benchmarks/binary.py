@@ -0,0 +1,82 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.generator import FIRST_YEAR, iter_generated, write_ledger
+from storage import open_storage
+
+
+def measure(function, repeat, setup=None):
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load(path, storage):
+    expenses = open_storage(path, storage)
+    count = expenses.count()
+    expenses.close()
+    return count
+
+
+def scan(path, storage, function):
+    # A fresh store per run, so every case pays for opening (and, for JSON, parsing) the ledger.
+    expenses = open_storage(path, storage)
+    result = function(expenses)
+    expenses.close()
+    return result
+
+
+def summary(expenses):
+    return sum(cents for _, _, cents in expenses.iter_cells())
+
+
+def filtered_list(expenses):
+    start, end = date(FIRST_YEAR + 2, 1, 1), date(FIRST_YEAR + 2, 12, 31)
+    return [expense_id for expense_id, _ in expenses.iter_expenses(category="Rent", start=start, end=end)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON ledger with the memory-mapped binary ledger")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = {"json": os.path.join(directory, "expenses.json"), "binary": os.path.join(directory, "expenses.bin")}
+        write_ledger(paths["json"], args.rows)
+        binary = open_storage(paths["binary"], "binary")
+        for expense_id, expense in iter_generated(args.rows):
+            binary.put(expense_id, expense)
+        binary.commit()
+        binary.close()
+
+        sizes = {storage: os.path.getsize(path) for storage, path in paths.items()}
+        print(f"rows: {args.rows}")
+        print(f"{'file size':<16} json {sizes['json'] / 2**20:9.1f} MiB  binary {sizes['binary'] / 2**20:7.1f} MiB  x{sizes['json'] / sizes['binary']:5.1f}")
+        cases = [
+            ("load", lambda storage: load(paths[storage], storage)),
+            ("summary", lambda storage: scan(paths[storage], storage, summary)),
+            ("filtered list", lambda storage: scan(paths[storage], storage, filtered_list)),
+        ]
+        for name, case in cases:
+            json_time, json_result = measure(lambda: case("json"), args.repeat)
+            binary_time, binary_result = measure(lambda: case("binary"), args.repeat)
+            status = "ok" if json_result == binary_result else "MISMATCH"
+            print(f"{name:<16} json {json_time * 1000:9.1f} ms   binary {binary_time * 1000:7.1f} ms   x{json_time / binary_time:5.1f}  {status}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
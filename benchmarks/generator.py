@@ -0,0 +1,48 @@
+import json
+import random
+from datetime import date
+
+from storage import DATE_FORMAT, open_storage
+
+CATEGORIES = ["Food", "Transport", "Rent", "Health", "Travel", "Leisure", "Uncategorized"]
+FIRST_YEAR = 2015
+
+
+def get_categories(count=len(CATEGORIES)):
+    return CATEGORIES[:count] + [f"Category {i}" for i in range(len(CATEGORIES), count)]
+
+
+def iter_generated(rows, seed=0, years=10, categories=len(CATEGORIES)):
+    # Same seed, same ledger: baselines stay comparable across runs and machines.
+    rng = random.Random(seed)
+    names = get_categories(categories)
+    start = date(FIRST_YEAR, 1, 1).toordinal()
+    days = date(FIRST_YEAR + years, 1, 1).toordinal() - start
+    for expense_id in range(1, rows + 1):
+        yield str(expense_id), {
+            "date": date.fromordinal(start + rng.randrange(days)).strftime(DATE_FORMAT),
+            "description": f"Expense {expense_id}",
+            "amount": round(rng.uniform(1, 500), 2),
+            "category": rng.choice(names),
+        }
+
+
+def generate_expenses(rows, seed=0, years=10, categories=len(CATEGORIES)):
+    return dict(iter_generated(rows, seed, years, categories))
+
+
+def write_ledger(expenses_path, rows, seed=0, years=10, categories=len(CATEGORIES), storage="json"):
+    # JSON ledgers are streamed to disk, so even 10M rows never sit in memory at once. Other backends have their
+    # own layout (a partitioned ledger is the "expenses/" directory next to "expenses.json"), so they go through it.
+    if storage not in ("json", "journal"):
+        expenses = open_storage(expenses_path, storage)
+        for expense_id, expense in iter_generated(rows, seed, years, categories):
+            expenses.put(expense_id, expense)
+        expenses.commit()
+        expenses.close()
+        return
+    with open(expenses_path, "w", encoding="utf-8") as file:
+        file.write("{")
+        for expense_id, expense in iter_generated(rows, seed, years, categories):
+            file.write(f'{"," if expense_id != "1" else ""}\n    {json.dumps(expense_id)}: {json.dumps(expense)}')
+        file.write("\n}")
@@ -0,0 +1,113 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generator import write_ledger
+from benchmarks.suite import DEFAULT_THRESHOLD, SCRIPT_PATH, find_regressions
+from storage import read_json, write_json
+
+DEFAULT_REPEAT = 20
+DEFAULT_ROWS = 100
+TOP_IMPORTS = 10
+
+
+def startup_cases(expenses_path, budget_path, export_path):
+    paths = ["--expenses_path", expenses_path, "--budget_path", budget_path]
+    return [
+        ("--help", ["--help"]),
+        ("summary", ["summary"] + paths),
+        ("summary --month 3", ["summary", "--month", "3"] + paths),
+        ("list --limit 10", ["list", "--limit", "10"] + paths),
+        ("add", ["add", "--description", "Startup", "--amount", "1"] + paths),
+        ("report", ["report", "--workers", "1"] + paths),
+        ("export", ["export", "--file-path", export_path] + paths),
+    ]
+
+
+def run_cli(argv, python_options=()):
+    environment = dict(os.environ, EXPENSE_TRACKER_NO_DAEMON="1")
+    environment.pop("EXPENSE_TRACKER_PROFILE", None)
+    # Real installs cache bytecode; without it every run would also time compiling each module.
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *python_options, SCRIPT_PATH] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=environment, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed: {result.stderr.strip()}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(output):
+    # "import time: self [us] | cumulative | imported package", one line per module, nested ones indented.
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_time), int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2))
+    return modules
+
+
+def imported_modules(argv):
+    return {name for name, _, _, _ in parse_importtime(run_cli(argv, ["-X", "importtime"])[1])}
+
+
+def measure_startup(argv, repeat):
+    # Wall time comes from plain runs (best of repeat); -X importtime adds its own overhead, so it only runs once.
+    seconds = min(run_cli(argv)[0] for _ in range(repeat))
+    return seconds, parse_importtime(run_cli(argv, ["-X", "importtime"])[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start latency of expense-tracker.py, with a python -X importtime breakdown")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Size of the ledger the commands run on")
+    parser.add_argument("--top", type=int, default=TOP_IMPORTS, help="Show this many of the slowest imports per command")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against this JSON file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown ratio against the baseline")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="expense-startup-")
+    try:
+        expenses_path = os.path.join(directory, "expenses.json")
+        budget_path = os.path.join(directory, "budgets.json")
+        write_ledger(expenses_path, args.rows)
+        write_json({str(month): 1000.0 for month in range(1, 13)}, budget_path)
+        interpreter = min(run_python_empty() for _ in range(args.repeat))
+        print(f"{'python -c pass':<20} {interpreter * 1000:8.1f} ms")
+        results = {}
+        for name, argv in startup_cases(expenses_path, budget_path, os.path.join(directory, "export.csv")):
+            seconds, modules = measure_startup(argv, args.repeat)
+            results[f"startup {name}"] = {"seconds": seconds, "peak_bytes": None}
+            imports = sum(self_time for _, self_time, _, _ in modules) / 1000
+            print(f"{name:<20} {seconds * 1000:8.1f} ms  ({(seconds - interpreter) * 1000:6.1f} ms over the interpreter,"
+                  f" {len(modules)} modules imported in {imports:.1f} ms)")
+            for module, self_time, cumulative, _ in sorted(modules, key=lambda module: -module[1])[:args.top]:
+                print(f"    {module:<28} {self_time / 1000:6.2f} ms self {cumulative / 1000:8.2f} ms cumulative")
+    finally:
+        shutil.rmtree(directory)
+    if args.save_baseline:
+        write_json(results, args.save_baseline)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = find_regressions(results, read_json(args.baseline), args.threshold)
+        for key, metric, expected, actual in regressions:
+            print(f"[REGRESSION] {key}: {metric} {expected:.4g} -> {actual:.4g} (x{actual / expected:.2f})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold x{args.threshold})")
+
+
+def run_python_empty():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
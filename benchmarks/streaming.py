@@ -0,0 +1,79 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import storage
+from benchmarks.generator import FIRST_YEAR, write_ledger
+from commands import export_expenses, iter_list_lines, show_summary
+from storage import DATES_SUFFIX, TOTALS_SUFFIX
+
+DEFAULT_ROWS = [100_000, 400_000, 1_600_000]
+MODES = ("loaded", "streamed")
+CASES = ("summary --from --to", "list --category", "export")
+
+
+def run_case(mode, case, expenses_path, export_path):
+    # The threshold decides between json.load and the row-by-row reader; everything else is the same code path.
+    storage.STREAM_MIN_BYTES = 0 if mode == "streamed" else float("inf")
+    match case:
+        case "summary --from --to":
+            show_summary(expenses_path, start=date(FIRST_YEAR + 2, 1, 1), end=date(FIRST_YEAR + 2, 12, 31))
+        case "list --category":
+            for _ in iter_list_lines(expenses_path, category="Rent"):
+                pass
+        case "export":
+            export_expenses(expenses_path, export_path)
+
+
+def measure_child(mode, case, expenses_path, export_path):
+    # A fresh interpreter per run, so one case's peak RSS is not hidden behind another's, and no index left by
+    # an earlier run to skip the scan.
+    for suffix in (TOTALS_SUFFIX, DATES_SUFFIX):
+        if os.path.exists(expenses_path + suffix):
+            os.remove(expenses_path + suffix)
+    arguments = [sys.executable, "-m", "benchmarks.streaming", "--child", mode, case, expenses_path, export_path]
+    start = time.perf_counter()
+    process = subprocess.Popen(arguments, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    error = process.stderr.read().decode(errors="replace").strip()
+    process.stderr.close()
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"{mode} {case} failed: {error}")
+    return elapsed, usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of read-only commands with the JSON ledger loaded whole or streamed")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "CASE", "LEDGER", "EXPORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_case(*args.child)
+        return
+    if not hasattr(os, "wait4"):
+        parser.error("measuring peak RSS needs os.wait4(), which this platform lacks")
+
+    directory = tempfile.mkdtemp()
+    try:
+        print(f"{'case':<20} {'rows':>10} {'file MiB':>9} {'loaded MiB':>11} {'streamed MiB':>13} {'loaded s':>9} {'streamed s':>11}")
+        for rows in args.rows:
+            expenses_path = os.path.join(directory, f"expenses-{rows}.json")
+            export_path = os.path.join(directory, "export.csv")
+            write_ledger(expenses_path, rows)
+            size = os.path.getsize(expenses_path) / 2**20
+            for case in CASES:
+                results = {mode: measure_child(mode, case, expenses_path, export_path) for mode in MODES}
+                print(f"{case:<20} {rows:>10} {size:>9.1f} {results['loaded'][1] / 2**20:>11.1f} {results['streamed'][1] / 2**20:>13.1f}"
+                      f" {results['loaded'][0]:>9.2f} {results['streamed'][0]:>11.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
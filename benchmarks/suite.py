@@ -0,0 +1,218 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aggregates import AggregateIndex
+from benchmarks.binary import measure
+from benchmarks.generator import CATEGORIES, write_ledger
+from commands import add_expense, check_if_budget_exceed, delete_expense, export_expenses, iter_list_lines, show_summary
+from storage import STORAGE_MODES, open_storage, read_json, write_json
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000]
+DEFAULT_THRESHOLD = 1.5
+LEDGER_NAMES = {"sqlite": "expenses.db", "binary": "expenses.bin"}
+# Cases that add rows; the rows are deleted again before the next run, so every run and case sees the generated ledger.
+WRITE_CASES = {"add_expense", "cli add"}
+# Regressions smaller than this are timer noise, whatever the ratio.
+MIN_REGRESSION_SECONDS = 0.005
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "expense-tracker.py")
+
+
+def function_cases(expenses_path, budget_path, export_path, storage):
+    def budget_check():
+        return check_if_budget_exceed(budget_path, AggregateIndex.load(open_storage(expenses_path, storage)), month=3)
+
+    return [
+        ("add_expense", lambda: add_expense(expenses_path, budget_path, "Benchmark", 12.5, "Food", storage=storage)),
+        ("list_expenses", lambda: sum(1 for _ in iter_list_lines(expenses_path, storage=storage))),
+        ("list_expenses --sort amount --limit 100", lambda: sum(1 for _ in iter_list_lines(expenses_path, storage=storage, limit=100, sort="amount", reverse=True))),
+        ("show_summary --month 3", lambda: show_summary(expenses_path, month=3, storage=storage)),
+        ("export_expenses", lambda: export_expenses(expenses_path, export_path, storage=storage)),
+        ("check_if_budget_exceed", budget_check),
+    ]
+
+
+def command_cases(expenses_path, budget_path, export_path, storage):
+    paths = ["--storage", storage, "--expenses_path", expenses_path, "--budget_path", budget_path]
+    return [
+        ("cli add", ["add", "--description", "Benchmark", "--amount", "12.5", "--category", "Food"] + paths),
+        ("cli list", ["list"] + paths),
+        ("cli list --sort amount --limit 100", ["list", "--sort", "amount", "--reverse", "--limit", "100"] + paths),
+        ("cli summary --month 3", ["summary", "--month", "3"] + paths),
+        ("cli export", ["export", "--file-path", export_path] + paths),
+    ]
+
+
+def peak_memory(function, setup=None):
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_command(argv):
+    # wait4() gives the peak RSS of this child alone; it is missing on Windows.
+    environment = dict(os.environ, EXPENSE_TRACKER_NO_DAEMON="1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SCRIPT_PATH] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=environment)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    else:
+        process.wait()
+        elapsed = time.perf_counter() - start
+        peak = None
+    error = process.stderr.read().decode(errors="replace").strip()
+    process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"{argv[0]} failed: {error}")
+    return elapsed, peak
+
+
+def start_launcher():
+    # A child's peak RSS includes whatever its parent held when it forked, so the CLI runs are
+    # started from a small helper process launched before any ledger is loaded here.
+    return subprocess.Popen([sys.executable, "-m", "benchmarks.suite", "--launcher"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def launch(launcher, argv):
+    launcher.stdin.write(json.dumps(argv) + "\n")
+    launcher.stdin.flush()
+    response = json.loads(launcher.stdout.readline())
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response["seconds"], response["peak_bytes"]
+
+
+def serve_launcher():
+    for line in sys.stdin:
+        try:
+            seconds, peak = run_command(json.loads(line))
+            response = {"seconds": seconds, "peak_bytes": peak}
+        except RuntimeError as e:
+            response = {"error": str(e)}
+        print(json.dumps(response), flush=True)
+
+
+def run_suite(rows_list, storage="json", repeat=3, seed=0, years=10, categories=len(CATEGORIES), end_to_end=True, report=print):
+    results = {}
+    launcher = start_launcher() if end_to_end else None
+    try:
+        for rows in rows_list:
+            run_size(results, launcher, rows, storage, repeat, seed, years, categories, report)
+    finally:
+        if launcher is not None:
+            launcher.stdin.close()
+            launcher.wait()
+    return results
+
+
+def run_size(results, launcher, rows, storage, repeat, seed, years, categories, report):
+    work_dir = tempfile.mkdtemp(prefix="expense-bench-")
+    try:
+        expenses_path = os.path.join(work_dir, LEDGER_NAMES.get(storage, "expenses.json"))
+        budget_path = os.path.join(work_dir, "budgets.json")
+        export_path = os.path.join(work_dir, "export.csv")
+        start = time.perf_counter()
+        write_ledger(expenses_path, rows, seed, years, categories, storage)
+        write_json({str(month): 1000.0 for month in range(1, 13)}, budget_path)
+        report(f"rows: {rows}  storage: {storage}  generated in {time.perf_counter() - start:.1f} s")
+        undo = functools.partial(undo_writes, expenses_path, storage, next_expense_id(expenses_path, storage))
+        for name, function in function_cases(expenses_path, budget_path, export_path, storage):
+            setup = undo if name in WRITE_CASES else None
+            seconds, _ = measure(function, repeat, setup)
+            record(results, report, f"{storage} {name} @ {rows}", name, rows, seconds, peak_memory(function, setup))
+            if setup is not None:
+                setup()
+        if launcher is not None:
+            for name, argv in command_cases(expenses_path, budget_path, export_path, storage):
+                runs = []
+                for _ in range(repeat):
+                    runs.append(launch(launcher, argv))
+                    if name in WRITE_CASES:
+                        undo()
+                record(results, report, f"{storage} {name} @ {rows}", name, rows, min(run[0] for run in runs), max(run[1] or 0 for run in runs) or None)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def next_expense_id(expenses_path, storage):
+    expenses = open_storage(expenses_path, storage)
+    try:
+        return expenses.next_id()
+    finally:
+        expenses.close()
+
+
+def undo_writes(expenses_path, storage, first_id):
+    # Deleting goes through the indexes like any write, so they stay valid and the next run does not rebuild them.
+    for expense_id in range(first_id, next_expense_id(expenses_path, storage)):
+        delete_expense(expenses_path, expense_id, storage=storage)
+
+
+def record(results, report, key, name, rows, seconds, peak):
+    results[key] = {"seconds": seconds, "peak_bytes": peak}
+    memory = f"{peak / 2**20:8.1f} MiB" if peak is not None else "       n/a"
+    report(f"  {name:<40} {seconds * 1000:10.1f} ms {rows / seconds:14,.0f} rows/s {memory}")
+
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        if result["seconds"] > reference["seconds"] * threshold and result["seconds"] - reference["seconds"] > MIN_REGRESSION_SECONDS:
+            regressions.append((key, "time", reference["seconds"], result["seconds"]))
+        if result["peak_bytes"] and reference.get("peak_bytes") and result["peak_bytes"] > reference["peak_bytes"] * threshold:
+            regressions.append((key, "memory", reference["peak_bytes"], result["peak_bytes"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the expense commands on generated ledgers")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Ledger sizes to generate (1k to 10M)")
+    parser.add_argument("--storage", type=str, choices=STORAGE_MODES, default="json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--categories", type=int, default=len(CATEGORIES))
+    parser.add_argument("--no-cli", action="store_true", help="Skip the end-to-end runs of expense-tracker.py")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against this JSON file and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown (or memory growth) ratio against the baseline")
+    parser.add_argument("--launcher", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.launcher:
+        serve_launcher()
+        return
+    results = run_suite(args.rows, args.storage, args.repeat, args.seed, args.years, args.categories, not args.no_cli)
+    if args.save_baseline:
+        write_json(results, args.save_baseline)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = find_regressions(results, read_json(args.baseline), args.threshold)
+        for key, metric, expected, actual in regressions:
+            print(f"[REGRESSION] {key}: {metric} {expected:.4g} -> {actual:.4g} (x{actual / expected:.2f})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold x{args.threshold})")
+
+
+if __name__ == "__main__":
+    main()
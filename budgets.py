@@ -0,0 +1,168 @@
+from datetime import date, timedelta
+
+from aggregates import to_cents
+from dateindex import day_ordinal
+from storage import DAYS_SUFFIX, SidecarIndex
+
+RULES_KEY = "rules"
+ALL_CATEGORIES = "*"
+CALENDAR_PERIODS = ("month", "quarter")
+MAX_WINDOW_DAYS = 366
+
+
+def parse_period(period):
+    # "month" and "quarter" are calendar periods; "7d", "30d", ... are rolling windows of that many days ending today.
+    if period in CALENDAR_PERIODS:
+        return period
+    if isinstance(period, str) and period.endswith("d") and period[:-1].isdigit() and 1 <= int(period[:-1]) <= MAX_WINDOW_DAYS:
+        return int(period[:-1])
+    raise ValueError(f"Invalid budget period: {period} (expected month, quarter or a number of days up to {MAX_WINDOW_DAYS}d, e.g. 7d)")
+
+def has_rolling_rules(rules):
+    return any(isinstance(parse_period(period), int) for periods in rules.values() for period in periods)
+
+def period_bounds(length, day):
+    # The calendar month or quarter holding `day`, or the rolling window ending on it.
+    if length == "month":
+        start = day.replace(day=1)
+        end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    elif length == "quarter":
+        start = date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+        end = (start + timedelta(days=92)).replace(day=1) - timedelta(days=1)
+    else:
+        start, end = day - timedelta(days=length - 1), day
+    return start, end
+
+def describe_rule(category, length, start):
+    scope = "all categories" if category == ALL_CATEGORIES else category
+    if length == "month":
+        return f"{scope} in {start.year:04d}-{start.month:02d}"
+    if length == "quarter":
+        return f"{scope} in Q{(start.month - 1) // 3 + 1} {start.year}"
+    return f"{scope} over the last {length} days"
+
+def rule_usage(totals, days, category, length, start, end):
+    # Calendar periods come from the monthly totals (one or three cells); rolling windows from the day index.
+    if isinstance(length, int):
+        return days.window_total(category, length, end.toordinal())
+    category = None if category == ALL_CATEGORIES else category
+    months = 1 if length == "month" else 3
+    return sum(totals.cents(f"{start.year:04d}-{month:02d}", category) for month in range(start.month, start.month + months))
+
+def check_rules(rules, totals, days, touched, today):
+    # touched holds the (category, day) of every expense a write added or raised. Only rules on those categories
+    # (or on every category) whose period holds the day are evaluated, each period once.
+    warnings = []
+    checked = set()
+    for category, day in touched:
+        for rule_category in (category, ALL_CATEGORIES):
+            for period, amount in rules.get(rule_category, {}).items():
+                length = parse_period(period)
+                start, end = period_bounds(length, today if isinstance(length, int) else day)
+                if not start <= day <= end or (rule_category, period, start) in checked:
+                    continue
+                checked.add((rule_category, period, start))
+                cents = rule_usage(totals, days, rule_category, length, start, end)
+                if cents > to_cents(amount):
+                    warnings.append(f"[WARN] You exceeded the budget for {describe_rule(rule_category, length, start)}"
+                                    f" (${cents / 100:.2f} of ${float(amount):.2f})")
+    return warnings
+
+def day_cell(expense):
+    day = day_ordinal(expense.get("date"))
+    if day is None:
+        return None
+    try:
+        cents = to_cents(expense["amount"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return day, expense.get("category"), cents
+
+
+class RollingWindow:
+    # Running total of one category (or all of them) over the `length` days ending on `end`.
+
+    def __init__(self, days, category, length, end):
+        self.category = category
+        self.length = length
+        self.end = end
+        self.cents = sum(days.day_total(day, category) for day in range(end - length + 1, end + 1))
+
+    def covers(self, day):
+        return self.end - self.length < day <= self.end
+
+    def slide(self, days, end):
+        # Each day entering the window is added and the one leaving it subtracted; jumping back or past a whole window starts over.
+        if end < self.end or end - self.end >= self.length:
+            self.__init__(days, self.category, self.length, end)
+            return
+        for day in range(self.end + 1, end + 1):
+            self.cents += days.day_total(day, self.category) - days.day_total(day - self.length, self.category)
+        self.end = end
+
+
+class DayIndex(SidecarIndex):
+    # Totals in cents per day ordinal and category, kept next to the ledger for rolling-window budgets.
+    # Windows opened by window_total() stay in memory and apply() adjusts the ones covering the changed day,
+    # so a long-running process (serve, batch) never re-adds a window from scratch. Writers create it only while a
+    # rolling budget exists.
+    key = "days"
+    suffix = DAYS_SUFFIX
+
+    def __init__(self, days=None, source=None):
+        self.days = days if days is not None else {}
+        self.source = source
+        self.windows = {}
+        self.dirty = False
+
+    @classmethod
+    def from_rows(cls, expenses):
+        index = cls()
+        for _, expense in expenses.iter_expenses():
+            cell = day_cell(expense)
+            if cell is not None:
+                index.add_cell(*cell)
+        return index
+
+    @classmethod
+    def from_content(cls, content):
+        return cls({int(day): categories for day, categories in content["days"].items()})
+
+    def to_content(self):
+        return {"days": self.days}
+
+    def day_total(self, day, category):
+        categories = self.days.get(day)
+        if not categories:
+            return 0
+        if category == ALL_CATEGORIES:
+            return sum(categories.values())
+        return categories.get(category, 0)
+
+    def add_cell(self, day, category, cents, sign=1):
+        categories = self.days.setdefault(day, {})
+        categories[category] = categories.get(category, 0) + sign * cents
+        if categories[category] == 0:
+            del categories[category]
+            if not categories:
+                del self.days[day]
+        for window_category in (category, ALL_CATEGORIES):
+            for window in self.windows.get(window_category, {}).values():
+                if window.covers(day):
+                    window.cents += sign * cents
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        for expense, sign in ((old_expense, -1), (new_expense, 1)):
+            cell = day_cell(expense) if expense is not None else None
+            if cell is not None:
+                self.add_cell(*cell, sign)
+
+    def window_total(self, category, length, end):
+        windows = self.windows.setdefault(category, {})
+        window = windows.get(length)
+        if window is None:
+            window = windows[length] = RollingWindow(self, category, length, end)
+        else:
+            window.slide(self, end)
+        return window.cents
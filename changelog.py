@@ -0,0 +1,61 @@
+from storage import CHANGES_SUFFIX, SidecarIndex
+
+
+class ChangeLog(SidecarIndex):
+    # The net operation on each expense ID since the last `export --since-last`, stamped with the sequence number
+    # of its latest change. An ID inserted and deleted in between drops out; one deleted and inserted again is an update.
+    # The first delta export starts the log; from then on every write keeps it up to date.
+    key = "changes"
+    suffix = CHANGES_SUFFIX
+
+    def __init__(self, changes=None, sequence=0, watermark=0, complete=True, source=None):
+        self.changes = changes if changes is not None else {}
+        self.sequence = sequence
+        self.watermark = watermark
+        # False when the ledger may have changed behind the log's back, so the next export has to be a full snapshot.
+        self.complete = complete
+        self.source = source
+        self.dirty = False
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(content["changes"], content["sequence"], content["watermark"], content["complete"])
+
+    @classmethod
+    def outdated(cls, expenses, content):
+        # A log cannot be rebuilt from the ledger: what it recorded is kept, but the next export is a full snapshot.
+        # It is only loaded under the ledger lock, so from here on it follows the ledger as it is now.
+        log = cls.from_content(content) if content.get("version") == cls.version else cls()
+        log.source, log.complete = expenses.identity(), False
+        return log
+
+    def to_content(self):
+        return {"sequence": self.sequence, "watermark": self.watermark, "complete": self.complete, "changes": self.changes}
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        self.sequence += 1
+        expense_id = str(expense_id)
+        previous = self.changes.get(expense_id, [0, None])[1]
+        if old_expense is None:
+            operation = "update" if previous == "delete" else "insert"
+        elif new_expense is None:
+            if previous == "insert":
+                del self.changes[expense_id]
+                return
+            operation = "delete"
+        else:
+            operation = "insert" if previous == "insert" else "update"
+        self.changes[expense_id] = [self.sequence, operation]
+
+    def pending(self):
+        # (id, operation, sequence) in the order the changes were made.
+        return [(expense_id, operation, sequence) for expense_id, (sequence, operation)
+                in sorted(self.changes.items(), key=lambda item: item[1][0])]
+
+    def advance(self):
+        # Everything up to the current sequence has been exported.
+        self.watermark = self.sequence
+        self.changes = {}
+        self.complete = True
+        self.dirty = True
@@ -0,0 +1,400 @@
+import argparse
+import io
+import os
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime
+import daemon
+import profiling
+from storage import DEFAULT_STORAGE, STORAGE_MODES, json_cache_stats
+
+DEFAULT_EXPENSES_PATH = "data/expenses.json"
+DEFAULT_BUDGET_PATH = "data/budget.json"
+DEFAULT_EXPORT_PATH = "data/expenses.csv"
+PATH_ARGUMENTS = ("expenses_path", "budget_path", "file_path", "target")
+STORAGE_COMMANDS = ("add", "delete", "list", "search", "summary", "report", "stats", "update", "export", "import", "migrate", "rebuild-index", "batch", "budgets")
+PATH_COMMANDS = STORAGE_COMMANDS + ("set-budget", "compact")
+
+def parse_date_argument(value):
+    try:
+        return datetime.strptime(value, "%d-%m-%Y").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}' (expected DD-MM-YYYY)")
+
+def build_profile_parser():
+    # Parsed ahead of the real parser, so --profile may go anywhere and build_parser() itself is timed.
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--profile', action='store_true', help=f'Print wall time, CPU time and allocations per phase to stderr (or set ${profiling.PROFILE_ENV})')
+    parser.add_argument('--profile-format', type=str, choices=profiling.PROFILE_FORMATS, default=None, help='Profile as a readable summary or a JSON line (implies --profile)')
+    parser.add_argument('--profile-dump', type=str, default=None, help='Also write <prefix>.prof (cProfile) and <prefix>.tracemalloc for deep dives')
+    return parser
+
+def add_add_arguments(parser):
+    parser.add_argument('--description', required=True, type=str, help='Description for the expense')
+    parser.add_argument('--amount', required=True, type=float, help='Amount spent')
+    parser.add_argument('--category', type=str, help='Expense category', default=None)
+
+def add_delete_arguments(parser):
+    parser.add_argument('--id', type=int, help='ID of the expense to be deleted', default=None)
+    parser.add_argument('--category', type=str, help='Delete every expense of this category', default=None)
+    parser.add_argument('--from', dest='start', type=parse_date_argument, help='Delete expenses on or after this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--to', dest='end', type=parse_date_argument, help='Delete expenses on or before this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--year', type=int, help='Delete expenses of this year', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many expenses match the filter')
+
+def add_list_arguments(parser):
+    from commands import SORT_KEYS
+    parser.add_argument('--category', type=str, help='Filer the expenses for a specific category', default=None)
+    parser.add_argument('--from', dest='start', type=parse_date_argument, help='Only list expenses on or after this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--to', dest='end', type=parse_date_argument, help='Only list expenses on or before this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--year', type=int, help='Only list expenses of this year', default=None)
+    parser.add_argument('--sort', type=str, choices=SORT_KEYS, help='Sort the expenses by date or amount', default=None)
+    parser.add_argument('--reverse', action='store_true', help='Reverse the order (e.g. largest amounts first)')
+    parser.add_argument('--limit', type=int, help='Maximum number of expenses to show', default=None)
+    parser.add_argument('--offset', type=int, help='Number of expenses to skip', default=0)
+
+def add_search_arguments(parser):
+    parser.add_argument('query', type=str, help='Words that must all appear in the description (case-insensitive); end a word with * to match it as a prefix')
+    parser.add_argument('--limit', type=int, help='Maximum number of expenses to show (the total still covers every match)', default=None)
+
+def add_summary_arguments(parser):
+    parser.add_argument('--month', type=int, choices=range(1,13), help='Filter the expenses for a specific month (of current year, unless --year is given)')
+    parser.add_argument('--year', type=int, help='Filter the expenses for a specific year', default=None)
+    parser.add_argument('--from', dest='start', type=parse_date_argument, help='Only count expenses on or after this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--to', dest='end', type=parse_date_argument, help='Only count expenses on or before this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--category', type=str, help='Filter the expenses for a specific category', default=None)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes when --expenses_path is a directory or glob of ledgers (default: one per CPU)')
+    parser.add_argument('--per-ledger', action='store_true', help='Also show the total and timing of each ledger')
+
+def add_report_arguments(parser):
+    from reports import GROUP_KEYS, METRICS, REPORT_FORMATS
+    parser.add_argument('--group-by', type=str, default='category', help=f'Comma-separated fields to group by: {", ".join(GROUP_KEYS)} (default: category)')
+    parser.add_argument('--metrics', type=str, default='sum', help=f'Comma-separated metrics: {", ".join(METRICS)} (default: sum)')
+    parser.add_argument('--format', type=str, choices=REPORT_FORMATS, default='table', help='Output as an aligned table, CSV or JSON')
+    parser.add_argument('--category', type=str, default=None, help='Only report expenses of this category')
+    parser.add_argument('--year', type=int, default=None, help='Only report expenses of this year')
+    parser.add_argument('--from', dest='start', type=parse_date_argument, default=None, help='Only report expenses on or after this date (DD-MM-YYYY)')
+    parser.add_argument('--to', dest='end', type=parse_date_argument, default=None, help='Only report expenses on or before this date (DD-MM-YYYY)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for large ledgers, or for a directory or glob of ledgers (default: one per CPU, 1 disables)')
+    parser.add_argument('--per-ledger', action='store_true', help='Also show the rows, total and timing of each ledger (table format only)')
+
+def add_stats_arguments(parser):
+    from reports import REPORT_FORMATS
+    from sketches import DEFAULT_COMPRESSION, DEFAULT_PRECISION
+    parser.add_argument('--category', type=str, default=None, help='Only show this category')
+    parser.add_argument('--year', type=int, default=None, help='Only use expenses of this year')
+    parser.add_argument('--month', type=int, choices=range(1,13), default=None, help='Only use expenses of this month (of --year, default: the current year)')
+    parser.add_argument('--format', type=str, choices=REPORT_FORMATS, default='table', help='Output as an aligned table, CSV or JSON')
+    parser.add_argument('--outliers', action='store_true', help='Also list the charges far above their category\'s normal range (table format only)')
+    parser.add_argument('--fence', type=float, default=3.0, help='Flag charges more than this many interquartile ranges above the third quartile')
+    parser.add_argument('--compression', type=int, default=None, help=f't-digest compression: higher is more accurate percentiles and larger sketches (default: {DEFAULT_COMPRESSION}, or the stored one)')
+    parser.add_argument('--precision', type=int, default=None, help=f'HyperLogLog precision: 2**precision bytes per sketch, error about 1.04/sqrt(2**precision) (default: {DEFAULT_PRECISION}, or the stored one)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes when --expenses_path is a directory or glob of ledgers (default: one per CPU)')
+
+def add_update_arguments(parser):
+    parser.add_argument('--expense_id', type=int, help='ID of the expense to be updated', default=None)
+    parser.add_argument('--description', '--set-description', dest='description', type=str, help='New description')
+    parser.add_argument('--amount', '--set-amount', dest='amount', type=float, help='New amount')
+    parser.add_argument('--category', '--set-category', dest='category', type=str, help='Expense category', default=None)
+    parser.add_argument('--where-category', type=str, help='Update every expense of this category', default=None)
+    parser.add_argument('--from', dest='start', type=parse_date_argument, help='Update expenses on or after this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--to', dest='end', type=parse_date_argument, help='Update expenses on or before this date (DD-MM-YYYY)', default=None)
+    parser.add_argument('--year', type=int, help='Update expenses of this year', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many expenses match the filter')
+
+def add_set_budget_arguments(parser):
+    parser.add_argument('--month', type=int, help='The numeric value corresponding to the month you want to set the budget', default=None)
+    parser.add_argument('--value', required=True, type=float, help='The value for the budget')
+    parser.add_argument('--year', type=int, help='Only set the budget for this year (default: the month of every year)', default=None)
+    parser.add_argument('--category', type=str, help='Budget one category instead of all of them (a rule, checked on every write)', default=None)
+    parser.add_argument('--period', type=str, help='Period of a budget rule: month, quarter or a rolling window such as 7d or 30d (default: month)', default=None)
+
+def add_budgets_arguments(parser):
+    parser.add_argument('action', choices=('status',), help='status: how much of each budget the current period has used')
+
+def add_export_arguments(parser):
+    from exporters import EXPORT_FORMATS, EXPORT_COMPRESSIONS
+    parser.add_argument('--file-path', type=str, default=DEFAULT_EXPORT_PATH, help='The path (including the file name) where you want to export the CSV file')
+    parser.add_argument('--format', type=str, choices=EXPORT_FORMATS, default=None, help='Output format (default: guessed from the file extension, otherwise csv)')
+    parser.add_argument('--compress', type=str, choices=EXPORT_COMPRESSIONS, default=None, help='Compress the output (default: guessed from a .gz or .zst extension)')
+    parser.add_argument('--category', type=str, default=None, help='Only export expenses of this category')
+    parser.add_argument('--month', type=int, choices=range(1,13), default=None, help='Only export expenses of this month')
+    parser.add_argument('--from', dest='start', type=parse_date_argument, default=None, help='Only export expenses on or after this date (DD-MM-YYYY)')
+    parser.add_argument('--to', dest='end', type=parse_date_argument, default=None, help='Only export expenses on or before this date (DD-MM-YYYY)')
+    parser.add_argument('--year', type=int, default=None, help='Only export expenses of this year')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes when --expenses_path is a directory or glob of ledgers (default: one per CPU)')
+    parser.add_argument('--per-ledger', action='store_true', help='Also show the rows and timing of each ledger')
+    parser.add_argument('--since-last', action='store_true', help='Only export rows inserted, updated or deleted since the last --since-last export, with an operation column')
+
+def add_import_arguments(parser):
+    from commands import IMPORT_BATCH_SIZE, IMPORT_FORMATS
+    parser.add_argument('--file-path', required=True, type=str, help='CSV or JSON-lines file with date, description, amount and category fields')
+    parser.add_argument('--format', type=str, choices=IMPORT_FORMATS, default=None, help='File format (default: guessed from the file extension)')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Number of expenses written to the ledger at once')
+    parser.add_argument('--date-format', type=str, default='%d-%m-%Y', help='strptime format of the date field (e.g. %%Y-%%m-%%d)')
+
+def add_compact_arguments(parser):
+    pass
+
+def add_migrate_arguments(parser):
+    parser.add_argument('--target', required=True, type=str, help='Path of the ledger to create')
+    parser.add_argument('--target-storage', type=str, choices=STORAGE_MODES, default='sqlite', help='Storage backend of the new ledger')
+
+def add_serve_arguments(parser):
+    parser.add_argument('--socket', type=str, default=None, help=f'Socket path (default: $EXPENSE_TRACKER_SOCKET or {daemon.DEFAULT_SOCKET_PATH})')
+    parser.add_argument('--flush-interval', type=float, default=daemon.DEFAULT_FLUSH_INTERVAL * 1000, help='Milliseconds to wait for more writes before flushing them together')
+    parser.add_argument('--max-batch', type=int, default=daemon.DEFAULT_MAX_BATCH, help='Flush as soon as this many writes are waiting')
+
+def add_batch_arguments(parser):
+    parser.add_argument('--file', type=str, default='-', help='File with one command per line, as CLI arguments or JSON (default: stdin)')
+    parser.add_argument('--flush-every', type=int, default=None, help='Write the ledgers every N commands instead of once at the end')
+
+def add_rebuild_index_arguments(parser):
+    parser.add_argument('--check', action='store_true', help='Only compare the index against a full scan of the ledger')
+
+# Subcommand -> (help, function adding its arguments), in the order `--help` lists them.
+COMMANDS = {
+    'add': ('Add a new expense', add_add_arguments),
+    'delete': ('Delete an expense, or every expense matching a filter', add_delete_arguments),
+    'list': ('List all expenses', add_list_arguments),
+    'search': ('Find expenses by words in their description', add_search_arguments),
+    'summary': ('Show summary of expenses', add_summary_arguments),
+    'report': ('Totals, counts and averages grouped by category and/or period', add_report_arguments),
+    'stats': ('Percentiles, spread, distinct merchants and outliers per category, from streaming sketches', add_stats_arguments),
+    'update': ('Update an existing expense, or every expense matching a filter', add_update_arguments),
+    'set-budget': ('Set the budget for the desired month, or for a category and/or rolling window', add_set_budget_arguments),
+    'budgets': ('Show how much of each budget is used', add_budgets_arguments),
+    'export': ('Export the expenses to a CSV, JSON-lines, Arrow or Parquet file', add_export_arguments),
+    'import': ('Import expenses from a CSV or JSON-lines file', add_import_arguments),
+    'compact': ('Fold the journal back into the JSON ledger', add_compact_arguments),
+    'migrate': ('Copy the ledger into another storage backend', add_migrate_arguments),
+    'serve': ('Keep the ledgers in memory and answer commands over a Unix socket', add_serve_arguments),
+    'batch': ('Run many commands from a file or stdin with a single load and write', add_batch_arguments),
+    'rebuild-index': ('Rebuild the monthly totals index (and the date and search indexes) from the ledger', add_rebuild_index_arguments),
+}
+
+@profiling.timed("build_parser")
+def build_parser(command=None):
+    # A CLI call parses one subcommand, so only that one is built, with only the imports its arguments need.
+    # Anything else (--help, a typo) lists every subcommand without arguments; None builds them all, for batch and serve.
+
+    parser = argparse.ArgumentParser(
+        prog="expense-tracker",
+        parents=[build_profile_parser()],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="""\
+            --------------------------------
+                    Expense Tracker
+            --------------------------------
+        A simple expense tracker to manage your finances.
+
+        Examples:
+        expense-tracker add --description "Lunch" --amount 20
+        expense-tracker delete --id 2
+        expense-tracker delete --category Groceries --from 01-01-2024 --to 31-01-2024 --dry-run
+        expense-tracker update --where-category Uncategorized --year 2024 --set-category Travel
+        expense-tracker list
+        expense-tracker list --sort amount --reverse --limit 10
+        expense-tracker search "uber"
+        expense-tracker search "aws* invoice"
+        expense-tracker summary
+        expense-tracker summary --month 8
+        expense-tracker summary --from 01-01-2024 --to 31-03-2024
+        expense-tracker report --group-by category,month --metrics sum,count,mean,max
+        expense-tracker stats --year 2024 --outliers
+        expense-tracker summary --year 2024 --expenses_path "teams/*.json" --per-ledger
+        expense-tracker add --description "Coffee" --amount 4 --storage journal
+        expense-tracker compact
+        expense-tracker batch --file commands.txt
+        expense-tracker serve &
+        expense-tracker export --since-last --file-path data/changes.csv
+        expense-tracker migrate --target data/expenses.db
+        expense-tracker summary --month 8 --storage sqlite --expenses_path data/expenses.db
+        expense-tracker set-budget --category Food --period 30d --value 300
+        expense-tracker budgets status
+        expense-tracker list --profile
+        """
+    )
+
+    subparsers = parser.add_subparsers(dest='command', help='Options for the command')
+    for name, (help_text, add_arguments) in COMMANDS.items():
+        if command in COMMANDS and name != command:
+            continue
+        subparser = subparsers.add_parser(name, help=help_text)
+        if command is not None and name != command:
+            continue
+        add_arguments(subparser)
+        if name in STORAGE_COMMANDS:
+            subparser.add_argument('--storage', type=str, choices=STORAGE_MODES, default=DEFAULT_STORAGE, help='Storage backend: JSON file (json), JSON file plus append-only journal (journal), indexed SQLite database (sqlite), one JSON file per month (partitioned) or memory-mapped binary records (binary)')
+        if name in PATH_COMMANDS:
+            subparser.add_argument('--expenses_path', type=str, default=DEFAULT_EXPENSES_PATH, help=argparse.SUPPRESS)
+            subparser.add_argument('--budget_path', type=str, default=DEFAULT_BUDGET_PATH, help=argparse.SUPPRESS)
+
+    return parser
+
+def main():
+    profile_args, argv = build_profile_parser().parse_known_args(sys.argv[1:])
+    profile_format = profiling.requested_format(profile_args.profile, profile_args.profile_format, profile_args.profile_dump)
+    if profile_format is None:
+        run_main(argv)
+        return
+    profiling.start(profile_args.profile_dump)
+    try:
+        run_main(argv)
+    finally:
+        profiling.stop(sys.stderr, profile_format, {f"json_cache_{name}": value for name, value in json_cache_stats().items()})
+
+def run_main(argv):
+    # client.main() has already offered the command to a running daemon.
+    parser = build_parser(argv[0] if argv else None)
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+    with profiling.phase(args.command):
+        code = run_command(parser, args)
+    sys.exit(code)
+
+def execute(parser, argv, cwd):
+    # Runs one forwarded command inside the daemon and captures what it would have printed.
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            args = parser.parse_args(argv)
+            if not args.command or args.command in daemon.LOCAL_COMMANDS:
+                parser.print_help()
+                code = 1
+            else:
+                for name in PATH_ARGUMENTS:
+                    if getattr(args, name, None) is not None:
+                        setattr(args, name, os.path.join(cwd, getattr(args, name)))
+                code = run_command(parser, args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+    return {"code": code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+def execute_in_batch(parser, args, argv):
+    # The batch's own ledger options are the defaults; options given on the line come later and win.
+    if argv and argv[0] in STORAGE_COMMANDS:
+        argv = argv[:1] + ['--storage', args.storage] + argv[1:]
+    if argv and argv[0] not in daemon.LOCAL_COMMANDS:
+        argv = argv[:1] + ['--expenses_path', args.expenses_path, '--budget_path', args.budget_path] + argv[1:]
+    return execute(parser, argv, os.getcwd())
+
+def run_command(parser, args):
+    # Each subcommand imports only what it runs, so neither a forwarded command nor --help loads commands.py.
+    try:
+        match args.command:
+            case 'add':
+                from commands import add_expense
+                result = add_expense(args.expenses_path, args.budget_path, args.description, args.amount, args.category, args.storage)
+                print(result["message"])
+                if result["warning"]:
+                    print(result["warning"])
+            case 'list':
+                from commands import iter_list_lines
+                for line in iter_list_lines(args.expenses_path, args.category, args.storage, args.limit, args.offset, args.sort, args.reverse, args.start, args.end, args.year):
+                    print(line)
+            case 'search':
+                from commands import search_expenses
+                result = search_expenses(args.expenses_path, args.query, args.storage, args.limit)
+                print(result)
+            case 'summary':
+                from commands import show_summary
+                result = show_summary(args.expenses_path, args.month, args.category, args.storage, args.year, args.start, args.end, args.workers, args.per_ledger)
+                print(result)
+            case 'report':
+                from commands import report_expenses
+                result = report_expenses(args.expenses_path, args.group_by, args.metrics, args.storage, args.format, args.category, args.year, args.start, args.end, args.workers, args.per_ledger)
+                print(result)
+            case 'stats':
+                from commands import stats_expenses
+                result = stats_expenses(args.expenses_path, args.category, args.year, args.month, args.storage, args.format, args.compression, args.precision, args.outliers, args.fence, args.workers)
+                print(result)
+            case 'update':
+                from commands import update_expense, update_expenses
+                filters = (args.where_category, args.start, args.end, args.year)
+                if args.expense_id is None:
+                    result = update_expenses(args.expenses_path, args.budget_path, *filters, args.description, args.amount, args.category, args.storage, args.dry_run)
+                    print(result)
+                elif any(value is not None for value in filters) or args.dry_run:
+                    raise ValueError("--expense_id cannot be combined with filters or --dry-run.")
+                else:
+                    result = update_expense(args.expenses_path, args.budget_path, args.expense_id, args.description, args.amount, args.category, args.storage)
+                    print(result["message"])
+                    if result["warning"]:
+                        print(result["warning"])
+            case 'delete':
+                from commands import delete_expense, delete_expenses
+                filters = (args.category, args.start, args.end, args.year)
+                if args.id is None:
+                    result = delete_expenses(args.expenses_path, *filters, args.storage, args.dry_run)
+                elif any(value is not None for value in filters) or args.dry_run:
+                    raise ValueError("--id cannot be combined with filters or --dry-run.")
+                else:
+                    result = delete_expense(args.expenses_path, args.id, args.storage)
+                print(result)
+            case 'set-budget':
+                from commands import set_budget
+                result = set_budget(args.budget_path, args.month, args.value, args.year, args.category, args.period)
+                print(result)
+            case 'budgets':
+                from commands import budget_status
+                result = budget_status(args.expenses_path, args.budget_path, args.storage)
+                print(result)
+            case 'export' if args.since_last:
+                from commands import export_changes
+                if any(value is not None for value in (args.category, args.month, args.start, args.end, args.year)):
+                    raise ValueError("--since-last cannot be combined with filters.")
+                result = export_changes(args.expenses_path, args.file_path, args.storage, args.format, args.compress)
+                print(result)
+            case 'export':
+                from commands import export_expenses
+                result = export_expenses(args.expenses_path, args.file_path, args.storage, args.format, args.compress, args.category, args.month, args.start, args.end, year=args.year, workers=args.workers, per_ledger=args.per_ledger)
+                print(result)
+            case 'import':
+                from commands import import_expenses
+                result = import_expenses(args.expenses_path, args.budget_path, args.file_path, args.format, args.batch_size, args.date_format, args.storage)
+                print(result)
+            case 'compact':
+                from commands import compact_expenses
+                result = compact_expenses(args.expenses_path)
+                print(result)
+            case 'rebuild-index':
+                from commands import rebuild_totals
+                result = rebuild_totals(args.expenses_path, args.storage, args.check)
+                print(result)
+            case 'batch':
+                import batch
+                # Batch lines and forwarded commands may be any subcommand, so they need the full parser.
+                full_parser = build_parser()
+                lines = sys.stdin if args.file == '-' else open(args.file, encoding="utf-8")
+                with lines:
+                    ran, failed, flushes = batch.run_batch(lines, lambda argv: execute_in_batch(full_parser, args, argv), sys.stdout, args.flush_every)
+                print(f"Ran {ran} command(s): {failed} failed, {flushes} write(s)", file=sys.stderr)
+                return 1 if failed else 0
+            case 'serve':
+                print(f"Serving on {daemon.get_socket_path(args.socket)}")
+                sys.stdout.flush()
+                full_parser = build_parser()
+                daemon.serve(lambda argv, cwd: execute(full_parser, argv, cwd), args.socket, args.flush_interval / 1000, args.max_batch)
+            case 'migrate':
+                from commands import migrate_expenses
+                result = migrate_expenses(args.expenses_path, args.target, args.storage, args.target_storage)
+                print(result)
+            case _:
+                parser.print_help()
+                return 1
+    except ValueError as e:
+        print(f"[ERROR] Input error: {e}", file=sys.stderr)
+        return 1
+    except RuntimeError as e:
+        print(f"[ERROR] Application error: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"[ERROR] An unexpected error occurred: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import daemon
+
+PROFILE_OPTIONS = ("--profile", "--profile-format", "--profile-dump")
+
+
+def main():
+    # A running daemon gets the command before anything else is imported; the CLI and the commands only load
+    # when it has to run here (no daemon, serve or batch, or a profiled command).
+    argv = sys.argv[1:]
+    if (not argv or argv[0] not in daemon.LOCAL_COMMANDS) and not is_profiled(argv):
+        try:
+            response = daemon.forward(argv)
+        except RuntimeError as e:
+            print(f"[ERROR] Application error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if response is not None:
+            sys.stdout.write(response["stdout"])
+            sys.stderr.write(response["stderr"])
+            sys.exit(response["code"])
+    from cli import main as run_cli
+    run_cli()
+
+
+def is_profiled(argv):
+    # A profiled command always runs here: a daemon would spend the time in another process. Same switches as
+    # cli.build_profile_parser() and profiling.requested_format(), without importing profiling (and with it json).
+    if any(arg.split("=", 1)[0] in PROFILE_OPTIONS for arg in argv):
+        return True
+    return os.environ.get("EXPENSE_TRACKER_PROFILE", "").strip().lower() not in ("", "0", "false", "no", "off")
@@ -1,13 +1,61 @@
-import calendar
-import csv
+import heapq
 import json
 import os
-from datetime import datetime
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from aggregates import AggregateIndex, check_index, rebuild_index, to_cents
+from dateindex import iter_range
+from ledgers import expand_ledgers, format_breakdown, get_ledger_name, is_multi_ledger, map_ledgers
+from locking import exclusive
+from profiling import timed
+from storage import (CHANGES_SUFFIX, DATE_FORMAT, DATES_SUFFIX, DAYS_SUFFIX, DEFAULT_STORAGE, SEARCH_SUFFIX, STATS_SUFFIX, open_storage,
+                     parse_date, load_json, read_json, write_json, read_journal, get_journal_path)
 
-DATE_FORMAT = "%d-%m-%Y"
 DEFAULT_CATEGORY = "Uncategorized"
+IMPORT_FORMATS = ("csv", "jsonl")
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_REJECTS = 20
+STATS_FIELDS = ["category", "count", "mean", "stddev", "min", "p50", "p95", "max", "merchants"]
+DEFAULT_OUTLIER_FENCE = 3.0
+MIN_OUTLIER_ROWS = 8
+MAX_REPORTED_OUTLIERS = 20
+SORT_KEYS = {
+    "date": lambda row: (parse_date(row[1].get("date")) or datetime.min),
+    "amount": lambda row: float(row[1].get("amount") or 0),
+}
+
+def load_indexes(expenses, create_days=False):
+    # Every sidecar index a write keeps current, keyed like expenses.cache. The totals index always exists; the others
+    # only once a command built them, and the day index as soon as a rolling budget needs it (create_days).
+    # Their modules are imported only when their file exists, so a write to a ledger without them does not pay for it.
+    AggregateIndex.load(expenses)
+    if os.path.exists(expenses.path + DATES_SUFFIX):
+        from dateindex import DateIndex
+        DateIndex.load(expenses)
+    if os.path.exists(expenses.path + SEARCH_SUFFIX):
+        from searchindex import SearchIndex
+        SearchIndex.load(expenses)
+    if os.path.exists(expenses.path + CHANGES_SUFFIX):
+        from changelog import ChangeLog
+        ChangeLog.load(expenses)
+    if os.path.exists(expenses.path + STATS_SUFFIX):
+        from statsindex import StatsIndex
+        StatsIndex.load(expenses)
+    if create_days or os.path.exists(expenses.path + DAYS_SUFFIX):
+        from budgets import DayIndex
+        DayIndex.load(expenses)
+    return dict(expenses.cache)
+
+def apply_change(indexes, expense_id, old_expense, new_expense):
+    # old_expense is None for an insert, new_expense is None for a delete.
+    for index in indexes.values():
+        index.apply(expense_id, old_expense, new_expense)
 
-def add_expense(expenses_path, budget_path, description, amount, category=None):
+@exclusive("expenses_path", group_commit=True)
+def add_expense(expenses_path, budget_path, description, amount, category=None, storage=DEFAULT_STORAGE):
+    from budgets import check_rules, has_rolling_rules
     if not description.strip():
         raise ValueError("Description cannot be empty.")
 
@@ -16,53 +64,134 @@ def add_expense(expenses_path, budget_path, description, amount, category=None):
     if not category or not category.strip():
         category = DEFAULT_CATEGORY
     
-    expenses = read_json(expenses_path)
-    ids = [int(key) for key in expenses.keys()]
-    expense_id = max(ids, default=0) + 1
+    expenses = open_storage(expenses_path, storage)
+    rules = get_budget_rules(budget_path)
+    indexes = load_indexes(expenses, create_days=has_rolling_rules(rules))
+    totals, days = indexes["totals"], indexes.get("days")
+    expense_id = expenses.next_id()
     
-    expenses[str(expense_id)] = {
+    expense = {
         "date": datetime.now().strftime(DATE_FORMAT),
         "description": description,
         "amount": float(amount),
         "category": category
     }
+    expenses.put(expense_id, expense)
+    apply_change(indexes, expense_id, None, expense)
     
-    warning = check_if_budget_exceed(budget_path, expenses)
+    warning = join_warnings(check_if_budget_exceed(budget_path, totals), rules, check_rules(rules, totals, days, touched_days([expense]), date.today()))
 
-    write_json(expenses, expenses_path)
+    expenses.commit()
 
     return {
         "message": f"Expense added successfully (ID: {expense_id})",
         "warning": warning
     }
 
-def update_expense(expenses_path, budget_path, expense_id, description=None, amount=None, category=None):
+@exclusive("expenses_path", group_commit=True)
+def update_expense(expenses_path, budget_path, expense_id, description=None, amount=None, category=None, storage=DEFAULT_STORAGE):
+    from budgets import check_rules, has_rolling_rules
     if description is None and amount is None and category is None:
         raise ValueError("At least one field (description, amount, category) must be provided.")
     
-    expenses = read_json(expenses_path)
+    expenses = open_storage(expenses_path, storage)
     expense_id = str(expense_id)
-    if expense_id not in expenses:
+    previous = expenses.get(expense_id)
+    if previous is None:
         raise ValueError(f"Expense with ID {expense_id} not found.")
+    expense = apply_changes(previous, description, amount, category)
+    rules = get_budget_rules(budget_path)
+    indexes = load_indexes(expenses, create_days=has_rolling_rules(rules))
+    totals, days = indexes["totals"], indexes.get("days")
+    expenses.put(expense_id, expense)
+    apply_change(indexes, expense_id, previous, expense)
+    expense_date = datetime.strptime(expense["date"], DATE_FORMAT)
+    warning = join_warnings(check_if_budget_exceed(budget_path, totals, expense_date.month, expense_date.year), rules,
+                            check_rules(rules, totals, days, touched_days([expense]), date.today()))
+    expenses.commit()
+    return {
+        "message" : f"Expense updated successfully (ID: {expense_id})",
+        "warning" : warning
+    }
+
+
+def apply_changes(previous, description=None, amount=None, category=None):
+    expense = dict(previous)
     if description is not None:
         if not description.strip():
             raise ValueError("Description cannot be empty.")
-        expenses[expense_id]["description"] = description
+        expense["description"] = description
     if amount is not None:
-        expenses[expense_id]["amount"] = validate_amount(amount)
+        expense["amount"] = validate_amount(amount)
     if category is not None:
         if not category.strip():
             category = DEFAULT_CATEGORY
-        expenses[expense_id]["category"] = category
-    expense_date = expenses[expense_id]["date"]
-    month = datetime.strptime(expense_date, DATE_FORMAT).month
-    warning = check_if_budget_exceed(budget_path, expenses, month)
-    write_json(expenses, expenses_path)
-    return {
-        "message" : f"Expense updated successfully (ID: {expense_id})",
-        "warning" : warning
-    }
+        expense["category"] = category
+    return expense
+
+@exclusive("expenses_path")
+def update_expenses(expenses_path, budget_path, where_category=None, start=None, end=None, year=None,
+                    description=None, amount=None, category=None, storage=DEFAULT_STORAGE, dry_run=False):
+    from budgets import check_rules, has_rolling_rules
+    if description is None and amount is None and category is None:
+        raise ValueError("At least one field (description, amount, category) must be provided.")
+    expenses = open_storage(expenses_path, storage)
+    matches = find_matching(expenses, where_category, start, end, year)
+    if dry_run:
+        return f"{len(matches)} expense(s) match. Dry run, nothing was updated."
+    rules = get_budget_rules(budget_path)
+    indexes = load_indexes(expenses, create_days=has_rolling_rules(rules))
+    totals, days = indexes["totals"], indexes.get("days")
+    months = set()
+    changed = []
+    for expense_id, previous in matches:
+        expense = apply_changes(previous, description, amount, category)
+        expenses.put(expense_id, expense)
+        apply_change(indexes, expense_id, previous, expense)
+        changed.append(expense)
+        expense_date = parse_date(expense.get("date"))
+        if expense_date is not None:
+            months.add((expense_date.year, expense_date.month))
+    if matches:
+        expenses.commit()
+    # One budget check per month the update touched, rather than one per row.
+    message = [f"Updated {len(matches)} expense(s)"]
+    for expense_year, month in sorted(months):
+        warning = check_if_budget_exceed(budget_path, totals, month, expense_year)
+        if warning and warning.startswith("[WARN]"):
+            message.append(warning)
+    message += check_rules(rules, totals, days, touched_days(changed), date.today())
+    return "\n".join(message)
+
+@exclusive("expenses_path")
+def delete_expenses(expenses_path, category=None, start=None, end=None, year=None, storage=DEFAULT_STORAGE, dry_run=False):
+    expenses = open_storage(expenses_path, storage)
+    matches = find_matching(expenses, category, start, end, year)
+    cents = sum(to_cents(expense["amount"]) for _, expense in matches if is_amount(expense.get("amount")))
+    if dry_run:
+        return f"{len(matches)} expense(s) match (${cents / 100:.2f}). Dry run, nothing was deleted."
+    indexes = load_indexes(expenses)
+    for expense_id, previous in matches:
+        expenses.delete(expense_id)
+        apply_change(indexes, expense_id, previous, None)
+    if matches:
+        expenses.commit()
+    return f"Deleted {len(matches)} expense(s) (${cents / 100:.2f})"
+
+def find_matching(expenses, category=None, start=None, end=None, year=None):
+    # Bulk commands refuse an empty filter rather than touch the whole ledger by accident.
+    if category is None and start is None and end is None and year is None:
+        raise ValueError("At least one filter (category, from, to, year) must be provided.")
+    start, end = resolve_range(year, start, end)
+    # Collected up front: the rows are changed while the backend would still be iterating over them.
+    return list(iter_range(expenses, category=category, start=start, end=end))
 
+def is_amount(value):
+    try:
+        to_cents(value)
+        return True
+    except (TypeError, ValueError):
+        return False
 
 def validate_amount(amount):
     try:
@@ -70,24 +199,49 @@ def validate_amount(amount):
         if amount < 0:
             raise ValueError("Amount cannot be negative.")
         return amount
-    except ValueError as e:
+    except (TypeError, ValueError) as e:
         raise ValueError(f"Invalid amount: {e}")
 
 
-def list_expenses(expenses_path, category=None):
-    expenses = read_json(expenses_path)
+def list_expenses(expenses_path, category=None, storage=DEFAULT_STORAGE, limit=None, offset=0, sort=None, reverse=False, start=None, end=None, year=None):
+    return "\n".join(iter_list_lines(expenses_path, category, storage, limit, offset, sort, reverse, start, end, year))
 
-    if not expenses:
-        return "No expenses found"
-    if category is not None:
-        expenses = filter_category(expenses, category)
 
-    header = [f"{'ID':<4} {'Date':<12} {'Description':<15} {'Amount':<7} {'Category':<10}"]
-    rows = [
-        f"{expense_id:<4} {expense['date']:<12} {expense['description']:<15} ${expense['amount']:<7.2f} {expense['category']}"
-        for expense_id, expense in expenses.items()
-    ]
-    return "\n".join(header + rows)
+def iter_list_lines(expenses_path, category=None, storage=DEFAULT_STORAGE, limit=None, offset=0, sort=None, reverse=False, start=None, end=None, year=None):
+    if (limit is not None and limit < 0) or offset < 0:
+        raise ValueError("Limit and offset cannot be negative.")
+    if sort is not None and sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    expenses = open_storage(expenses_path, storage)
+
+    if expenses.is_empty():
+        yield "No expenses found"
+        return
+    start, end = resolve_range(year, start, end)
+    rows = iter_range(expenses, category=category, start=start, end=end)
+
+    yield f"{'ID':<4} {'Date':<12} {'Description':<15} {'Amount':<7} {'Category':<10}"
+    for expense_id, expense in select_expenses(rows, limit, offset, sort, reverse):
+        yield format_expense_line(expense_id, expense)
+
+
+@timed("format_rows")
+def format_expense_line(expense_id, expense):
+    return f"{expense_id:<4} {expense['date']:<12} {expense['description']:<15} ${expense['amount']:<7.2f} {expense['category']}"
+
+
+def select_expenses(rows, limit=None, offset=0, sort=None, reverse=False):
+    stop = None if limit is None else offset + limit
+    if sort is None:
+        if reverse:
+            rows = reversed(list(rows))
+        return islice(rows, offset, stop)
+    key = SORT_KEYS[sort]
+    if stop is not None:
+        # Only the first offset + limit rows are kept, so top-N never sorts the whole ledger.
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return iter(select(stop, rows, key=key)[offset:])
+    return islice(sorted(rows, key=key, reverse=reverse), offset, None)
 
 
 def filter_category(expenses, category):
@@ -95,6 +249,7 @@ def filter_category(expenses, category):
     return expenses
 
 
+@timed("get_total_expenses")
 def get_total_expenses(expenses, month=None, category=None):
     total = 0
     for exp in expenses.values():
@@ -113,82 +268,569 @@ def get_total_expenses(expenses, month=None, category=None):
     return round(total, 2)
 
 
-def show_summary(expenses_path, month=None, category=None):
+def resolve_range(year=None, start=None, end=None):
+    # --year is shorthand for a range, narrowed further by --from/--to when both are given.
+    if year is None:
+        return start, end
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    return max(start or first, first), min(end or last, last)
+
+
+def show_summary(expenses_path, month=None, category=None, storage=DEFAULT_STORAGE, year=None, start=None, end=None,
+                 workers=None, per_ledger=False):
     if (month is not None) and (month < 1 or month > 12):
         return "Invalid month. Please provide a number between 1 and 12."
-    expenses = read_json(expenses_path)
-    total_expenses = get_total_expenses(expenses, month, category)
+    results = None
+    if is_multi_ledger(expenses_path, storage):
+        # A directory or glob of ledgers: one partial total per file, summed in cents.
+        results = map_ledgers(summary_total, expand_ledgers(expenses_path, storage), storage, (month, category, year, start, end), workers)
+        total_expenses = round(sum(to_cents(total) for _, total, _ in results) / 100, 2)
+    else:
+        total_expenses = summary_total(open_storage(expenses_path, storage), month, category, year, start, end)
 
     message = ["Total expenses"]
     if category is not None:
         message.append(f" with {category}")
     if month is not None:
-        message.append(f" for {calendar.month_name[month]}")
+        message.append(f" for {get_month_name(month)}")
+        if year is not None:
+            message.append(f" {year}")
+    elif year is not None:
+        message.append(f" in {year}")
+    if start is not None:
+        message.append(f" from {start.strftime(DATE_FORMAT)}")
+    if end is not None:
+        message.append(f" until {end.strftime(DATE_FORMAT)}")
+    if results is not None:
+        message.append(f" across {len(results)} ledger(s)")
     message = f"{''.join(message)}: ${total_expenses:.2f}"
+    if per_ledger and results is not None:
+        message = "\n".join([message] + format_breakdown(results, lambda total: f"${total:.2f}"))
 
     return message
 
 
-def delete_expense(expenses_path, expense_id):
-    expenses = read_json(expenses_path)
+def summary_total(expenses, month=None, category=None, year=None, start=None, end=None):
+    if start is None and end is None:
+        totals = AggregateIndex.load(expenses)
+        if totals.dirty:
+            # The index had to be rebuilt; committing persists it so the next summary skips the scan.
+            expenses.commit()
+        # A month on its own means that month of the current year, not every year's.
+        total_expenses = totals.total(month, category, year if (year is not None or month is None) else datetime.now().year)
+    else:
+        range_start, range_end = resolve_range(year, start, end)
+        cents = sum(to_cents(expense["amount"]) for _, expense in iter_range(expenses, category, month, range_start, range_end))
+        total_expenses = round(cents / 100, 2)
+    return total_expenses
+
+
+def report_expenses(expenses_path, group_by="category", metrics="sum", storage=DEFAULT_STORAGE, output_format="table",
+                    category=None, year=None, start=None, end=None, workers=None, per_ledger=False):
+    from reports import GROUP_KEYS, METRICS, REPORT_FORMATS, format_report, merge_partitions, parse_report_fields
+    group_by = parse_report_fields(group_by, GROUP_KEYS, "group-by field")
+    metrics = parse_report_fields(metrics, METRICS, "metric")
+    if not metrics:
+        raise ValueError("At least one metric must be provided.")
+    if output_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {output_format}")
+    if workers is not None and workers < 1:
+        raise ValueError("Workers must be at least 1.")
+    if per_ledger and output_format != "table":
+        raise ValueError("The per-ledger breakdown is only available in the table format.")
+    start, end = resolve_range(year, start, end)
+    results = None
+    if is_multi_ledger(expenses_path, storage):
+        # Each ledger is aggregated on its own worker; cells merge exactly since they are kept in cents.
+        results = map_ledgers(report_cells, expand_ledgers(expenses_path, storage), storage, (group_by, category, start, end), workers)
+        cells, skipped = merge_partitions(partial for _, partial, _ in results)
+    else:
+        cells, skipped = report_cells(open_storage(expenses_path, storage), group_by, category, start, end, workers)
+    report = format_report(cells, group_by, metrics, output_format)
+    if skipped and output_format == "table":
+        report += f"\nSkipped {skipped} expense(s) with an invalid date or amount."
+    if per_ledger and results is not None:
+        describe = lambda partial: f"{sum(cell[0] for cell in partial[0].values())} row(s), ${sum(cell[1] for cell in partial[0].values()) / 100:.2f}"
+        report = "\n".join([report] + format_breakdown(results, describe))
+    return report
+
+
+def stats_expenses(expenses_path, category=None, year=None, month=None, storage=DEFAULT_STORAGE, output_format="table",
+                   compression=None, precision=None, outliers=False, fence=DEFAULT_OUTLIER_FENCE, workers=None):
+    # Percentiles, spread and distinct merchants per category, merged from per-month sketches rather than sorting rows.
+    from reports import REPORT_FORMATS, format_rows
+    from statsindex import SpendSketch, month_range
+    if (month is not None) and (month < 1 or month > 12):
+        raise ValueError("Invalid month. Please provide a number between 1 and 12.")
+    if output_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown stats format: {output_format}")
+    if workers is not None and workers < 1:
+        raise ValueError("Workers must be at least 1.")
+    if fence <= 0:
+        raise ValueError("The outlier fence must be positive.")
+    if outliers and output_format != "table":
+        raise ValueError("Outliers are only listed in the table format.")
+    if month is not None and year is None:
+        year = datetime.now().year
+    first_month = f"{year:04d}-{month or 1:02d}" if year is not None else None
+    last_month = f"{year:04d}-{month or 12:02d}" if year is not None else None
+    arguments = (category, first_month, last_month, compression, precision)
+    if is_multi_ledger(expenses_path, storage):
+        # Sketches merge like the sums in summary: each ledger is summarized on its own worker, then combined.
+        paths = expand_ledgers(expenses_path, storage)
+        partials = [partial for _, partial, _ in map_ledgers(ledger_stats, paths, storage, arguments, workers)]
+    else:
+        paths = None
+        partials = [ledger_stats(open_storage(expenses_path, storage), *arguments)]
+    sketches = {}
+    for partial in partials:
+        for cell_category, content in partial.items():
+            sketch = SpendSketch.from_json(content)
+            if cell_category in sketches:
+                sketches[cell_category].merge(sketch)
+            else:
+                sketches[cell_category] = sketch
+    if not sketches:
+        return "No expenses found" if output_format == "table" else format_rows(STATS_FIELDS, [], 1, output_format)
+    rows = [stats_row(cell_category, sketches[cell_category]) for cell_category in sorted(sketches, key=str)]
+    if len(sketches) > 1:
+        first = next(iter(sketches.values()))
+        everything = SpendSketch(first.digest.compression, first.merchants.precision)
+        for sketch in sketches.values():
+            everything.merge(sketch)
+        rows.append(stats_row("All", everything))
+    report = format_rows(STATS_FIELDS, rows, 1, output_format)
+    if outliers:
+        fences = {cell_category: outlier_fence(sketch, fence) for cell_category, sketch in sketches.items()}
+        fences = {cell_category: limit for cell_category, limit in fences.items() if limit is not None}
+        start, end = resolve_range(year, None, None)
+        if month is not None:
+            start, end = month_range(first_month)
+        if paths is None:
+            found = [(None, expense_id, expense) for expense_id, expense in find_outliers(open_storage(expenses_path, storage), fences, start, end)]
+        else:
+            found = [(get_ledger_name(path), expense_id, expense) for path, ledger_found, _ in
+                     map_ledgers(find_outliers, paths, storage, (fences, start, end), workers) for expense_id, expense in ledger_found]
+        report += "\n" + "\n".join(format_outliers(found, fences, fence))
+    return report
+
+def ledger_stats(expenses, category=None, first_month=None, last_month=None, compression=None, precision=None):
+    from statsindex import StatsIndex
+    index = StatsIndex.load(expenses, compression=compression, precision=precision)
+    if index.stale:
+        index.refresh(expenses)
+    if index.dirty:
+        # Built, rebuilt or refreshed; committing persists it so the next stats and writes start from here.
+        expenses.commit()
+    return {cell_category: sketch.to_json() for cell_category, sketch in index.merged(category, first_month, last_month).items()}
+
+def stats_row(category, sketch):
+    digest = sketch.digest
+    # The distinct count is an estimate and can overshoot a small group; there are never more merchants than rows.
+    merchants = min(sketch.merchants.estimate(), sketch.moments.count)
+    return [category, sketch.moments.count, round(sketch.moments.mean, 2), round(sketch.moments.stddev(), 2), round(digest.minimum, 2),
+            round(digest.quantile(0.5), 2), round(digest.quantile(0.95), 2), round(digest.maximum, 2), merchants]
+
+def outlier_fence(sketch, fence=DEFAULT_OUTLIER_FENCE):
+    # Tukey's fence: amounts more than `fence` interquartile ranges above the third quartile are far out of the normal range.
+    if sketch.moments.count < MIN_OUTLIER_ROWS:
+        return None
+    lower, upper = sketch.digest.quantile(0.25), sketch.digest.quantile(0.75)
+    return upper + fence * (upper - lower)
+
+def find_outliers(expenses, fences, start=None, end=None):
+    # The sketches give the fences; finding the charges above them is one filtered pass over the range.
+    found = []
+    for expense_id, expense in iter_range(expenses, start=start, end=end):
+        limit = fences.get(expense.get("category"))
+        if limit is not None and is_amount(expense.get("amount")) and float(expense["amount"]) > limit:
+            found.append((expense_id, expense))
+    return found
+
+def format_outliers(found, fences, fence):
+    if not fences:
+        return [f"No category has the {MIN_OUTLIER_ROWS} expenses needed to tell outliers apart."]
+    found.sort(key=lambda item: float(item[2]["amount"]) / max(fences[item[2].get("category")], 0.01), reverse=True)
+    lines = [f"{len(found)} outlier(s) more than {fence:g} interquartile ranges above their category's third quartile:"]
+    for ledger, expense_id, expense in found[:MAX_REPORTED_OUTLIERS]:
+        source = f"{ledger} " if ledger is not None else ""
+        lines.append(f"  {source}{format_expense_line(str(expense_id), expense).strip()} (fence ${fences[expense.get('category')]:.2f})")
+    if len(found) > MAX_REPORTED_OUTLIERS:
+        lines.append(f"  ... and {len(found) - MAX_REPORTED_OUTLIERS} more")
+    return lines
+
+def report_cells(expenses, group_by, category=None, start=None, end=None, workers=1):
+    # One pass collects the three fields every cell needs; the aggregation itself may run on a process pool.
+    from reports import aggregate, aggregate_partition
+    rows = ((expense.get("date"), expense.get("amount"), expense.get("category"))
+            for _, expense in iter_range(expenses, category=category, start=start, end=end))
+    if expenses.streaming:
+        # Splitting rows across workers needs all of them in memory, which is what streaming avoids.
+        return aggregate_partition(rows, group_by)
+    return aggregate(list(rows), group_by, workers)
+
+
+def search_expenses(expenses_path, query, storage=DEFAULT_STORAGE, limit=None):
+    from searchindex import SearchIndex
+    if limit is not None and limit < 0:
+        raise ValueError("Limit cannot be negative.")
+    expenses = open_storage(expenses_path, storage)
+    search = SearchIndex.load(expenses)
+    if search.dirty:
+        # Same as the totals index: persist a freshly built index so the next search skips the scan.
+        expenses.commit()
+    ids = search.search(query)
+    if not ids:
+        return f"No expenses found matching '{query}'"
+    cents = 0
+    lines = [f"{'ID':<4} {'Date':<12} {'Description':<15} {'Amount':<7} {'Category':<10}"]
+    for position, expense_id in enumerate(ids):
+        expense = expenses.get(expense_id)
+        cents += to_cents(expense["amount"])
+        if limit is None or position < limit:
+            lines.append(format_expense_line(str(expense_id), expense))
+    if limit is not None and len(ids) > limit:
+        lines.append(f"... and {len(ids) - limit} more")
+    lines.append(f"Found {len(ids)} expense(s) matching '{query}': ${cents / 100:.2f}")
+    return "\n".join(lines)
+
+
+@exclusive("expenses_path", group_commit=True)
+def delete_expense(expenses_path, expense_id, storage=DEFAULT_STORAGE):
+    expenses = open_storage(expenses_path, storage)
     expense_id = str(expense_id)
-    if expense_id in expenses:
-        del expenses[expense_id]
-        write_json(expenses, expenses_path)
+    previous = expenses.get(expense_id)
+    if previous is not None:
+        indexes = load_indexes(expenses)
+        expenses.delete(expense_id)
+        apply_change(indexes, expense_id, previous, None)
+        expenses.commit()
         return f"Expense deleted successfully (ID: {expense_id})"
     return f"Could not find an expense with id {expense_id}"
 
-def set_budget(budget_path, month, value):
+def get_month_name(month):
+    # calendar drags in locale, which costs a cold start more than the summary itself; only these messages need it.
+    import calendar
+    return calendar.month_name[month]
+
+def get_budget_key(month, year=None):
+    # Plain month keys ("6") are budgets for that month of every year; "2024-06" applies to one year only.
+    return f"{year:04d}-{month:02d}" if year is not None else str(month)
+
+@exclusive("budget_path")
+def set_budget(budget_path, month, value, year=None, category=None, period=None):
+    if category is not None or period is not None:
+        return set_budget_rule(budget_path, value, category, period or "month", month, year)
+    if month is None or month < 1 or month > 12:
+        raise ValueError("Invalid month. Please provide a number between 1 and 12.")
     budgets = read_json(budget_path)
-    budgets[str(month)] = float(value)
+    budgets[get_budget_key(month, year)] = float(value)
     write_json(budgets, budget_path)
-    return f"Successfully configured the budget for month {month} (value: {value})"
+    period = f"{month} of {year}" if year is not None else f"{month}"
+    return f"Successfully configured the budget for month {period} (value: {value})"
 
-def get_budget(budget_path, month):
+def set_budget_rule(budget_path, value, category=None, period="month", month=None, year=None):
+    # Rules live under "rules" as {category or "*": {period: value}}, next to the plain monthly budgets.
+    from budgets import ALL_CATEGORIES, RULES_KEY, describe_rule, parse_period
+    if month is not None or year is not None:
+        raise ValueError("--month and --year only apply to monthly budgets for all categories, not to --category or --period.")
+    length = parse_period(period)
+    if category is not None and not category.strip():
+        raise ValueError("Category cannot be empty.")
+    category = category if category is not None else ALL_CATEGORIES
     budgets = read_json(budget_path)
-    budget_curr_month = budgets.get(str(month))
+    budgets.setdefault(RULES_KEY, {}).setdefault(category, {})[period] = float(value)
+    write_json(budgets, budget_path)
+    scope = describe_rule(category, length, None) if isinstance(length, int) else f"{'all categories' if category == ALL_CATEGORIES else category} per {period}"
+    return f"Successfully configured the budget for {scope} (value: {value})"
+
+def get_budget_rules(budget_path):
+    from budgets import RULES_KEY
+    return load_json(budget_path).get(RULES_KEY, {})
+
+def get_budget(budget_path, month, year=None):
+    budgets = load_json(budget_path)
+    budget_curr_month = budgets.get(get_budget_key(month, year)) if year is not None else None
+    if budget_curr_month is None:
+        budget_curr_month = budgets.get(get_budget_key(month))
     return budget_curr_month
 
-def check_if_budget_exceed(budget_path, expenses, month=None):
+def check_if_budget_exceed(budget_path, totals, month=None, year=None):
     if month is None:
         month =  datetime.now().month
-    budget = get_budget(budget_path, month)
+    if year is None:
+        year = datetime.now().year
+    budget = get_budget(budget_path, month, year)
     if budget is None:
-        return f"No budget configured for {calendar.month_name[month]}"
-    total_expenses = get_total_expenses(expenses, month)
+        return f"No budget configured for {get_month_name(month)}"
+    total_expenses = totals.total(month, year=year)
     if total_expenses > budget:
-        return f"[WARN] You exceeded the budget for {calendar.month_name[month]}"
+        return f"[WARN] You exceeded the budget for {get_month_name(month)}"
     return None
 
-def export_expenses(expenses_path, output_path):
-    expenses = read_json(expenses_path)
-    if not expenses:
+def join_warnings(warning, rules, rule_warnings):
+    # With budget rules configured, a month without its own budget is not worth a "No budget configured" note.
+    if rules and not (warning and warning.startswith("[WARN]")):
+        warning = None
+    return "\n".join(([warning] if warning else []) + rule_warnings) or None
+
+def touched_days(changed):
+    touched = []
+    for expense in changed:
+        expense_date = parse_date(expense.get("date"))
+        if expense_date is not None:
+            touched.append((expense.get("category"), expense_date.date()))
+    return touched
+
+def budget_status(expenses_path, budget_path, storage=DEFAULT_STORAGE, today=None):
+    from budgets import DayIndex, describe_rule, has_rolling_rules, parse_period, period_bounds, rule_usage
+    if today is None:
+        today = date.today()
+    rules = get_budget_rules(budget_path)
+    expenses = open_storage(expenses_path, storage)
+    totals = AggregateIndex.load(expenses)
+    days = DayIndex.load(expenses) if has_rolling_rules(rules) else None
+    rows = []
+    monthly = get_budget(budget_path, today.month, today.year)
+    if monthly is not None:
+        rows.append((f"{get_month_name(today.month)} {today.year}", to_cents(totals.total(today.month, year=today.year)), monthly))
+    for category in sorted(rules):
+        for period, amount in rules[category].items():
+            length = parse_period(period)
+            start, end = period_bounds(length, today)
+            rows.append((describe_rule(category, length, start), rule_usage(totals, days, category, length, start, end), amount))
+    if totals.dirty or (days is not None and days.dirty):
+        # An index had to be built; committing persists it so the next status and writes skip the scan.
+        expenses.commit()
+    if not rows:
+        return "No budgets configured."
+    width = max(len(name) for name, _, _ in rows)
+    lines = [f"{'Budget':<{width}}  {'Used':>12}  {'Limit':>12}  {'Used %':>7}"]
+    for name, cents, amount in rows:
+        share = f"{cents / to_cents(amount) * 100:.1f}%" if to_cents(amount) else "-"
+        flag = "  [OVER]" if cents > to_cents(amount) else ""
+        lines.append(f"{name:<{width}}  {'$' + format(cents / 100, '.2f'):>12}  {'$' + format(float(amount), '.2f'):>12}  {share:>7}{flag}")
+    return "\n".join(lines)
+
+def export_expenses(expenses_path, output_path, storage=DEFAULT_STORAGE, file_format=None, compression=None,
+                    category=None, month=None, start=None, end=None, chunk_size=None, year=None,
+                    workers=None, per_ledger=False):
+    # exporters is only imported to export: with pyarrow installed, importing it would slow every other command's start.
+    from exporters import EXPORT_CHUNK_SIZE, guess_export_options, write_export
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    file_format, compression = guess_export_options(output_path, file_format, compression)
+    if is_multi_ledger(expenses_path, storage):
+        return export_ledgers(expenses_path, output_path, storage, file_format, compression, category, month, start, end,
+                              chunk_size, year, workers, per_ledger)
+    expenses = open_storage(expenses_path, storage)
+    if expenses.is_empty():
         return f"No expenses to export."
-    write_csv(expenses, output_path)
-    return f"The expenses were exported successfully. Path: {output_path}"
+    # Filters are pushed down to the storage (or the date index), so only matching rows are ever serialized.
+    start, end = resolve_range(year, start, end)
+    rows = iter_range(expenses, category=category, month=month, start=start, end=end)
+    exported = write_export(rows, output_path, file_format, compression, chunk_size)
+    return f"The expenses were exported successfully. Path: {output_path} ({exported} row(s), {file_format})"
 
-def write_csv(data, file_path):
-    with open(file_path, "w", encoding="utf-8", newline="") as csv_file:
-        fieldnames = ["date", "description", "amount", "category"] 
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data.values())
-
-def read_json(file_path):
-    if not os.path.exists(file_path):
-        return {}
+def export_ledgers(expenses_path, output_path, storage, file_format, compression, category=None, month=None, start=None, end=None,
+                   chunk_size=None, year=None, workers=None, per_ledger=False):
+    from exporters import EXPORT_CHUNK_SIZE, EXPORT_FIELDS, write_export
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    # Ledgers are filtered in parallel and written one after another; IDs repeat across ledgers, so rows carry their ledger.
+    start, end = resolve_range(year, start, end)
+    results = map_ledgers(export_rows, expand_ledgers(expenses_path, storage), storage, (category, month, start, end), workers)
+    rows = ((expense_id, dict(expense, ledger=get_ledger_name(path))) for path, ledger_rows, _ in results for expense_id, expense in ledger_rows)
+    exported = write_export(rows, output_path, file_format, compression, chunk_size, EXPORT_FIELDS + ["ledger"])
+    message = f"The expenses were exported successfully. Path: {output_path} ({exported} row(s) from {len(results)} ledger(s), {file_format})"
+    if per_ledger:
+        message = "\n".join([message] + format_breakdown(results, lambda ledger_rows: f"{len(ledger_rows)} row(s)"))
+    return message
+
+def export_rows(expenses, category=None, month=None, start=None, end=None):
+    return list(iter_range(expenses, category=category, month=month, start=start, end=end))
+
+@exclusive("expenses_path")
+def export_changes(expenses_path, output_path, storage=DEFAULT_STORAGE, file_format=None, compression=None, chunk_size=None):
+    # Only rows inserted, updated or deleted since the last delta export, tagged with their operation and sequence number.
+    from changelog import ChangeLog
+    from exporters import EXPORT_CHUNK_SIZE, EXPORT_FIELDS, guess_export_options, write_export
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    file_format, compression = guess_export_options(output_path, file_format, compression)
+    if is_multi_ledger(expenses_path, storage):
+        raise ValueError("--since-last exports one ledger at a time.")
+    expenses = open_storage(expenses_path, storage)
+    changes = ChangeLog.load(expenses)
+    first = changes.watermark + 1
+    if changes.complete:
+        rows = ((expense_id, dict(expenses.get(expense_id) or {}, operation=operation, sequence=sequence) if operation != "delete"
+                 else {"operation": operation, "sequence": sequence}) for expense_id, operation, sequence in changes.pending())
+        kind = f"change(s), sequence {first}-{changes.sequence}" if changes.sequence >= first else "change(s)"
+    else:
+        # No log yet, or the ledger was written without it: the warehouse has to replace its copy with this snapshot.
+        rows = ((expense_id, dict(expense, operation="snapshot", sequence=changes.sequence)) for expense_id, expense in expenses.iter_expenses())
+        kind = "row(s) in a full snapshot"
+    exported = write_export(rows, output_path, file_format, compression, chunk_size, EXPORT_FIELDS + ["operation", "sequence"])
+    # The watermark only moves once the file is written, so a failed export is retried from the same point.
+    changes.advance()
+    expenses.commit()
+    return f"The changes were exported successfully. Path: {output_path} ({exported} {kind}, {file_format}). Watermark: {changes.watermark}"
+
+@exclusive("expenses_path")
+def import_expenses(expenses_path, budget_path, input_path, file_format=None, batch_size=IMPORT_BATCH_SIZE, date_format=DATE_FORMAT, storage=DEFAULT_STORAGE):
+    from budgets import check_rules, has_rolling_rules
+    if not os.path.exists(input_path):
+        raise ValueError(f"File not found: {input_path}")
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1.")
+    start = time.perf_counter()
+    expenses = open_storage(expenses_path, storage)
+    rules = get_budget_rules(budget_path)
+    indexes = load_indexes(expenses, create_days=has_rolling_rules(rules))
+    totals, days = indexes["totals"], indexes.get("days")
+    first_id = expense_id = expenses.next_id()
+    imported, batches, pending = 0, 0, 0
+    rejected, rejected_count = [], 0
+    months, touched = set(), set()
+
+    for line_number, row in iter_import_rows(input_path, file_format):
+        try:
+            expense = parse_import_row(row, date_format)
+        except ValueError as e:
+            rejected_count += 1
+            if len(rejected) < MAX_REPORTED_REJECTS:
+                rejected.append(f"line {line_number}: {e}")
+            continue
+        expenses.put(expense_id, expense)
+        apply_change(indexes, expense_id, None, expense)
+        expense_date = datetime.strptime(expense["date"], DATE_FORMAT)
+        months.add((expense_date.year, expense_date.month))
+        touched.add((expense["category"], expense_date.date()))
+        expense_id += 1
+        imported += 1
+        pending += 1
+        if pending >= batch_size:
+            expenses.commit()
+            batches += 1
+            pending = 0
+    if pending:
+        expenses.commit()
+        batches += 1
+
+    elapsed = time.perf_counter() - start
+    ids = f" (IDs {first_id}-{expense_id - 1})" if imported else ""
+    message = [f"Imported {imported} expense(s) in {batches} batch(es){ids}, rejected {rejected_count} row(s). "
+               f"{imported + rejected_count} row(s) in {elapsed:.2f}s ({(imported + rejected_count) / max(elapsed, 1e-9):.0f} rows/s)"]
+    message += rejected
+    if rejected_count > len(rejected):
+        message.append(f"... and {rejected_count - len(rejected)} more rejected row(s)")
+    for year, month in sorted(months):
+        warning = check_if_budget_exceed(budget_path, totals, month, year)
+        if warning and warning.startswith("[WARN]"):
+            message.append(warning)
+    message += check_rules(rules, totals, days, sorted(touched), date.today())
+    return "\n".join(message)
+
+def iter_import_rows(input_path, file_format=None):
+    if file_format is None:
+        file_format = "csv" if input_path.lower().endswith(".csv") else "jsonl"
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {file_format}")
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except json.JSONDecodeError:
-        raise RuntimeError("File is corrupt. Please fix or delete it manually.")
-    except Exception as e:
+        with open(input_path, "r", encoding="utf-8", newline="") as file:
+            if file_format == "csv":
+                import csv
+                reader = csv.DictReader(file)
+                for row in reader:
+                    yield reader.line_num, row
+                return
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = e
+                yield line_number, row
+    except OSError as e:
         raise RuntimeError(f"Unexpected error reading file: {e}")
 
-    
-def write_json(content, file_path):
-    try:
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(content, file, indent=4)
-    except Exception as e:
-        raise RuntimeError(f"Failed to write the content: {e}")
\ No newline at end of file
+def parse_import_row(row, date_format=DATE_FORMAT):
+    if isinstance(row, json.JSONDecodeError):
+        raise ValueError(f"Invalid JSON: {row}")
+    if not isinstance(row, dict):
+        raise ValueError("Each row must be an object.")
+    description = row.get("description") or ""
+    if not str(description).strip():
+        raise ValueError("Description cannot be empty.")
+    amount = validate_amount(row.get("amount"))
+    date = row.get("date")
+    if date:
+        try:
+            date = datetime.strptime(str(date).strip(), date_format).strftime(DATE_FORMAT)
+        except ValueError:
+            raise ValueError(f"Invalid date: {date}")
+    else:
+        date = datetime.now().strftime(DATE_FORMAT)
+    category = row.get("category")
+    if not category or not str(category).strip():
+        category = DEFAULT_CATEGORY
+    return {"date": date, "description": str(description), "amount": amount, "category": str(category)}
+
+@exclusive("target_path")
+def migrate_expenses(expenses_path, target_path, storage=DEFAULT_STORAGE, target_storage="sqlite"):
+    source = open_storage(expenses_path, storage)
+    target = open_storage(target_path, target_storage)
+    if target.count():
+        raise ValueError(f"The target ledger {target_path} is not empty.")
+    migrated = 0
+    for expense_id, expense in source.iter_expenses():
+        target.put(expense_id, expense)
+        migrated += 1
+    target.commit()
+    return f"Migrated {migrated} expense(s) from {expenses_path} ({storage}) to {target_path} ({target_storage})"
+
+@exclusive("expenses_path")
+def compact_expenses(expenses_path):
+    journal_path = get_journal_path(expenses_path)
+    records = read_journal(journal_path)
+    if not records:
+        return "The journal is empty. Nothing to compact."
+    expenses = open_storage(expenses_path, "json")
+    indexes = load_indexes(expenses)
+    before = expenses.identity()
+    write_json(expenses.expenses, expenses_path)
+    os.remove(journal_path)
+    # The ledger's identity changed under every index, so all of them are saved, not only the dirty ones.
+    for index in indexes.values():
+        index.dirty = True
+    expenses.save_indexes(before)
+    return f"Compacted {len(records)} journal record(s) into {expenses_path}"
+
+@exclusive("expenses_path")
+def rebuild_totals(expenses_path, storage=DEFAULT_STORAGE, check=False):
+    expenses = open_storage(expenses_path, storage)
+    if not check:
+        from budgets import DayIndex
+        from dateindex import DateIndex
+        from searchindex import SearchIndex
+        from statsindex import StatsIndex
+        if not expenses.prunes_dates:
+            expenses.cache["dates"] = DateIndex.build(expenses)
+        for index_class in (SearchIndex, DayIndex, StatsIndex):
+            path = index_class.index_path(expenses)
+            if os.path.exists(path):
+                expenses.cache[index_class.key] = index_class.outdated(expenses, read_json(path))
+        totals = rebuild_index(expenses)
+        return f"Rebuilt the totals index ({len(totals.totals)} month(s))"
+    mismatches = check_index(expenses)
+    if mismatches is None:
+        return "No totals index found. Run rebuild-index to create it."
+    if not mismatches:
+        return "The totals index is consistent with the ledger."
+    lines = [f"The totals index has {len(mismatches)} inconsistent cell(s):"]
+    for month_key, category, stored, scanned in mismatches:
+        lines.append(f"{month_key} {category}: index ${stored[0] / 100:.2f} ({stored[1]} rows), ledger ${scanned[0] / 100:.2f} ({scanned[1]} rows)")
+    return "\n".join(lines)
+
+def write_csv(data, file_path):
+    from exporters import write_export
+    write_export(data.items(), file_path, "csv")
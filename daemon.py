@@ -0,0 +1,152 @@
+import os
+
+DEFAULT_SOCKET_PATH = "data/expense-tracker.sock"
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_MAX_BATCH = 256
+REQUEST_TIMEOUT = 5
+# Commands that always run in the calling process, as they read their input there or are the daemon itself.
+LOCAL_COMMANDS = ("serve", "batch")
+
+
+def get_socket_path(socket_path=None):
+    return socket_path or os.environ.get("EXPENSE_TRACKER_SOCKET") or DEFAULT_SOCKET_PATH
+
+
+def forward(argv, socket_path=None):
+    # Returns None when no daemon is listening, so the caller can run the command itself.
+    socket_path = get_socket_path(socket_path)
+    if os.environ.get("EXPENSE_TRACKER_NO_DAEMON") or not os.path.exists(socket_path):
+        return None
+    # Imported only once a socket file exists: every CLI call comes through here, and most find no daemon.
+    import json
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+    # Once connected the daemon may already have run the command, so errors are no longer retried locally.
+    try:
+        with client:
+            send_message(client, {"argv": argv, "cwd": os.getcwd()})
+            response = receive_message(client)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Lost the connection to the daemon: {e}")
+    if response is None:
+        raise RuntimeError("The daemon closed the connection without answering.")
+    return response
+
+
+def is_running(socket_path):
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+def send_message(connection, message):
+    import json
+    connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def receive_message(connection):
+    import json
+    with connection.makefile("rb") as stream:
+        line = stream.readline()
+    return json.loads(line) if line else None
+
+
+def serve(execute, socket_path=None, flush_interval=DEFAULT_FLUSH_INTERVAL, max_batch=DEFAULT_MAX_BATCH):
+    import signal
+    import socket
+    from storage import session
+    socket_path = get_socket_path(socket_path)
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            raise RuntimeError(f"A daemon is already listening on {socket_path}.")
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(128)
+    previous_handler = signal.signal(signal.SIGTERM, stop_serving)
+    waiting = []
+    try:
+        with session() as current:
+            try:
+                while True:
+                    # While writes wait for their group commit, the next request only has flush_interval to arrive.
+                    server.settimeout(flush_interval if waiting else None)
+                    try:
+                        connection, _ = server.accept()
+                    except socket.timeout:
+                        group_commit(current, waiting)
+                        continue
+                    connection.settimeout(REQUEST_TIMEOUT)
+                    commits = current.commits
+                    response = handle(connection, execute)
+                    if response is None:
+                        connection.close()
+                    elif current.commits != commits:
+                        waiting.append((connection, response))
+                    else:
+                        reply(connection, response)
+                    if len(waiting) >= max_batch:
+                        group_commit(current, waiting)
+            finally:
+                group_commit(current, waiting)
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def stop_serving(signum, frame):
+    raise SystemExit(0)
+
+
+def handle(connection, execute):
+    try:
+        request = receive_message(connection)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(request, dict) or not isinstance(request.get("argv"), list):
+        return {"code": 1, "stdout": "", "stderr": "[ERROR] Application error: malformed request\n"}
+    try:
+        return execute(request["argv"], request.get("cwd") or os.getcwd())
+    except Exception as e:
+        return {"code": 1, "stdout": "", "stderr": f"[ERROR] An unexpected error occurred: {e}\n"}
+
+
+def group_commit(current, waiting):
+    # One flush covers every write queued since the last one; their clients are answered afterwards.
+    if not current.dirty and not waiting:
+        return
+    failure = None
+    try:
+        current.flush()
+    except Exception as e:
+        failure = e
+        # The in-memory ledgers are ahead of the files now, so reload them on the next request.
+        current.dirty = []
+        current.close()
+    for connection, response in waiting:
+        if failure is not None:
+            response = {"code": 1, "stdout": "", "stderr": f"[ERROR] Application error: failed to write the ledger: {failure}\n"}
+        reply(connection, response)
+    waiting.clear()
+
+
+def reply(connection, response):
+    try:
+        send_message(connection, response)
+    except OSError:
+        pass
+    finally:
+        connection.close()
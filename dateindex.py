@@ -0,0 +1,97 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from storage import DATES_SUFFIX, SidecarIndex, parse_date
+
+
+def day_ordinal(value):
+    # Slicing "DD-MM-YYYY" is several times faster than strptime, which matters when building for millions of rows.
+    try:
+        if len(value) == 10 and value[2] == value[5] == "-":
+            return date(int(value[6:]), int(value[3:5]), int(value[:2])).toordinal()
+    except (TypeError, ValueError):
+        return None
+    parsed = parse_date(value)
+    return parsed.toordinal() if parsed is not None else None
+
+
+class DateIndex(SidecarIndex):
+    # (day ordinal, id) pairs sorted by date, kept next to the ledger so date ranges are two binary searches.
+    # Writers load it with create=False: ledgers that never ran a range query do not pay for it.
+    key = "dates"
+    suffix = DATES_SUFFIX
+
+    def __init__(self, days=None, ids=None, source=None):
+        self.days = days if days is not None else []
+        self.ids = ids if ids is not None else []
+        self.source = source
+        self.dirty = False
+
+    @classmethod
+    def from_rows(cls, expenses):
+        pairs = []
+        for expense_id, expense in expenses.iter_expenses():
+            day = day_ordinal(expense.get("date"))
+            if day is not None:
+                pairs.append((day, int(expense_id)))
+        pairs.sort()
+        index = cls([day for day, _ in pairs], [expense_id for _, expense_id in pairs])
+        return index
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(content["days"], content["ids"])
+
+    def to_content(self):
+        return {"days": self.days, "ids": self.ids}
+
+    def remove(self, expense_id, expense):
+        day = day_ordinal(expense.get("date"))
+        if day is None:
+            return
+        low, high = bisect_left(self.days, day), bisect_right(self.days, day)
+        position = bisect_left(self.ids, int(expense_id), low, high)
+        if position < high and self.ids[position] == int(expense_id):
+            del self.days[position]
+            del self.ids[position]
+
+    def insert(self, expense_id, expense):
+        day = day_ordinal(expense.get("date"))
+        if day is None:
+            return
+        low, high = bisect_left(self.days, day), bisect_right(self.days, day)
+        position = bisect_left(self.ids, int(expense_id), low, high)
+        self.days.insert(position, day)
+        self.ids.insert(position, int(expense_id))
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        if old_expense is not None:
+            self.remove(expense_id, old_expense)
+        if new_expense is not None:
+            self.insert(expense_id, new_expense)
+
+    def ids_between(self, start=None, end=None):
+        low = bisect_left(self.days, start.toordinal()) if start is not None else 0
+        high = bisect_right(self.days, end.toordinal()) if end is not None else len(self.days)
+        return self.ids[low:high]
+
+
+def iter_range(expenses, category=None, month=None, start=None, end=None):
+    # SQLite (day column) and partitioned ledgers (one file per month) narrow ranges themselves; JSON ledgers only touch the rows inside the range.
+    # A streamed ledger is filtered as it is read: fetching rows by ID would load all of it.
+    if (start is None and end is None) or expenses.prunes_dates or expenses.streaming:
+        yield from expenses.iter_expenses(category=category, month=month, start=start, end=end)
+        return
+    index = DateIndex.load(expenses)
+    if index.dirty:
+        expenses.commit()
+    for expense_id in sorted(index.ids_between(start, end)):
+        expense = expenses.get(expense_id)
+        if expense is None:
+            continue
+        if category is not None and expense.get("category") != category:
+            continue
+        if month is not None and date.fromordinal(day_ordinal(expense["date"])).month != month:
+            continue
+        yield str(expense_id), expense
@@ -0,0 +1,138 @@
+import csv
+import gzip
+import io
+import json
+import os
+from itertools import islice
+
+from storage import parse_date
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = ("csv", "jsonl", "arrow", "parquet")
+EXPORT_COMPRESSIONS = ("gzip", "zstd")
+EXPORT_CHUNK_SIZE = 10000
+EXPORT_FIELDS = ["id", "date", "description", "amount", "category"]
+FORMAT_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".arrow": "arrow",
+                     ".feather": "arrow", ".ipc": "arrow", ".parquet": "parquet"}
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+def guess_export_options(output_path, file_format=None, compression=None):
+    name = output_path.lower()
+    for extension, guessed in COMPRESSION_EXTENSIONS.items():
+        if name.endswith(extension):
+            compression = compression or guessed
+            name = name[:-len(extension)]
+    if file_format is None:
+        file_format = next((guessed for extension, guessed in FORMAT_EXTENSIONS.items() if name.endswith(extension)), "csv")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+    if compression is not None and compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return file_format, compression
+
+
+def iter_chunks(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def write_export(rows, output_path, file_format="csv", compression=None, chunk_size=EXPORT_CHUNK_SIZE, fields=EXPORT_FIELDS):
+    chunks = iter_chunks(rows, chunk_size)
+    if file_format in ("arrow", "parquet"):
+        return write_arrow(chunks, output_path, file_format, compression, fields)
+    try:
+        with open_text_output(output_path, compression) as file:
+            if file_format == "jsonl":
+                return write_jsonl(chunks, file)
+            return write_csv(chunks, file, fields)
+    except OSError as e:
+        raise RuntimeError(f"Failed to write the content: {e}")
+
+
+def open_text_output(output_path, compression=None):
+    if compression == "gzip":
+        return gzip.open(output_path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package.")
+        writer = zstandard.ZstdCompressor().stream_writer(open(output_path, "wb"))
+        return io.TextIOWrapper(writer, encoding="utf-8", newline="")
+    return open(output_path, "w", encoding="utf-8", newline="")
+
+
+def write_csv(chunks, file, fields=EXPORT_FIELDS):
+    writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    exported = 0
+    for chunk in chunks:
+        writer.writerows({"id": expense_id, **expense} for expense_id, expense in chunk)
+        exported += len(chunk)
+    return exported
+
+
+def write_jsonl(chunks, file):
+    exported = 0
+    for chunk in chunks:
+        file.write("".join(json.dumps({"id": expense_id, **expense}) + "\n" for expense_id, expense in chunk))
+        exported += len(chunk)
+    return exported
+
+
+def write_arrow(chunks, output_path, file_format, compression=None, fields=EXPORT_FIELDS):
+    if pyarrow is None:
+        raise RuntimeError(f"The {file_format} format requires the 'pyarrow' package.")
+    types = {"id": pyarrow.int64(), "date": pyarrow.date32(), "amount": pyarrow.float64(), "sequence": pyarrow.int64()}
+    schema = pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in fields])
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(output_path, schema, compression=compression or "snappy")
+    else:
+        if compression == "gzip":
+            raise ValueError("The arrow format supports zstd compression only.")
+        options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+        writer = pyarrow.ipc.new_file(output_path, schema, options=options)
+    exported = 0
+    try:
+        with writer:
+            for chunk in chunks:
+                writer.write_batch(arrow_batch(chunk, schema))
+                exported += len(chunk)
+    except Exception as e:
+        # A half-written file would pass for a complete export, so it goes.
+        remove_partial(output_path)
+        if isinstance(e, RuntimeError):
+            raise
+        raise RuntimeError(f"Failed to write the content: {e}")
+    return exported
+
+
+def remove_partial(output_path):
+    try:
+        os.remove(output_path)
+    except OSError:
+        pass
+
+
+def arrow_batch(chunk, schema):
+    columns = []
+    for name in schema.names:
+        if name == "id":
+            columns.append([int(expense_id) for expense_id, _ in chunk])
+        elif name == "date":
+            dates = [parse_date(expense.get("date")) for _, expense in chunk]
+            columns.append([expense_date.date() if expense_date else None for expense_date in dates])
+        else:
+            columns.append([expense.get(name) for _, expense in chunk])
+    return pyarrow.record_batch([pyarrow.array(column, field.type) for column, field in zip(columns, schema)], schema=schema)
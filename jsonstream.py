@@ -0,0 +1,119 @@
+import json
+import re
+from json.decoder import scanstring
+
+# Big enough that the per-chunk Python overhead disappears, small enough to be noise next to the interpreter itself.
+CHUNK_SIZE = 1 << 16
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER_CONTINUATIONS = ".eE+-"
+# From the end of one value to the opening quote of the next key, and from the end of a key to its value.
+NEXT_KEY = re.compile(r'[ \t\n\r]*,[ \t\n\r]*"')
+COLON = re.compile(r"[ \t\n\r]*:[ \t\n\r]*")
+
+
+def iter_json_object(file_path, chunk_size=CHUNK_SIZE):
+    # The (key, value) pairs of a file holding one JSON object, decoded one value at a time.
+    try:
+        file = open(file_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        raise RuntimeError(f"Unexpected error reading file: {e}")
+    with file:
+        try:
+            yield from ObjectReader(file, chunk_size)
+        except json.JSONDecodeError:
+            raise RuntimeError("File is corrupt. Please fix or delete it manually.")
+        except (OSError, UnicodeDecodeError) as e:
+            raise RuntimeError(f"Unexpected error reading file: {e}")
+
+
+class ObjectReader:
+    # Walks the top-level object event by event ("{", key, ":", value, "," or "}"); keys and values themselves are
+    # decoded by json's C scanner. Only the unread part of the current chunk and the value being decoded are held.
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+
+    def fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        # The next significant character, or "" at the end of the file.
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.buffer, self.position)
+        self.position += 1
+        return character
+
+    def decode(self, scan):
+        while True:
+            try:
+                value, end = scan(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # Most likely cut off by the end of the chunk; a real syntax error fails again once the file runs out.
+                if self.fill():
+                    continue
+                raise
+            # A number cut off by the end of the chunk ("1" of "12", "-0" of "-0.5", "1" of "1e3") may go on in the next one.
+            truncated = end == len(self.buffer) or (isinstance(value, (int, float)) and self.buffer[end] in NUMBER_CONTINUATIONS)
+            if not truncated or not self.fill():
+                self.position = end
+                return value
+
+    def scan_key(self, buffer, position):
+        return scanstring(buffer, position + 1)
+
+    def iter_buffered(self):
+        # The fast path: pairs that lie wholly inside the buffer cost two regex matches and two C scans each.
+        # Anything it cannot finish (the end of the chunk, the end of the object, bad syntax) is left to the event path.
+        buffer, position, scan = self.buffer, self.position, self.decoder.scan_once
+        while True:
+            match = NEXT_KEY.match(buffer, position)
+            if match is None:
+                return
+            try:
+                key, end = scanstring(buffer, match.end())
+                match = COLON.match(buffer, end)
+                if match is None:
+                    return
+                value, end = scan(buffer, match.end())
+            except (json.JSONDecodeError, StopIteration):
+                return
+            if end == len(buffer) or (isinstance(value, (int, float)) and buffer[end] in NUMBER_CONTINUATIONS):
+                return
+            position = self.position = end
+            yield key, value
+
+    def __iter__(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+        else:
+            while True:
+                if self.peek() != '"':
+                    raise json.JSONDecodeError("Expecting property name enclosed in double quotes", self.buffer, self.position)
+                key = self.decode(self.scan_key)
+                self.expect(":")
+                self.peek()
+                yield key, self.decode(self.decoder.raw_decode)
+                yield from self.iter_buffered()
+                if self.expect(",}") == "}":
+                    break
+        if self.peek():
+            raise json.JSONDecodeError("Extra data", self.buffer, self.position)
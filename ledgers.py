@@ -0,0 +1,73 @@
+import glob
+import os
+import time
+
+from storage import (CHANGES_SUFFIX, DATES_SUFFIX, DAYS_SUFFIX, JOURNAL_SUFFIX, MANIFEST_NAME, SEARCH_SUFFIX, SNAPSHOT_SUFFIX,
+                     STATS_SUFFIX, TOTALS_SUFFIX, open_storage)
+
+# What a ledger looks like inside a directory, per backend; partitioned ledgers are directories themselves.
+LEDGER_PATTERNS = {"json": "*.json", "journal": "*.json", "sqlite": "*.db", "binary": "*.bin", "partitioned": "*/"}
+SIDECAR_SUFFIXES = (TOTALS_SUFFIX, DATES_SUFFIX, SEARCH_SUFFIX, DAYS_SUFFIX, CHANGES_SUFFIX, STATS_SUFFIX, JOURNAL_SUFFIX, SNAPSHOT_SUFFIX)
+
+
+def is_multi_ledger(expenses_path, storage):
+    if isinstance(expenses_path, str) and glob.has_magic(expenses_path):
+        return True
+    if not isinstance(expenses_path, str) or not os.path.isdir(expenses_path):
+        return False
+    # A directory is a single partitioned ledger when it has a manifest, and a directory of ledgers otherwise.
+    return storage != "partitioned" or not os.path.exists(os.path.join(expenses_path, MANIFEST_NAME))
+
+
+def expand_ledgers(expenses_path, storage):
+    pattern = expenses_path
+    if not glob.has_magic(expenses_path):
+        pattern = os.path.join(expenses_path, LEDGER_PATTERNS[storage])
+    paths = []
+    for path in sorted(glob.glob(pattern)):
+        path = os.path.normpath(path)
+        if path.endswith(SIDECAR_SUFFIXES) or os.path.basename(path).startswith("."):
+            continue
+        if storage == "partitioned" and not os.path.isdir(path):
+            continue
+        paths.append(path)
+    if not paths:
+        raise ValueError(f"No {storage} ledgers found in {expenses_path}")
+    return paths
+
+
+def get_ledger_name(path):
+    return os.path.basename(os.path.normpath(path))
+
+
+def run_ledger(function, path, storage, arguments):
+    # Runs in a worker: opens one ledger, computes its partial result and times the whole thing.
+    started = time.perf_counter()
+    expenses = open_storage(path, storage)
+    try:
+        result = function(expenses, *arguments)
+    finally:
+        # Ledgers opened through a batch session stay open until the session ends.
+        if expenses.session is None:
+            expenses.close()
+    return path, result, time.perf_counter() - started
+
+
+def map_ledgers(function, paths, storage, arguments=(), workers=None):
+    # Decoding JSON is CPU-bound, so ledgers are spread over processes rather than threads.
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return [run_ledger(function, path, storage, arguments) for path in paths]
+    # Imported here: concurrent.futures costs more than a whole summary, and most runs never start a pool.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_ledger, function, path, storage, arguments) for path in paths]
+        return [future.result() for future in futures]
+
+
+def format_breakdown(results, describe):
+    lines = ["Per ledger:"]
+    width = max(len(get_ledger_name(path)) for path, _, _ in results)
+    for path, result, seconds in results:
+        lines.append(f"  {get_ledger_name(path):<{width}}  {describe(result)}  ({seconds * 1000:.1f} ms)")
+    return lines
@@ -0,0 +1,161 @@
+import functools
+import json
+import os
+import time
+
+from storage import Storage, acquire_lock, current_session, read_json, release_lock, session, write_json
+
+QUEUE_SUFFIX = ".queue"
+GROUP_COMMIT_ENV = "EXPENSE_TRACKER_GROUP_COMMIT"
+
+_queued_functions = {}
+
+
+def exclusive(path_argument, group_commit=False):
+    # Runs the command under the advisory lock of the file named by path_argument.
+    def decorator(function):
+        if group_commit:
+            _queued_functions[function.__name__] = function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            arguments = bind_arguments(function, args, kwargs)
+            path = arguments[path_argument]
+            if isinstance(path, Storage):
+                return function(*args, **kwargs)
+            active = current_session()
+            if active is not None:
+                active.hold_lock(path)
+                return function(*args, **kwargs)
+            if group_commit and group_commit_enabled() and is_serializable(arguments):
+                # Queueing costs two more fsynced files, so it is only worth it when another writer holds the lock.
+                lock_file = acquire_lock(path, blocking=False)
+                if lock_file is None or has_queued(path + QUEUE_SUFFIX):
+                    return run_grouped(path, function.__name__, arguments, lock_file)
+            else:
+                lock_file = acquire_lock(path)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                release_lock(lock_file)
+        return wrapper
+    return decorator
+
+
+def bind_arguments(function, args, kwargs):
+    # What inspect.signature().bind() plus apply_defaults() gives for plain positional-or-keyword parameters,
+    # without importing inspect, which alone costs a write command more than the write itself.
+    code = function.__code__
+    names = code.co_varnames[:code.co_argcount]
+    defaults = function.__defaults__ or ()
+    arguments = dict(zip(names[len(names) - len(defaults):], defaults))
+    arguments.update(zip(names, args))
+    arguments.update(kwargs)
+    return arguments
+
+
+def group_commit_enabled():
+    return os.environ.get(GROUP_COMMIT_ENV, "1") != "0"
+
+
+def is_serializable(arguments):
+    try:
+        json.dumps(arguments)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def has_queued(queue_path):
+    try:
+        return any(name.endswith(".request") for name in os.listdir(queue_path))
+    except OSError:
+        return False
+
+
+def run_grouped(path, name, arguments, lock_file=None):
+    # Queue the write, then wait for the lock unless the caller already holds it. Whoever has the lock runs every
+    # queued write in one flush from its own working directory, so relative paths are made absolute first.
+    arguments = {key: os.path.abspath(value) if key.endswith("_path") and isinstance(value, str) else value
+                 for key, value in arguments.items()}
+    queue_path = path + QUEUE_SUFFIX
+    request = f"{time.time_ns():020d}-{os.getpid()}-{os.urandom(16).hex()}"
+    try:
+        try:
+            os.makedirs(queue_path, exist_ok=True)
+        except OSError as e:
+            raise RuntimeError(f"Failed to create the write queue: {e}")
+        write_json({"function": name, "arguments": arguments}, os.path.join(queue_path, request + ".request"))
+    except RuntimeError:
+        if lock_file is not None:
+            release_lock(lock_file)
+        raise
+    if lock_file is None:
+        lock_file = acquire_lock(path)
+    try:
+        outcome = take_outcome(queue_path, request)
+        if outcome is None:
+            drain_queue(path, queue_path)
+            outcome = take_outcome(queue_path, request)
+    finally:
+        release_lock(lock_file)
+    if outcome is None:
+        raise RuntimeError("The write was dropped from the queue.")
+    if "error" in outcome:
+        raise (ValueError if outcome["type"] == "ValueError" else RuntimeError)(outcome["error"])
+    return outcome["value"]
+
+
+def take_outcome(queue_path, request):
+    outcome_path = os.path.join(queue_path, request + ".result")
+    if not os.path.exists(outcome_path):
+        return None
+    outcome = read_json(outcome_path)
+    os.remove(outcome_path)
+    return outcome
+
+
+def drain_queue(path, queue_path):
+    requests = sorted(name[:-len(".request")] for name in os.listdir(queue_path) if name.endswith(".request"))
+    outcomes = {}
+    try:
+        with session() as current:
+            # The caller already holds the lock; the session must neither take nor release it.
+            current.locks[os.path.abspath(path)] = None
+            for request in requests:
+                request_path = os.path.join(queue_path, request + ".request")
+                if not is_process_alive(int(request.split("-")[1])):
+                    os.remove(request_path)
+                    continue
+                outcomes[request] = run_request(read_json(request_path))
+    except Exception as e:
+        # Nothing reached the disk, so every queued writer gets the failure.
+        outcomes = {request: {"type": "RuntimeError", "error": f"Failed to write the ledger: {e}"} for request in outcomes}
+    for request, outcome in outcomes.items():
+        write_json(outcome, os.path.join(queue_path, request + ".result"))
+        os.remove(os.path.join(queue_path, request + ".request"))
+
+
+def run_request(request):
+    function = _queued_functions.get(request.get("function"))
+    if function is None:
+        return {"type": "RuntimeError", "error": f"Unknown queued command: {request.get('function')}"}
+    try:
+        return {"value": function(**request.get("arguments", {}))}
+    except ValueError as e:
+        return {"type": "ValueError", "error": str(e)}
+    except Exception as e:
+        return {"type": "RuntimeError", "error": str(e)}
+
+
+def is_process_alive(pid):
+    # os.kill(pid, 0) would terminate the process on Windows, so assume it is alive there.
+    if os.name == "nt" or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
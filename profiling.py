@@ -0,0 +1,153 @@
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = "EXPENSE_TRACKER_PROFILE"
+PROFILE_DUMP_ENV = "EXPENSE_TRACKER_PROFILE_DUMP"
+PROFILE_FORMATS = ("summary", "json")
+
+_profile = None
+
+
+def requested_format(flag=False, file_format=None, dump_prefix=None):
+    # --profile-format and --profile-dump imply --profile; EXPENSE_TRACKER_PROFILE=1|summary|json turns it on without flags.
+    if flag or file_format or dump_prefix:
+        return file_format or "summary"
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    return value if value in PROFILE_FORMATS else "summary"
+
+
+def start(dump_prefix=None):
+    global _profile
+    _profile = Profile(dump_prefix or os.environ.get(PROFILE_DUMP_ENV) or None)
+    _profile.start()
+    return _profile
+
+
+def stop(output=None, file_format="summary", counters=None):
+    global _profile
+    profile, _profile = _profile, None
+    if profile is None:
+        return None
+    profile.stop()
+    profile.counters = dict(counters or {})
+    if output is not None:
+        profile.report(output, file_format)
+    return profile
+
+
+def is_active():
+    return _profile is not None
+
+
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # Not profiling costs one global lookup per call.
+            if _profile is None:
+                return function(*args, **kwargs)
+            with _profile.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def phase(name):
+    if _profile is None:
+        yield
+        return
+    with _profile.phase(name):
+        yield
+
+
+class Profile:
+    # Wall time, CPU time and net allocated blocks per phase; nested phases are counted in their parents too.
+    # tracemalloc slows allocation-heavy code such as strptime by an order of magnitude, so it only
+    # runs (and bytes are only reported) for a --profile-dump deep dive.
+
+    def __init__(self, dump_prefix=None):
+        self.dump_prefix = dump_prefix
+        self.phases = {}
+        self.profiler = None
+        self.started = None
+        self.wall = self.cpu = 0.0
+        self.peak_bytes = None
+        # Totals from other layers (e.g. cache hits), reported as they are.
+        self.counters = {}
+
+    def start(self):
+        if self.dump_prefix:
+            # Only a deep dive needs these, and tracemalloc alone takes longer to import than most commands run.
+            import cProfile
+            import tracemalloc
+            tracemalloc.start()
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = (time.perf_counter(), time.process_time())
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.started[0]
+        self.cpu = time.process_time() - self.started[1]
+        if self.profiler is not None:
+            import tracemalloc
+            self.profiler.disable()
+            self.profiler.dump_stats(self.dump_prefix + ".prof")
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.take_snapshot().dump(self.dump_prefix + ".tracemalloc")
+            tracemalloc.stop()
+
+    def allocated(self):
+        if self.profiler is None:
+            return sys.getallocatedblocks(), 0
+        import tracemalloc
+        return sys.getallocatedblocks(), tracemalloc.get_traced_memory()[0]
+
+    @contextmanager
+    def phase(self, name):
+        blocks, allocated = self.allocated()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stats = self.phases.setdefault(name, [0, 0.0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += wall
+            stats[2] += cpu
+            stats[3] += self.allocated()[0] - blocks
+            stats[4] += self.allocated()[1] - allocated
+
+    def to_dict(self):
+        metrics = {"wall_ms": round(self.wall * 1000, 3), "cpu_ms": round(self.cpu * 1000, 3), "phases": {}}
+        if self.peak_bytes is not None:
+            metrics["peak_kib"] = round(self.peak_bytes / 1024, 1)
+        for name, (calls, wall, cpu, blocks, allocated) in self.phases.items():
+            stats = metrics["phases"][name] = {"calls": calls, "wall_ms": round(wall * 1000, 3), "cpu_ms": round(cpu * 1000, 3), "alloc_blocks": blocks}
+            if self.peak_bytes is not None:
+                stats["alloc_kib"] = round(allocated / 1024, 1)
+        if self.counters:
+            metrics["counters"] = self.counters
+        return metrics
+
+    def report(self, output, file_format="summary"):
+        metrics = self.to_dict()
+        if file_format == "json":
+            output.write(json.dumps(metrics) + "\n")
+            return
+        output.write(f"[PROFILE] {'phase':<20} {'calls':>8} {'wall ms':>10} {'cpu ms':>10} {'alloc blocks':>13}{'  alloc KiB' if self.peak_bytes is not None else ''}\n")
+        for name, stats in sorted(metrics["phases"].items(), key=lambda item: -item[1]["wall_ms"]):
+            kib = f" {stats['alloc_kib']:>10.1f}" if "alloc_kib" in stats else ""
+            output.write(f"[PROFILE] {name:<20} {stats['calls']:>8} {stats['wall_ms']:>10.1f} {stats['cpu_ms']:>10.1f} {stats['alloc_blocks']:>13}{kib}\n")
+        output.write(f"[PROFILE] {'total':<20} {'':>8} {metrics['wall_ms']:>10.1f} {metrics['cpu_ms']:>10.1f}\n")
+        if self.counters:
+            output.write(f"[PROFILE] {' '.join(f'{name}={value}' for name, value in self.counters.items())}\n")
+        if self.dump_prefix:
+            output.write(f"[PROFILE] peak traced memory: {metrics['peak_kib']:.1f} KiB\n")
+            output.write(f"[PROFILE] cProfile stats: {self.dump_prefix}.prof, tracemalloc snapshot: {self.dump_prefix}.tracemalloc\n")
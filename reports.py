@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import os
+from datetime import date
+from itertools import repeat
+
+from aggregates import to_cents
+from dateindex import day_ordinal
+
+GROUP_KEYS = {
+    "category": lambda day, category: category,
+    "year": lambda day, category: f"{day.year:04d}",
+    "month": lambda day, category: f"{day.year:04d}-{day.month:02d}",
+    "week": lambda day, category: "{0:04d}-W{1:02d}".format(*day.isocalendar()[:2]),
+    "day": lambda day, category: day.isoformat(),
+}
+METRICS = ("sum", "count", "mean", "min", "max")
+REPORT_FORMATS = ("table", "csv", "json")
+# Below this many rows, starting worker processes costs more than it saves.
+PARALLEL_MIN_ROWS = 200_000
+
+
+def parse_report_fields(value, choices, name):
+    fields = [field.strip() for field in value.split(",") if field.strip()] if isinstance(value, str) else list(value)
+    for field in fields:
+        if field not in choices:
+            raise ValueError(f"Unknown {name}: {field} (expected one of {', '.join(choices)})")
+    if len(set(fields)) != len(fields):
+        raise ValueError(f"Repeated {name} in {', '.join(fields)}")
+    return fields
+
+
+def aggregate_partition(rows, group_by):
+    # Cells are [count, sum, min, max] in cents, so partial results from several partitions merge exactly.
+    key_functions = [GROUP_KEYS[field] for field in group_by]
+    cells = {}
+    skipped = 0
+    for date_value, amount, category in rows:
+        day = day_ordinal(date_value)
+        try:
+            cents = to_cents(amount)
+        except (TypeError, ValueError):
+            day = None
+        if day is None:
+            skipped += 1
+            continue
+        day = date.fromordinal(day)
+        key = tuple(function(day, category) for function in key_functions)
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [1, cents, cents, cents]
+        else:
+            cell[0] += 1
+            cell[1] += cents
+            if cents < cell[2]:
+                cell[2] = cents
+            if cents > cell[3]:
+                cell[3] = cents
+    return cells, skipped
+
+def merge_partitions(partials):
+    cells, skipped = {}, 0
+    for partial_cells, partial_skipped in partials:
+        skipped += partial_skipped
+        for key, partial in partial_cells.items():
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = list(partial)
+            else:
+                cell[0] += partial[0]
+                cell[1] += partial[1]
+                cell[2] = min(cell[2], partial[2])
+                cell[3] = max(cell[3], partial[3])
+    return cells, skipped
+
+def aggregate(rows, group_by, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(rows) < PARALLEL_MIN_ROWS:
+        return aggregate_partition(rows, group_by)
+    from concurrent.futures import ProcessPoolExecutor
+    size = -(-len(rows) // workers)
+    partitions = [rows[start:start + size] for start in range(0, len(rows), size)]
+    with ProcessPoolExecutor(max_workers=len(partitions)) as pool:
+        return merge_partitions(pool.map(aggregate_partition, partitions, repeat(group_by)))
+
+
+def metric_value(cell, metric):
+    count, cents, smallest, largest = cell
+    match metric:
+        case "sum":
+            return round(cents / 100, 2)
+        case "count":
+            return count
+        case "mean":
+            return round(cents / count / 100, 2)
+        case "min":
+            return round(smallest / 100, 2)
+        case "max":
+            return round(largest / 100, 2)
+
+
+def report_rows(cells, metrics):
+    for key in sorted(cells, key=lambda key: tuple(str(part) for part in key)):
+        yield list(key) + [metric_value(cells[key], metric) for metric in metrics]
+
+def format_report(cells, group_by, metrics, output_format="table"):
+    return format_rows(list(group_by) + list(metrics), list(report_rows(cells, metrics)), len(group_by), output_format)
+
+
+def format_rows(header, rows, key_columns, output_format="table"):
+    if output_format == "json":
+        return json.dumps([dict(zip(header, row)) for row in rows], indent=4)
+    if output_format == "csv":
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(rows)
+        return output.getvalue().rstrip("\n")
+    if not rows:
+        return "No expenses found"
+    cells_text = [[f"{value:.2f}" if isinstance(value, float) else str(value) for value in row] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells_text)) for i, column in enumerate(header)]
+    lines = [" ".join(f"{column:<{width}}" for column, width in zip(header, widths)).rstrip()]
+    for row in cells_text:
+        # Group keys read left to right, metric columns line up on the right.
+        lines.append(" ".join(f"{value:<{width}}" if i < key_columns else f"{value:>{width}}" for i, (value, width) in enumerate(zip(row, widths))).rstrip())
+    return "\n".join(lines)
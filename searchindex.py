@@ -0,0 +1,163 @@
+import base64
+import re
+import sys
+from array import array
+from bisect import bisect_left, insort
+from itertools import accumulate
+
+from storage import SEARCH_SUFFIX, SidecarIndex
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Above this size ratio, probing the larger posting list with binary searches beats building a set from it.
+PROBE_RATIO = 8
+
+
+def tokenize(text):
+    return set(TOKEN_PATTERN.findall(str(text).casefold()))
+
+def encode_array(values):
+    values = array("q", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+def decode_array(value):
+    values = array("q", base64.b64decode(value))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def parse_query(query):
+    # Every word must match (AND); a trailing "*" turns the last token of a word into a prefix.
+    terms = []
+    for word in query.split():
+        tokens = TOKEN_PATTERN.findall(word.casefold())
+        for position, token in enumerate(tokens):
+            terms.append((token, word.endswith("*") and position == len(tokens) - 1))
+    if not terms:
+        raise ValueError("The search query must contain at least one word.")
+    return terms
+
+def contains(ids, expense_id):
+    position = bisect_left(ids, expense_id)
+    return position < len(ids) and ids[position] == expense_id
+
+
+class SearchIndex(SidecarIndex):
+    # Inverted index over case-folded description tokens: sorted terms, the length of each term's posting list,
+    # and every posting list back to back in one int64 array. Loading it is a few bulk decodes, not one object per ID.
+    # Writers record changed posting lists in `changed`; saving splices them back in.
+    key = "search"
+    suffix = SEARCH_SUFFIX
+
+    def __init__(self, terms=None, counts=None, ids=None, source=None):
+        self.terms = terms if terms is not None else []
+        self.counts = counts if counts is not None else array("q")
+        self.postings = ids if ids is not None else array("q")
+        self.offsets = array("q", accumulate(self.counts, initial=0))
+        self.changed = {}
+        self.source = source
+        self.dirty = False
+
+    @classmethod
+    def from_rows(cls, expenses):
+        postings = {}
+        for expense_id, expense in expenses.iter_expenses():
+            for token in tokenize(expense.get("description", "")):
+                postings.setdefault(token, []).append(int(expense_id))
+        terms = sorted(postings)
+        ids = array("q")
+        for token in terms:
+            ids.extend(sorted(postings[token]))
+        index = cls(terms, array("q", (len(postings[token]) for token in terms)), ids)
+        return index
+
+    @classmethod
+    def from_content(cls, content):
+        terms = content["terms"].split("\n") if content["terms"] else []
+        return cls(terms, decode_array(content["counts"]), decode_array(content["ids"]))
+
+    def to_content(self):
+        if self.changed:
+            self.merge()
+        return {"terms": "\n".join(self.terms), "counts": encode_array(self.counts), "ids": encode_array(self.postings)}
+
+    def stored_ids(self, position):
+        return self.postings[self.offsets[position]:self.offsets[position + 1]]
+
+    def ids(self, token):
+        if token in self.changed:
+            return self.changed[token]
+        position = bisect_left(self.terms, token)
+        if position < len(self.terms) and self.terms[position] == token:
+            return self.stored_ids(position)
+        return array("q")
+
+    def remove(self, expense_id, expense):
+        for token in tokenize(expense.get("description", "")):
+            ids = self.ids(token)
+            position = bisect_left(ids, int(expense_id))
+            if position < len(ids) and ids[position] == int(expense_id):
+                del ids[position]
+                self.changed[token] = ids
+
+    def insert(self, expense_id, expense):
+        for token in tokenize(expense.get("description", "")):
+            ids = self.ids(token)
+            insort(ids, int(expense_id))
+            self.changed[token] = ids
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        if old_expense is not None:
+            self.remove(expense_id, old_expense)
+        if new_expense is not None:
+            self.insert(expense_id, new_expense)
+
+    def matching(self, token, prefix=False):
+        if not prefix:
+            return self.ids(token)
+        matches = set()
+        position = bisect_left(self.terms, token)
+        while position < len(self.terms) and self.terms[position].startswith(token):
+            if self.terms[position] not in self.changed:
+                matches.update(self.stored_ids(position))
+            position += 1
+        for term, ids in self.changed.items():
+            if term.startswith(token):
+                matches.update(ids)
+        return sorted(matches)
+
+    def search(self, query):
+        # Intersect from the rarest term up, so a common word costs no more than the rare one it is paired with.
+        candidates = sorted((self.matching(token, prefix) for token, prefix in parse_query(query)), key=len)
+        result = list(candidates[0])
+        for ids in candidates[1:]:
+            if not result:
+                break
+            if len(ids) > PROBE_RATIO * len(result):
+                result = [expense_id for expense_id in result if contains(ids, expense_id)]
+            else:
+                result = sorted(set(result).intersection(ids))
+        return result
+
+    def merge(self):
+        # Unchanged runs of terms are copied in bulk, so a write costs one pass of memcpy plus the changed terms.
+        terms, counts, ids = [], array("q"), array("q")
+        position = 0
+        for token in sorted(self.changed):
+            stop = bisect_left(self.terms, token, position)
+            terms.extend(self.terms[position:stop])
+            counts.extend(self.counts[position:stop])
+            ids.extend(self.postings[self.offsets[position]:self.offsets[stop]])
+            position = stop + (stop < len(self.terms) and self.terms[stop] == token)
+            if self.changed[token]:
+                terms.append(token)
+                counts.append(len(self.changed[token]))
+                ids.extend(self.changed[token])
+        terms.extend(self.terms[position:])
+        counts.extend(self.counts[position:])
+        ids.extend(self.postings[self.offsets[position]:])
+        self.terms, self.counts, self.postings = terms, counts, ids
+        self.offsets = array("q", accumulate(counts, initial=0))
+        self.changed = {}
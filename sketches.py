@@ -0,0 +1,215 @@
+import base64
+import math
+import sys
+from array import array
+
+# Accuracy against memory: a t-digest keeps on the order of `compression` centroids (quantile error ~1/compression
+# in the middle, much less in the tails); a HyperLogLog keeps 2**precision one-byte registers (error ~1.04/sqrt(2**precision)).
+DEFAULT_COMPRESSION = 100
+DEFAULT_PRECISION = 10
+MIN_COMPRESSION = 10
+MAX_COMPRESSION = 1000
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+# Values are buffered and folded into the centroids this many times `compression` at a time.
+BUFFER_FACTOR = 5
+
+
+def encode_array(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+def decode_array(typecode, value):
+    values = array(typecode, base64.b64decode(value))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class Moments:
+    # Count, mean and sum of squared deviations, updated with Welford's method and merged with Chan's formula.
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stddev(self):
+        return math.sqrt(max(self.variance(), 0.0))
+
+    def to_json(self):
+        return [self.count, self.mean, self.m2]
+
+    @classmethod
+    def from_json(cls, content):
+        return cls(*content)
+
+
+def validate_compression(compression):
+    if not MIN_COMPRESSION <= compression <= MAX_COMPRESSION:
+        raise ValueError(f"Invalid compression: {compression} (expected {MIN_COMPRESSION} to {MAX_COMPRESSION})")
+    return compression
+
+
+class TDigest:
+    # Merging t-digest (Dunning): sorted (mean, weight) centroids whose size is bounded by the log-odds (k2) scale
+    # function, so centroids near the median are large and those in the tails hold a few values each.
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, centroids=None, minimum=None, maximum=None):
+        self.compression = validate_compression(compression)
+        self.centroids = centroids if centroids is not None else []
+        self.minimum = minimum
+        self.maximum = maximum
+        self.buffer = []
+
+    def add(self, value, weight=1):
+        self.buffer.append([value, weight])
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if len(self.buffer) >= BUFFER_FACTOR * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        if other.minimum is None:
+            return
+        self.buffer.extend([mean, weight] for mean, weight in other.centroids + other.buffer)
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.compress()
+
+    def compress(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        total = sum(weight for _, weight in points)
+        normalizer = self.compression / (4 * math.log(max(total / self.compression, 1)) + 24)
+        centroids = [list(points[0])]
+        seen = 0
+        # A centroid may grow until it spans one unit of k(q) = normalizer * log(q / (1 - q)) from where it starts.
+        limit = total / (1 + math.exp(-1 / normalizer) * total)
+        for mean, weight in points[1:]:
+            current = centroids[-1]
+            if seen + current[1] + weight <= limit:
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                seen += current[1]
+                q = seen / total
+                limit = total if q >= 1 else total / (1 + (1 - q) / q * math.exp(-1 / normalizer))
+                centroids.append([mean, weight])
+        self.centroids = centroids
+
+    def count(self):
+        return sum(weight for _, weight in self.centroids) + sum(weight for _, weight in self.buffer)
+
+    def quantile(self, q):
+        # Interpolates between centroid midpoints, and between the outer centroids and the exact minimum and maximum.
+        self.compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        total = sum(weight for _, weight in self.centroids)
+        target = min(max(q, 0.0), 1.0) * total
+        first_mean, first_weight = self.centroids[0]
+        if target < first_weight / 2:
+            return self.minimum + (first_mean - self.minimum) * target / (first_weight / 2)
+        seen = first_weight / 2
+        for (left_mean, left_weight), (right_mean, right_weight) in zip(self.centroids, self.centroids[1:]):
+            gap = (left_weight + right_weight) / 2
+            if seen + gap > target:
+                return left_mean + (right_mean - left_mean) * (target - seen) / gap
+            seen += gap
+        last_mean, last_weight = self.centroids[-1]
+        return last_mean + (self.maximum - last_mean) * min((target - seen) / (last_weight / 2), 1.0)
+
+    def to_json(self):
+        # Means and weights as packed arrays: a sidecar of hundreds of digests stays a fraction of the ledger's size.
+        self.compress()
+        return {"compression": self.compression, "min": self.minimum, "max": self.maximum,
+                "means": encode_array("d", [mean for mean, _ in self.centroids]),
+                "weights": encode_array("q", [weight for _, weight in self.centroids])}
+
+    @classmethod
+    def from_json(cls, content):
+        centroids = [[mean, weight] for mean, weight in zip(decode_array("d", content["means"]), decode_array("q", content["weights"]))]
+        return cls(content["compression"], centroids, content["min"], content["max"])
+
+
+def validate_precision(precision):
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        raise ValueError(f"Invalid precision: {precision} (expected {MIN_PRECISION} to {MAX_PRECISION})")
+    return precision
+
+
+class HyperLogLog:
+    # Distinct-value estimate from 2**precision registers, each the longest run of leading zeros seen in its bucket.
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        self.precision = validate_precision(precision)
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, value):
+        # hashlib loads the OpenSSL bindings, a few milliseconds of every command's start; only sketch updates need it.
+        from hashlib import blake2b
+        digest = blake2b(str(value).casefold().encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        bits = 64 - self.precision
+        bucket, rest = hashed >> bits, hashed & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[bucket]:
+            self.registers[bucket] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        size = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(size, 0.7213 / (1 + 1.079 / size))
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Small cardinalities: linear counting over the empty registers is far more accurate.
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def to_json(self):
+        # Most month and category cells see a handful of merchants, so only their non-empty registers are stored.
+        used = [(bucket, rank) for bucket, rank in enumerate(self.registers) if rank]
+        if 3 * len(used) < len(self.registers):
+            packed = b"".join(bucket.to_bytes(2, "big") + bytes([rank]) for bucket, rank in used)
+            return {"precision": self.precision, "sparse": base64.b64encode(packed).decode("ascii")}
+        return {"precision": self.precision, "registers": base64.b64encode(bytes(self.registers)).decode("ascii")}
+
+    @classmethod
+    def from_json(cls, content):
+        if "sparse" in content:
+            sketch = cls(content["precision"])
+            packed = base64.b64decode(content["sparse"])
+            for offset in range(0, len(packed), 3):
+                sketch.registers[int.from_bytes(packed[offset:offset + 2], "big")] = packed[offset + 2]
+            return sketch
+        return cls(content["precision"], bytearray(base64.b64decode(content["registers"])))
@@ -0,0 +1,152 @@
+from datetime import date, timedelta
+
+from dateindex import iter_range
+from sketches import DEFAULT_COMPRESSION, DEFAULT_PRECISION, HyperLogLog, Moments, TDigest, validate_precision
+from storage import STATS_SUFFIX, SidecarIndex, expense_cell
+
+
+def stats_cell(expense):
+    cell = expense_cell(expense)
+    if cell is None:
+        return None
+    month_key, category, cents = cell
+    return month_key, category, cents / 100, expense.get("description")
+
+def stored_settings(content):
+    # (compression, precision) the sketches were built with, so a rebuild keeps the accuracy the user asked for.
+    return content.get("compression", DEFAULT_COMPRESSION), content.get("precision", DEFAULT_PRECISION)
+
+def month_range(month_key):
+    start = date(int(month_key[:4]), int(month_key[5:]), 1)
+    return start, (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+
+class SpendSketch:
+    # What `stats` reports for a set of expenses: moments, a t-digest of amounts and a HyperLogLog of descriptions.
+    # Merging two sketches gives the sketch of both sets, so months, categories and ledgers combine freely.
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, precision=DEFAULT_PRECISION, moments=None, digest=None, merchants=None):
+        self.moments = moments if moments is not None else Moments()
+        self.digest = digest if digest is not None else TDigest(compression)
+        self.merchants = merchants if merchants is not None else HyperLogLog(precision)
+
+    def add(self, amount, description):
+        self.moments.add(amount)
+        self.digest.add(amount)
+        if description is not None:
+            self.merchants.add(description)
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        self.merchants.merge(other.merchants)
+
+    def to_json(self):
+        return {"moments": self.moments.to_json(), "digest": self.digest.to_json(), "merchants": self.merchants.to_json()}
+
+    @classmethod
+    def from_json(cls, content):
+        return cls(moments=Moments.from_json(content["moments"]), digest=TDigest.from_json(content["digest"]),
+                   merchants=HyperLogLog.from_json(content["merchants"]))
+
+
+class StatsIndex(SidecarIndex):
+    # A SpendSketch per "YYYY-MM" and category, kept next to the ledger. Cells stay as loaded JSON until a write or a
+    # query touches them. Inserts are added to their cell; a t-digest or HyperLogLog cannot forget a value, so updates
+    # and deletes mark the old cell stale and refresh() rebuilds it from that month's rows alone.
+    key = "stats"
+    suffix = STATS_SUFFIX
+
+    def __init__(self, cells=None, compression=DEFAULT_COMPRESSION, precision=DEFAULT_PRECISION, stale=None, source=None):
+        self.cells = cells if cells is not None else {}
+        self.compression = compression
+        self.precision = validate_precision(precision)
+        self.stale = stale if stale is not None else set()
+        self.source = source
+        self.dirty = False
+
+    @classmethod
+    def from_rows(cls, expenses, compression=DEFAULT_COMPRESSION, precision=DEFAULT_PRECISION):
+        index = cls(compression=compression, precision=precision)
+        for _, expense in expenses.iter_expenses():
+            index.add(expense)
+        return index
+
+    @classmethod
+    def load(cls, expenses, create=True, compression=None, precision=None):
+        # Asking for another compression or precision than the stored one rebuilds every cell with it.
+        index = super().load(expenses, create)
+        if index is not None and ((compression or index.compression) != index.compression or (precision or index.precision) != index.precision):
+            index = expenses.cache[cls.key] = cls.build(expenses, compression or index.compression, precision or index.precision)
+        return index
+
+    @classmethod
+    def outdated(cls, expenses, content):
+        return cls.build(expenses, *stored_settings(content))
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(content["cells"], content["compression"], content["precision"], {tuple(cell) for cell in content["stale"]})
+
+    def to_content(self):
+        cells = {month_key: {category: value.to_json() if isinstance(value, SpendSketch) else value for category, value in categories.items()}
+                 for month_key, categories in self.cells.items()}
+        return {"compression": self.compression, "precision": self.precision, "stale": sorted(self.stale, key=str), "cells": cells}
+
+    def sketch(self, month_key, category, create=False):
+        categories = self.cells.get(month_key)
+        value = categories.get(category) if categories is not None else None
+        if value is None:
+            if not create:
+                return None
+            value = self.cells.setdefault(month_key, {})[category] = SpendSketch(self.compression, self.precision)
+        elif not isinstance(value, SpendSketch):
+            value = categories[category] = SpendSketch.from_json(value)
+        return value
+
+    def add(self, expense):
+        cell = stats_cell(expense)
+        if cell is None:
+            return
+        month_key, category, amount, description = cell
+        if (month_key, category) not in self.stale:
+            self.sketch(month_key, category, create=True).add(amount, description)
+
+    def apply(self, expense_id, old_expense, new_expense):
+        self.dirty = True
+        cell = stats_cell(old_expense) if old_expense is not None else None
+        if cell is not None:
+            self.stale.add(cell[:2])
+        if new_expense is not None:
+            self.add(new_expense)
+
+    def refresh(self, expenses):
+        for month_key, category in sorted(self.stale, key=str):
+            sketch = SpendSketch(self.compression, self.precision)
+            start, end = month_range(month_key)
+            for _, expense in iter_range(expenses, category=category, start=start, end=end):
+                cell = stats_cell(expense)
+                if cell is not None and cell[:2] == (month_key, category):
+                    sketch.add(*cell[2:])
+            categories = self.cells.setdefault(month_key, {})
+            if sketch.moments.count:
+                categories[category] = sketch
+            else:
+                categories.pop(category, None)
+                if not categories:
+                    del self.cells[month_key]
+        self.stale = set()
+        self.dirty = True
+
+    def merged(self, category=None, first_month=None, last_month=None):
+        # One sketch per category over the months from first_month to last_month ("YYYY-MM", inclusive).
+        merged = {}
+        for month_key in self.cells:
+            if (first_month is not None and month_key < first_month) or (last_month is not None and month_key > last_month):
+                continue
+            for cell_category in list(self.cells[month_key]):
+                if category is not None and cell_category != category:
+                    continue
+                sketch = merged.setdefault(cell_category, SpendSketch(self.compression, self.precision))
+                sketch.merge(self.sketch(month_key, cell_category))
+        return merged
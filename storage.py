@@ -0,0 +1,1160 @@
+import heapq
+import json
+import marshal
+import math
+import mmap
+import os
+import stat
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from jsonstream import iter_json_object
+from profiling import timed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+DATE_FORMAT = "%d-%m-%Y"
+JOURNAL_SUFFIX = ".journal"
+MANIFEST_NAME = "manifest.json"
+BINARY_MAGIC = b"EXPB"
+BINARY_VERSION = 1
+# magic, version, record size, record count, description heap size, trailer (categories and extras JSON) size
+BINARY_HEADER = struct.Struct("<4sHHQQQ")
+# id, amount in cents, day ordinal, category code (-1 for none), description offset and length in the heap
+BINARY_RECORD = struct.Struct("<qqiiII")
+UNDATED_PARTITION = "undated"
+LOCK_SUFFIX = ".lock"
+DEFAULT_STORAGE = "json"
+SNAPSHOT_ENV = "EXPENSE_TRACKER_SNAPSHOT"
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_VERSION = 1
+# Indexes derived from a ledger live next to it as "<ledger><suffix>".
+TOTALS_SUFFIX = ".totals.json"
+DATES_SUFFIX = ".dates.json"
+SEARCH_SUFFIX = ".search.json"
+DAYS_SUFFIX = ".days.json"
+CHANGES_SUFFIX = ".changes.json"
+STATS_SUFFIX = ".stats.json"
+# Smaller files decode from JSON about as fast as a snapshot loads.
+SNAPSHOT_MIN_BYTES = 1 << 20
+JSON_CACHE_MAX_BYTES = 256 << 20
+# A file changed this recently may change again within the same mtime tick without its size or inode changing.
+RACY_SECONDS = 1.0
+PARSED_DATES_MAX = 100_000
+# Read-only scans of a JSON ledger at least this big decode it row by row instead of loading it whole.
+STREAM_MIN_BYTES = 64 << 20
+
+
+_session = None
+# Absolute path -> ((mtime_ns, size, inode), marshalled content); hits unmarshal a fresh copy, since callers mutate what they read.
+_json_cache = {}
+_json_cache_stats = {"hits": 0, "snapshot_hits": 0, "misses": 0, "bytes": 0}
+_parsed_dates = {}
+
+
+def open_storage(expenses_path, storage=DEFAULT_STORAGE):
+    # Callers that already hold an open ledger (batch runs, tests) can pass it straight through.
+    if isinstance(expenses_path, Storage):
+        return expenses_path
+    if storage not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage mode: {storage}")
+    if _session is not None:
+        return _session.open_storage(expenses_path, storage)
+    return STORAGE_BACKENDS[storage](expenses_path)
+
+
+def current_session():
+    return _session
+
+
+def load_json(file_path):
+    if _session is not None:
+        return _session.read_json(file_path)
+    return read_json(file_path)
+
+
+@contextmanager
+def session():
+    global _session
+    previous, _session = _session, Session()
+    try:
+        yield _session
+        _session.flush()
+    finally:
+        _session.close()
+        _session = previous
+
+
+class Session:
+    # Keeps ledgers open across commands; commit() only marks them dirty until flush().
+
+    def __init__(self):
+        self.stores = {}
+        self.identities = {}
+        self.json_files = {}
+        self.locks = {}
+        self.dirty = []
+        self.commits = 0
+
+    def open_storage(self, expenses_path, storage):
+        key = (os.path.abspath(expenses_path), storage)
+        store = self.stores.get(key)
+        # Drop a clean ledger that some other process rewrote since we loaded it.
+        if store is not None and store not in self.dirty and store.identity() != self.identities[key]:
+            store.close()
+            store = None
+        if store is None:
+            store = STORAGE_BACKENDS[storage](expenses_path)
+            store.session = self
+            self.stores[key] = store
+            self.identities[key] = store.identity()
+        return store
+
+    def read_json(self, file_path):
+        identity = file_identity(file_path)
+        cached = self.json_files.get(file_path)
+        if cached is None or cached[0] != identity:
+            cached = self.json_files[file_path] = (identity, read_json(file_path))
+        return cached[1]
+
+    def hold_lock(self, file_path):
+        # Writers keep the lock until flush(), so nobody else can change a file we have unflushed edits for.
+        key = os.path.abspath(file_path)
+        if key not in self.locks:
+            self.locks[key] = acquire_lock(file_path)
+
+    def release_locks(self):
+        locks, self.locks = self.locks, {}
+        for lock_file in locks.values():
+            if lock_file is not None:
+                release_lock(lock_file)
+
+    def mark_dirty(self, store):
+        self.commits += 1
+        if store not in self.dirty:
+            self.dirty.append(store)
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, []
+        for store in dirty:
+            store.flush()
+            self.identities[(os.path.abspath(store.path), store.name)] = store.identity()
+        self.release_locks()
+        return len(dirty)
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+        self.stores = {}
+        self.release_locks()
+
+
+class SidecarIndex:
+    # A structure derived from the ledger, stored in "<ledger><suffix>" and, once loaded, in expenses.cache[key].
+    # "source" is the identity of the ledger it matches; a write that bypassed the index changes it, and load() rebuilds.
+    key = None
+    suffix = None
+    version = 1
+
+    @classmethod
+    def index_path(cls, expenses):
+        return expenses.path + cls.suffix
+
+    @classmethod
+    def load(cls, expenses, create=True):
+        # With create=False an index nobody has built yet stays unbuilt, and None is returned.
+        index = expenses.cache.get(cls.key)
+        if index is not None:
+            return index
+        path = cls.index_path(expenses)
+        if not create and not os.path.exists(path):
+            return None
+        content = read_json(path)
+        if content.get("version") == cls.version and content.get("source") == expenses.identity():
+            index = cls.from_content(content)
+            index.source = content["source"]
+        else:
+            index = cls.outdated(expenses, content)
+        expenses.cache[cls.key] = index
+        return index
+
+    @classmethod
+    def outdated(cls, expenses, content):
+        # The stored content is missing, of another version or behind the ledger.
+        return cls.build(expenses)
+
+    @classmethod
+    def build(cls, expenses, *args):
+        # The identity is taken before the rows are read: a write landing meanwhile leaves the index behind, never ahead.
+        source = expenses.read_identity()
+        index = cls.from_rows(expenses, *args)
+        index.source, index.dirty = source, True
+        return index
+
+    @classmethod
+    def from_rows(cls, expenses):
+        raise NotImplementedError
+
+    @classmethod
+    def from_content(cls, content):
+        raise NotImplementedError
+
+    def to_content(self):
+        raise NotImplementedError
+
+    def save(self, expenses, source):
+        self.source = source
+        write_json({"version": self.version, "source": self.source, **self.to_content()}, self.index_path(expenses))
+        self.dirty = False
+
+
+def expense_cell(expense):
+    expense_date = parse_date(expense.get("date"))
+    if expense_date is None:
+        return None
+    try:
+        cents = round(float(expense["amount"]) * 100)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return f"{expense_date.year:04d}-{expense_date.month:02d}", expense.get("category"), cents
+
+
+def file_identity(file_path):
+    # Same key as the parsed-file cache, so an atomic replace within one mtime tick is still a new identity.
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return list(json_cache_key(file_stat))
+
+
+@timed("parse_date")
+def parse_date(date):
+    # A ledger has a few thousand distinct dates at most, so each string goes through strptime once.
+    try:
+        return _parsed_dates[date]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    try:
+        parsed = datetime.strptime(date, DATE_FORMAT)
+    except (TypeError, ValueError):
+        parsed = None
+    if len(_parsed_dates) >= PARSED_DATES_MAX:
+        _parsed_dates.clear()
+    _parsed_dates[date] = parsed
+    return parsed
+
+
+def date_matches(expense_date, month=None, start=None, end=None):
+    if expense_date is None:
+        return False
+    if (month is not None) and (expense_date.month != month):
+        return False
+    if (start is not None) and (expense_date.date() < start):
+        return False
+    if (end is not None) and (expense_date.date() > end):
+        return False
+    return True
+
+
+class Storage:
+    name = None
+    # Backends that narrow date ranges themselves, so the sorted date index would only add work.
+    prunes_dates = False
+    # Backends that scan from disk without holding the ledger, so random access (get) is expensive.
+    streaming = False
+
+    def __init__(self, path):
+        self.path = path
+        self.session = None
+        # Derived structures (e.g. the totals index) that are saved after the ledger itself.
+        self.cache = {}
+
+    def count(self):
+        raise NotImplementedError
+
+    def get(self, expense_id):
+        raise NotImplementedError
+
+    def next_id(self):
+        raise NotImplementedError
+
+    def put(self, expense_id, expense):
+        raise NotImplementedError
+
+    def delete(self, expense_id):
+        raise NotImplementedError
+
+    def iter_expenses(self, category=None, month=None, start=None, end=None):
+        raise NotImplementedError
+
+    def is_empty(self):
+        return not self.count()
+
+    def iter_cells(self):
+        # (month key, category, cents) for every expense with a valid date and amount; feeds the totals index.
+        for _, expense in self.iter_expenses():
+            cell = expense_cell(expense)
+            if cell is not None:
+                yield cell
+
+    def commit(self):
+        if self.session is not None:
+            self.session.mark_dirty(self)
+            return
+        self.flush()
+
+    def flush(self):
+        before = self.identity() if any(index.dirty for index in self.cache.values()) else None
+        self.write()
+        self.save_indexes(before)
+
+    def save_indexes(self, before):
+        # Indexes that matched the ledger as it was before the write match what was just written. One derived from
+        # another version (a writer got in between, e.g. while a reader rebuilt it) keeps that identity and is rebuilt on load.
+        after = None
+        for index in self.cache.values():
+            if index.dirty:
+                after = after or self.identity()
+                index.save(self, after if index.source == before else index.source)
+
+    def write(self):
+        raise NotImplementedError
+
+    def files(self):
+        return [self.path]
+
+    def identity(self):
+        return [file_identity(file_path) for file_path in self.files()]
+
+    def read_identity(self):
+        # The identity of the rows iter_expenses() yields; backends holding the ledger in memory keep the one it was read at.
+        return self.identity()
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    name = "json"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._expenses = None
+        self._read_at = None
+        self._records = []
+
+    @property
+    def expenses(self):
+        if self._expenses is None:
+            self._read_at = self.identity()
+            self._expenses = read_expenses(self.path)
+        return self._expenses
+
+    def read_identity(self):
+        return self._read_at if self._read_at is not None else self.identity()
+
+    @property
+    def streaming(self):
+        # Until something needs random access or a write, a large ledger is read row by row and never held.
+        if self._expenses is not None:
+            return False
+        try:
+            return os.path.getsize(self.path) >= STREAM_MIN_BYTES
+        except OSError:
+            return False
+
+    def count(self):
+        if self.streaming:
+            return sum(1 for _ in self.stream())
+        return len(self.expenses)
+
+    def is_empty(self):
+        if self.streaming:
+            return next(self.stream(), None) is None
+        return not self.expenses
+
+    def get(self, expense_id):
+        expense = self.expenses.get(str(expense_id))
+        return dict(expense) if expense is not None else None
+
+    def next_id(self):
+        return max((int(key) for key in self.expenses), default=0) + 1
+
+    def put(self, expense_id, expense):
+        self.expenses[str(expense_id)] = expense
+        self._records.append(put_record(str(expense_id), expense))
+
+    def delete(self, expense_id):
+        if str(expense_id) not in self.expenses:
+            return False
+        del self.expenses[str(expense_id)]
+        self._records.append(delete_record(str(expense_id)))
+        return True
+
+    def iter_expenses(self, category=None, month=None, start=None, end=None):
+        date_filter = (month is not None) or (start is not None) or (end is not None)
+        for expense_id, expense in (self.stream() if self.streaming else self.expenses.items()):
+            if category is not None and expense.get("category") != category:
+                continue
+            if date_filter and not date_matches(parse_date(expense.get("date")), month, start, end):
+                continue
+            yield expense_id, expense
+
+    def stream(self):
+        # Same rows, in the same order, as read_expenses(): the journal is replayed against the snapshot as it streams by.
+        records = read_journal(get_journal_path(self.path))
+        if not records:
+            yield from iter_json_object(self.path)
+            return
+        latest, deleted, inserted = {}, set(), {}
+        for position, record in enumerate(records):
+            apply_record(latest, record)
+            if record["op"] == "put":
+                # A dict keeps a replaced key where it was, but a key deleted and put again moves to the end.
+                inserted.setdefault(record["id"], position)
+            else:
+                latest[record["id"]] = None
+                deleted.add(record["id"])
+                inserted.pop(record["id"], None)
+        replaced = set()
+        for expense_id, expense in iter_json_object(self.path):
+            if expense_id in deleted:
+                continue
+            if expense_id in latest:
+                replaced.add(expense_id)
+                expense = latest[expense_id]
+            yield expense_id, expense
+        for expense_id in sorted(set(inserted) - replaced, key=inserted.get):
+            yield expense_id, latest[expense_id]
+
+    def files(self):
+        return [self.path, get_journal_path(self.path)]
+
+    def write(self):
+        if not self._records:
+            return
+        write_json(self.expenses, self.path)
+        # The snapshot now contains everything the journal had, so it can go.
+        journal_path = get_journal_path(self.path)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        self._records = []
+        # What is held now is what was written.
+        self._read_at = None
+
+
+class JournalStorage(JsonStorage):
+    name = "journal"
+
+    def write(self):
+        if not self._records:
+            return
+        append_journal(self._records, get_journal_path(self.path))
+        self._records = []
+        self._read_at = None
+
+
+class SqliteStorage(Storage):
+    name = "sqlite"
+    prunes_dates = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY,
+            date TEXT,
+            day INTEGER,
+            month INTEGER,
+            year INTEGER,
+            description TEXT,
+            amount REAL,
+            category TEXT
+        );
+        CREATE INDEX IF NOT EXISTS expenses_day ON expenses (day);
+        CREATE INDEX IF NOT EXISTS expenses_month ON expenses (month, year);
+        CREATE INDEX IF NOT EXISTS expenses_category ON expenses (category, month);
+    """
+    COLUMNS = "id, date, description, amount, category"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            # Imported with the first connection: only SQLite ledgers need it, and it costs every other command's start.
+            import sqlite3
+            try:
+                self._connection = sqlite3.connect(self.path)
+                self._connection.executescript(self.SCHEMA)
+            except sqlite3.Error as e:
+                raise RuntimeError(f"Unexpected error opening database: {e}")
+        return self._connection
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def get(self, expense_id):
+        row = self.connection.execute(f"SELECT {self.COLUMNS} FROM expenses WHERE id = ?", (int(expense_id),)).fetchone()
+        return self._to_expense(row)[1] if row else None
+
+    def next_id(self):
+        return self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM expenses").fetchone()[0]
+
+    def put(self, expense_id, expense):
+        expense_date = parse_date(expense.get("date"))
+        date_columns = (expense_date.toordinal(), expense_date.month, expense_date.year) if expense_date else (None, None, None)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO expenses (id, date, day, month, year, description, amount, category) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (int(expense_id), expense.get("date"), *date_columns, expense.get("description"), expense.get("amount"), expense.get("category")),
+        )
+
+    def delete(self, expense_id):
+        cursor = self.connection.execute("DELETE FROM expenses WHERE id = ?", (int(expense_id),))
+        return cursor.rowcount > 0
+
+    def iter_expenses(self, category=None, month=None, start=None, end=None):
+        conditions, params = [], []
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        if month is not None:
+            conditions.append("month = ?")
+            params.append(month)
+        if start is not None:
+            conditions.append("day >= ?")
+            params.append(start.toordinal())
+        if end is not None:
+            conditions.append("day <= ?")
+            params.append(end.toordinal())
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        for row in self.connection.execute(f"SELECT {self.COLUMNS} FROM expenses{where} ORDER BY id", params):
+            yield self._to_expense(row)
+
+    def write(self):
+        import sqlite3
+        try:
+            self.connection.commit()
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to write the content: {e}")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _to_expense(self, row):
+        expense_id, date, description, amount, category = row
+        return str(expense_id), {"date": date, "description": description, "amount": amount, "category": category}
+
+
+class PartitionedStorage(Storage):
+    # One JSON file per "YYYY-MM" plus a manifest with the ID high-water mark and per-partition stats.
+    name = "partitioned"
+    prunes_dates = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.directory = get_partition_directory(path)
+        self.partitions = {}
+        self._manifest = None
+        self._dirty = set()
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = read_manifest(self.directory)
+        return self._manifest
+
+    def partition(self, key):
+        if key not in self.partitions:
+            self.partitions[key] = read_json(get_partition_path(self.directory, key))
+        return self.partitions[key]
+
+    def keys(self):
+        return sorted(set(self.manifest["partitions"]) | self._dirty)
+
+    def find(self, expense_id):
+        # Only partitions whose ID range covers the ID are opened; usually that is exactly one.
+        for key in self._dirty:
+            if str(expense_id) in self.partitions[key]:
+                return key
+        for key, stats in self.manifest["partitions"].items():
+            if key not in self._dirty and stats["min_id"] <= int(expense_id) <= stats["max_id"] and str(expense_id) in self.partition(key):
+                return key
+        return None
+
+    def count(self):
+        return sum(len(self.partitions[key]) if key in self._dirty else self.manifest["partitions"][key]["count"] for key in self.keys())
+
+    def get(self, expense_id):
+        key = self.find(expense_id)
+        return dict(self.partition(key)[str(expense_id)]) if key is not None else None
+
+    def next_id(self):
+        return self.manifest["next_id"]
+
+    def put(self, expense_id, expense):
+        key = get_partition_key(expense.get("date"))
+        previous = self.find(expense_id)
+        if previous is not None and previous != key:
+            self.delete(expense_id)
+        self.partition(key)[str(expense_id)] = expense
+        self._dirty.add(key)
+        self.manifest["next_id"] = max(self.manifest["next_id"], int(expense_id) + 1)
+
+    def delete(self, expense_id):
+        key = self.find(expense_id)
+        if key is None:
+            return False
+        del self.partition(key)[str(expense_id)]
+        self._dirty.add(key)
+        return True
+
+    def iter_expenses(self, category=None, month=None, start=None, end=None):
+        date_filter = (month is not None) or (start is not None) or (end is not None)
+        first = f"{start.year:04d}-{start.month:02d}" if start is not None else None
+        last = f"{end.year:04d}-{end.month:02d}" if end is not None else None
+        for key in self.keys():
+            if date_filter and key == UNDATED_PARTITION:
+                continue
+            if (month is not None and int(key[5:]) != month) or (first and key < first) or (last and key > last):
+                continue
+            for expense_id, expense in self.partition(key).items():
+                if category is not None and expense.get("category") != category:
+                    continue
+                if date_filter and not date_matches(parse_date(expense.get("date")), month, start, end):
+                    continue
+                yield expense_id, expense
+
+    def files(self):
+        return [os.path.join(self.directory, MANIFEST_NAME)] + [get_partition_path(self.directory, key) for key in self.keys()]
+
+    def write(self):
+        if not self._dirty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for key in sorted(self._dirty):
+            partition_path = get_partition_path(self.directory, key)
+            if self.partitions[key]:
+                write_json(self.partitions[key], partition_path)
+                stats = self.manifest["partitions"][key] = partition_stats(self.partitions[key])
+                stats["source"] = file_identity(partition_path)
+            else:
+                if os.path.exists(partition_path):
+                    os.remove(partition_path)
+                self.manifest["partitions"].pop(key, None)
+        # The manifest goes last; a crash before it only leaves stale stats, which read_manifest recomputes.
+        write_json(self.manifest, os.path.join(self.directory, MANIFEST_NAME))
+        self._dirty = set()
+
+
+class BinaryStorage(Storage):
+    # Fixed-width records read through mmap; rows are only turned into dicts once a filter has matched them.
+    name = "binary"
+    prunes_dates = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = None
+        self._map = None
+        self._opened = False
+        self._expenses = None
+        self._changed = False
+
+    def open(self):
+        if self._opened:
+            return
+        self._opened = True
+        self._read_at = self.identity()
+        self.record_count, self.heap_start, self.categories, self.extras = 0, 0, [], {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, record_size, count, heap_size, trailer_size = BINARY_HEADER.unpack_from(self._map, 0)
+            if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != BINARY_RECORD.size:
+                raise ValueError("not a binary ledger (or an unsupported version)")
+            self.record_count = count
+            self.heap_start = BINARY_HEADER.size + count * BINARY_RECORD.size
+            trailer_start = self.heap_start + heap_size
+            trailer = json.loads(self._map[trailer_start:trailer_start + trailer_size])
+        except (OSError, ValueError, struct.error) as e:
+            self.close()
+            raise RuntimeError(f"Unexpected error reading {self.path}: {e}")
+        self.categories = trailer["categories"]
+        self.extras = trailer["extras"]
+
+    def read_identity(self):
+        # The map keeps showing the file it was opened on, even once another writer has replaced it.
+        self.open()
+        return self._read_at
+
+    def records(self):
+        self.open()
+        if not self.record_count:
+            return
+        with memoryview(self._map) as view:
+            yield from BINARY_RECORD.iter_unpack(view[BINARY_HEADER.size:self.heap_start])
+
+    def record_expense(self, record):
+        _, cents, day, code, offset, length = record
+        expense_date = date.fromordinal(day)
+        start = self.heap_start + offset
+        return {
+            "date": f"{expense_date.day:02d}-{expense_date.month:02d}-{expense_date.year:04d}",
+            "description": self._map[start:start + length].decode("utf-8"),
+            "amount": cents / 100,
+            "category": self.categories[code] if code >= 0 else None,
+        }
+
+    @property
+    def expenses(self):
+        # Any change needs the whole ledger in memory anyway, as the file is rewritten in full.
+        if self._expenses is None:
+            self._expenses = dict(self.iter_expenses())
+        return self._expenses
+
+    def count(self):
+        if self._expenses is not None:
+            return len(self._expenses)
+        self.open()
+        return self.record_count + len(self.extras)
+
+    def get(self, expense_id):
+        if self._expenses is not None:
+            expense = self._expenses.get(str(expense_id))
+            return dict(expense) if expense is not None else None
+        self.open()
+        if str(expense_id) in self.extras:
+            return dict(self.extras[str(expense_id)])
+        # Records are sorted by ID, so a lookup is a binary search over the mapped file.
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            record = BINARY_RECORD.unpack_from(self._map, BINARY_HEADER.size + middle * BINARY_RECORD.size)
+            if record[0] == int(expense_id):
+                return self.record_expense(record)
+            if record[0] < int(expense_id):
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def next_id(self):
+        if self._expenses is not None:
+            return max((int(key) for key in self._expenses), default=0) + 1
+        self.open()
+        last = BINARY_RECORD.unpack_from(self._map, BINARY_HEADER.size + (self.record_count - 1) * BINARY_RECORD.size)[0] if self.record_count else 0
+        return max([last] + [int(key) for key in self.extras]) + 1
+
+    def put(self, expense_id, expense):
+        self.expenses[str(expense_id)] = expense
+        self._changed = True
+
+    def delete(self, expense_id):
+        if str(expense_id) not in self.expenses:
+            return False
+        del self.expenses[str(expense_id)]
+        self._changed = True
+        return True
+
+    def iter_expenses(self, category=None, month=None, start=None, end=None):
+        if self._expenses is not None:
+            date_filter = (month is not None) or (start is not None) or (end is not None)
+            for expense_id, expense in self._expenses.items():
+                if category is not None and expense.get("category") != category:
+                    continue
+                if date_filter and not date_matches(parse_date(expense.get("date")), month, start, end):
+                    continue
+                yield expense_id, expense
+            return
+        self.open()
+        yield from heapq.merge(self.iter_records(category, month, start, end), self.iter_extras(category, month, start, end), key=lambda row: int(row[0]))
+
+    def iter_records(self, category=None, month=None, start=None, end=None):
+        code = None
+        if category is not None:
+            if category not in self.categories:
+                return
+            code = self.categories.index(category)
+        first = start.toordinal() if start is not None else None
+        last = end.toordinal() if end is not None else None
+        for record in self.records():
+            if code is not None and record[3] != code:
+                continue
+            if (first is not None and record[2] < first) or (last is not None and record[2] > last):
+                continue
+            if month is not None and date.fromordinal(record[2]).month != month:
+                continue
+            yield str(record[0]), self.record_expense(record)
+
+    def iter_extras(self, category=None, month=None, start=None, end=None):
+        date_filter = (month is not None) or (start is not None) or (end is not None)
+        for expense_id in sorted(self.extras, key=int):
+            expense = self.extras[expense_id]
+            if category is not None and expense.get("category") != category:
+                continue
+            if date_filter and not date_matches(parse_date(expense.get("date")), month, start, end):
+                continue
+            yield expense_id, expense
+
+    def iter_cells(self):
+        if self._expenses is not None:
+            yield from super().iter_cells()
+            return
+        self.open()
+        month_keys = {}
+        for _, cents, day, code, _, _ in self.records():
+            month_key = month_keys.get(day)
+            if month_key is None:
+                expense_date = date.fromordinal(day)
+                month_key = month_keys[day] = f"{expense_date.year:04d}-{expense_date.month:02d}"
+            yield month_key, self.categories[code] if code >= 0 else None, cents
+        for expense in self.extras.values():
+            cell = expense_cell(expense)
+            if cell is not None:
+                yield cell
+
+    def write(self):
+        if not self._changed:
+            return
+        content = encode_binary(self._expenses)
+        # The map has to go before the file is replaced (Windows refuses to replace a mapped file).
+        self.close()
+        try:
+            write_atomic(self.path, lambda file: file.write(content), binary=True)
+        except Exception as e:
+            raise RuntimeError(f"Failed to write the content: {e}")
+        self._changed = False
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map, self._file, self._opened = None, None, False
+
+
+STORAGE_BACKENDS = {backend.name: backend for backend in (JsonStorage, JournalStorage, SqliteStorage, PartitionedStorage, BinaryStorage)}
+STORAGE_MODES = tuple(STORAGE_BACKENDS)
+
+
+def get_partition_directory(expenses_path):
+    # "data/expenses.json" keeps its partitions in "data/expenses/".
+    root, extension = os.path.splitext(expenses_path)
+    return root if extension == ".json" else expenses_path
+
+def get_partition_key(date):
+    expense_date = parse_date(date)
+    return f"{expense_date.year:04d}-{expense_date.month:02d}" if expense_date else UNDATED_PARTITION
+
+def get_partition_path(directory, key):
+    return os.path.join(directory, f"{key}.json")
+
+def partition_stats(partition):
+    cents = 0
+    for expense in partition.values():
+        try:
+            cents += round(float(expense.get("amount")) * 100)
+        except (TypeError, ValueError):
+            pass
+    ids = [int(expense_id) for expense_id in partition]
+    return {"count": len(ids), "cents": cents, "min_id": min(ids, default=0), "max_id": max(ids, default=0), "source": None}
+
+def read_manifest(directory):
+    # Partition files are the source of truth: any whose identity differs from the manifest (or that it misses) is re-read.
+    manifest = read_json(os.path.join(directory, MANIFEST_NAME))
+    stored = manifest.get("partitions", {})
+    partitions = {}
+    names = os.listdir(directory) if os.path.isdir(directory) else []
+    for name in names:
+        key, extension = os.path.splitext(name)
+        if extension != ".json" or name == MANIFEST_NAME or name.startswith("."):
+            continue
+        identity = file_identity(os.path.join(directory, name))
+        stats = stored.get(key)
+        if stats is None or stats.get("source") != identity:
+            stats = partition_stats(read_json(os.path.join(directory, name)))
+            stats["source"] = identity
+        partitions[key] = stats
+    next_id = max([manifest.get("next_id", 1)] + [stats["max_id"] + 1 for stats in partitions.values()])
+    return {"version": 1, "next_id": next_id, "partitions": partitions}
+
+def binary_record_fields(expense):
+    # Expenses that would not survive the fixed-width encoding unchanged are kept as JSON in the trailer instead.
+    if set(expense) != {"date", "description", "amount", "category"}:
+        return None
+    expense_date = parse_date(expense["date"])
+    amount, description, category = expense["amount"], expense["description"], expense["category"]
+    if expense_date is None or expense_date.strftime(DATE_FORMAT) != expense["date"]:
+        return None
+    if type(amount) is not float or not math.isfinite(amount) or abs(amount) >= 2**53 or round(amount * 100) / 100 != amount:
+        return None
+    if not isinstance(description, str) or not (category is None or isinstance(category, str)):
+        return None
+    return expense_date.toordinal(), round(amount * 100), description, category
+
+def encode_binary(expenses):
+    records, heap, categories, codes, extras = bytearray(), bytearray(), [], {}, {}
+    count = 0
+    for expense_id in sorted(expenses, key=int):
+        fields = binary_record_fields(expenses[expense_id])
+        if fields is None:
+            extras[expense_id] = expenses[expense_id]
+            continue
+        day, cents, description, category = fields
+        code = -1
+        if category is not None:
+            code = codes.get(category)
+            if code is None:
+                code = codes[category] = len(categories)
+                categories.append(category)
+        encoded = description.encode("utf-8")
+        records += BINARY_RECORD.pack(int(expense_id), cents, day, code, len(heap), len(encoded))
+        heap += encoded
+        count += 1
+    trailer = json.dumps({"categories": categories, "extras": extras}).encode("utf-8")
+    return BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD.size, count, len(heap), len(trailer)) + records + heap + trailer
+
+def get_journal_path(expenses_path):
+    return expenses_path + JOURNAL_SUFFIX
+
+def put_record(expense_id, expense):
+    return {"op": "put", "id": expense_id, "expense": expense}
+
+def delete_record(expense_id):
+    return {"op": "delete", "id": expense_id}
+
+def read_expenses(expenses_path):
+    # The JSON file is the snapshot; the journal holds every mutation made after it.
+    expenses = read_json(expenses_path)
+    for record in read_journal(get_journal_path(expenses_path)):
+        apply_record(expenses, record)
+    return expenses
+
+def apply_record(expenses, record):
+    if record.get("op") == "put":
+        expenses[record["id"]] = record["expense"]
+    elif record.get("op") == "delete":
+        expenses.pop(record["id"], None)
+    else:
+        raise RuntimeError(f"Unknown journal operation: {record.get('op')}")
+
+def read_journal(journal_path):
+    if not os.path.exists(journal_path):
+        return []
+    try:
+        with open(journal_path, "r", encoding="utf-8") as file:
+            lines = [line for line in file.read().splitlines() if line.strip()]
+    except Exception as e:
+        raise RuntimeError(f"Unexpected error reading journal: {e}")
+    records = []
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A torn last line means the process died mid-append; that mutation never completed.
+            if line_number == len(lines):
+                break
+            raise RuntimeError(f"Journal is corrupt at line {line_number}. Please fix or delete it manually.")
+    return records
+
+def append_journal(records, journal_path):
+    try:
+        truncate_torn_tail(journal_path)
+        with open(journal_path, "a", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+    except Exception as e:
+        raise RuntimeError(f"Failed to append to the journal: {e}")
+
+def truncate_torn_tail(journal_path):
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "rb+") as file:
+        content = file.read()
+        if content and not content.endswith(b"\n"):
+            file.truncate(content.rfind(b"\n") + 1)
+
+def acquire_lock(file_path, blocking=True):
+    # Advisory lock on a sibling file, so the data file itself can be replaced atomically.
+    # With blocking=False, returns None instead of waiting when another process holds the lock.
+    try:
+        lock_file = open(file_path + LOCK_SUFFIX, "a+")
+    except OSError as e:
+        raise RuntimeError(f"Could not lock {file_path}: {e}")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except OSError as e:
+        lock_file.close()
+        if not blocking:
+            return None
+        raise RuntimeError(f"Could not lock {file_path}: {e}")
+    return lock_file
+
+def release_lock(lock_file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        lock_file.close()
+
+@timed("read_json")
+def read_json(file_path):
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        raise RuntimeError(f"Unexpected error reading file: {e}")
+    path, key = os.path.abspath(file_path), json_cache_key(file_stat)
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == key:
+        _json_cache_stats["hits"] += 1
+        return marshal.loads(cached[1])
+    content = snapshot = read_snapshot(path, key)
+    if snapshot is not None:
+        _json_cache_stats["snapshot_hits"] += 1
+    else:
+        _json_cache_stats["misses"] += 1
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                content = json.load(file)
+        except json.JSONDecodeError:
+            raise RuntimeError("File is corrupt. Please fix or delete it manually.")
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error reading file: {e}")
+    if time.time() - file_stat.st_mtime >= RACY_SECONDS:
+        remember_json(path, key, content)
+        if snapshot is None and key[1] >= SNAPSHOT_MIN_BYTES and snapshots_enabled():
+            save_snapshot(path, key, content)
+    return content
+
+def json_cache_key(file_stat):
+    # os.replace() always brings a new inode, so an atomic rewrite changes the key even within one mtime tick.
+    return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
+
+def remember_json(path, key, content):
+    data = marshal.dumps(content)
+    forget_json(path)
+    while _json_cache and _json_cache_stats["bytes"] + len(data) > JSON_CACHE_MAX_BYTES:
+        _json_cache_stats["bytes"] -= len(_json_cache.pop(next(iter(_json_cache)))[1])
+    if len(data) <= JSON_CACHE_MAX_BYTES:
+        _json_cache[path] = (key, data)
+        _json_cache_stats["bytes"] += len(data)
+
+def forget_json(path):
+    previous = _json_cache.pop(path, None)
+    if previous is not None:
+        _json_cache_stats["bytes"] -= len(previous[1])
+
+def json_cache_stats():
+    return dict(_json_cache_stats, entries=len(_json_cache))
+
+def clear_json_cache():
+    _json_cache.clear()
+    _parsed_dates.clear()
+    _json_cache_stats.update(hits=0, snapshot_hits=0, misses=0, bytes=0)
+
+def snapshots_enabled():
+    return os.environ.get(SNAPSHOT_ENV, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+def read_snapshot(path, key):
+    # <file>.snapshot: the decoded content plus its parsed dates, in marshal format (which cannot run code, unlike pickle).
+    if not snapshots_enabled() or key[1] < SNAPSHOT_MIN_BYTES:
+        return None
+    try:
+        with open(path + SNAPSHOT_SUFFIX, "rb") as file:
+            # marshal.load() on a file object reads it in tiny chunks; reading it whole first is several times faster.
+            snapshot = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("version") != (SNAPSHOT_VERSION, marshal.version, sys.version_info[:2]) or snapshot.get("source") != key:
+        return None
+    for text, ordinal in snapshot["dates"].items():
+        _parsed_dates.setdefault(text, datetime.fromordinal(ordinal))
+    return snapshot["content"]
+
+def save_snapshot(path, key, content):
+    dates = {}
+    if isinstance(content, dict):
+        for value in content.values():
+            text = value.get("date") if isinstance(value, dict) else None
+            if isinstance(text, str) and text not in dates:
+                parsed = parse_date(text)
+                if parsed is not None:
+                    dates[text] = parsed.toordinal()
+    data = marshal.dumps({"version": (SNAPSHOT_VERSION, marshal.version, sys.version_info[:2]), "source": key, "dates": dates, "content": content})
+    try:
+        write_atomic(path + SNAPSHOT_SUFFIX, lambda file: file.write(data), binary=True)
+    except OSError:
+        # The snapshot is only a shortcut; the JSON file stays the source of truth.
+        pass
+
+
+@timed("write_json")
+def write_json(content, file_path):
+    try:
+        write_atomic(file_path, lambda file: json.dump(content, file, indent=4))
+    except Exception as e:
+        raise RuntimeError(f"Failed to write the content: {e}")
+    # Not written through: JSON turns tuples into lists and int keys into strings, so only a decode gives what a reader sees.
+    forget_json(os.path.abspath(file_path))
+
+def write_atomic(file_path, write, binary=False):
+    # Write a temporary sibling and rename it over the target, so readers never see a partial file.
+    # tempfile is imported here, by writers only; read-only commands start faster without it.
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(file_path))
+    descriptor, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory)
+    try:
+        with (os.fdopen(descriptor, "wb") if binary else os.fdopen(descriptor, "w", encoding="utf-8")) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, file_mode(file_path))
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(directory)
+
+def file_mode(file_path):
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def fsync_directory(directory):
+    # Makes the rename itself durable; not possible (nor needed) on Windows.
+    if os.name == "nt":
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from aggregates import AggregateIndex
+from commands import add_expense, delete_expense, rebuild_totals, show_summary, update_expense
+from storage import open_storage, read_json, write_json
+
+
+class TestAggregateIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _create_expenses(self):
+        write_json({
+            "1": {"date": "05-01-2024", "description": "Groceries", "amount": 100.10, "category": "Food"},
+            "2": {"date": "10-01-2025", "description": "Gas", "amount": 50.0, "category": "Transport"},
+            "3": {"date": "12-02-2025", "description": "Pizza", "amount": 25.5, "category": "Food"},
+            "4": {"date": "not a date", "description": "Broken", "amount": 1, "category": "Food"},
+        }, self.expenses_path)
+
+    def test_totals_by_month_category_and_year(self):
+        self._create_expenses()
+        totals = AggregateIndex.build(open_storage(self.expenses_path))
+        self.assertEqual(totals.total(), 175.6)
+        self.assertEqual(totals.total(month=1), 150.1)
+        self.assertEqual(totals.total(month=1, year=2025), 50.0)
+        self.assertEqual(totals.total(category="Food"), 125.6)
+        self.assertEqual(totals.totals["2024-01"]["Food"], [10010, 1])
+
+    def test_writes_adjust_index_by_delta(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20, "Food")
+        add_expense(self.expenses_path, self.budget_path, "Taxi", 12.5, "Transport")
+        update_expense(self.expenses_path, self.budget_path, 1, amount=30, category="Dining")
+        delete_expense(self.expenses_path, 2)
+        expenses = open_storage(self.expenses_path)
+        stored = AggregateIndex.load(expenses)
+        self.assertEqual(stored.source, expenses.identity())
+        self.assertEqual(stored.diff(AggregateIndex.build(expenses)), [])
+        self.assertEqual(stored.total(category="Dining"), 30.0)
+
+    def test_summary_does_not_scan_when_index_is_fresh(self):
+        self._create_expenses()
+        show_summary(self.expenses_path)
+        with mock.patch.object(AggregateIndex, "build", side_effect=AssertionError("full scan")):
+            self.assertIn("Total expenses with Food: $125.60", show_summary(self.expenses_path, category="Food"))
+
+    def test_index_is_rebuilt_when_ledger_changes_behind_its_back(self):
+        self._create_expenses()
+        show_summary(self.expenses_path)
+        expenses = read_json(self.expenses_path)
+        expenses["5"] = {"date": "01-03-2025", "description": "Manual", "amount": 10, "category": "Food"}
+        write_json(expenses, self.expenses_path)
+        self.assertIn("Total expenses: $185.60", show_summary(self.expenses_path))
+
+    def test_index_rebuilt_while_a_writer_adds_heals(self):
+        self._create_expenses()
+        build = AggregateIndex.build.__func__
+        racing = [True]
+
+        def build_then_add(cls, expenses):
+            index = build(cls, expenses)
+            if racing:
+                racing.pop()
+                # Another process adds a row after the summary read the ledger, before it saves the rebuilt index.
+                add_expense(self.expenses_path, self.budget_path, "Late", 10, "Food")
+            return index
+
+        with mock.patch.object(AggregateIndex, "build", classmethod(build_then_add)):
+            self.assertIn("Total expenses: $175.60", show_summary(self.expenses_path))
+        self.assertIn("Total expenses: $185.60", show_summary(self.expenses_path))
+
+    def test_rebuild_and_check(self):
+        self._create_expenses()
+        self.assertIn("No totals index found", rebuild_totals(self.expenses_path, check=True))
+        self.assertIn("Rebuilt the totals index (3 month(s))", rebuild_totals(self.expenses_path))
+        self.assertIn("consistent", rebuild_totals(self.expenses_path, check=True))
+
+        index = read_json(AggregateIndex.index_path(open_storage(self.expenses_path)))
+        index["totals"]["2024-01"]["Food"] = [1, 1]
+        write_json(index, AggregateIndex.index_path(open_storage(self.expenses_path)))
+        response = rebuild_totals(self.expenses_path, check=True)
+        self.assertIn("1 inconsistent cell(s)", response)
+        self.assertIn("2024-01 Food: index $0.01 (1 rows), ledger $100.10 (1 rows)", response)
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import storage
+from batch import parse_batch_line, run_batch
+from commands import add_expense
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_parse_batch_line(self):
+        self.assertEqual(parse_batch_line('add --description "Fancy dinner" --amount 20'), ["add", "--description", "Fancy dinner", "--amount", "20"])
+        self.assertEqual(parse_batch_line('["list", "--category", "Food"]'), ["list", "--category", "Food"])
+        self.assertEqual(parse_batch_line('{"command": "list", "reverse": true, "limit": 2, "category": null}'), ["list", "--reverse", "--limit", "2"])
+        self.assertIsNone(parse_batch_line("   "))
+        self.assertIsNone(parse_batch_line("# a comment"))
+        with self.assertRaises(ValueError):
+            parse_batch_line('{"description": "no command"}')
+        with self.assertRaises(ValueError):
+            parse_batch_line('add --description "unterminated')
+
+    def _execute(self, argv):
+        response = add_expense(self.expenses_path, self.budget_path, argv[1], float(argv[2]))
+        return {"code": 0, "stdout": response["message"], "stderr": ""}
+
+    def test_ledger_is_loaded_and_written_once(self):
+        output = io.StringIO()
+        lines = [f"add Coffee-{n} {n}" for n in range(1, 6)]
+        with mock.patch.object(storage, "read_expenses", wraps=storage.read_expenses) as reads, \
+             mock.patch.object(storage, "write_json", wraps=storage.write_json) as writes:
+            ran, failed, flushes = run_batch(lines, self._execute, output)
+        self.assertEqual((ran, failed, flushes), (5, 0, 1))
+        self.assertEqual(reads.call_count, 1)
+        # The ledger is written once; its totals index is saved next to it.
+        self.assertEqual([call.args[1] for call in writes.call_args_list].count(self.expenses_path), 1)
+        self.assertEqual(len(storage.read_json(self.expenses_path)), 5)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(results[4], {"line": 5, "argv": ["add", "Coffee-5", "5"], "code": 0, "stdout": "Expense added successfully (ID: 5)", "stderr": ""})
+
+    def test_flush_every(self):
+        lines = [f"add Coffee-{n} {n}" for n in range(1, 6)]
+        ran, failed, flushes = run_batch(lines, self._execute, io.StringIO(), flush_every=2)
+        self.assertEqual(flushes, 3)
+
+    def test_unparsable_lines_are_reported(self):
+        output = io.StringIO()
+        ran, failed, _ = run_batch(["{not json"], self._execute, output)
+        self.assertEqual((ran, failed), (1, 1))
+        self.assertIn("Invalid JSON", json.loads(output.getvalue())["stderr"])
+
+    def test_batch_cli(self):
+        script = os.path.abspath("expense-tracker.py")
+        commands = 'add --description Lunch --amount 20 --category Food\n{"command": "summary", "category": "Food"}\ndelete --id 5\n'
+        result = subprocess.run([sys.executable, script, "batch", "--expenses_path", self.expenses_path, "--budget_path", self.budget_path],
+                                input=commands, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0)
+        results = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual([r["code"] for r in results], [0, 0, 0])
+        self.assertIn("Total expenses with Food: $20.00", results[1]["stdout"])
+        self.assertIn("Could not find an expense with id 5", results[2]["stdout"])
+        self.assertIn("Ran 3 command(s): 0 failed, 1 write(s)", result.stderr)
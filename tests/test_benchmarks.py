@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.generator import generate_expenses, get_categories, iter_generated, write_ledger
+from benchmarks.suite import find_regressions
+from storage import open_storage, parse_date
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_generator_is_seeded(self):
+        self.assertEqual(generate_expenses(50, seed=3), generate_expenses(50, seed=3))
+        self.assertNotEqual(generate_expenses(50, seed=3), generate_expenses(50, seed=4))
+        expenses = generate_expenses(500, years=3, categories=10)
+        self.assertEqual({parse_date(expense["date"]).year for expense in expenses.values()}, {2015, 2016, 2017})
+        self.assertLessEqual({expense["category"] for expense in expenses.values()}, set(get_categories(10)))
+        self.assertIn("Category 9", get_categories(10))
+
+    def test_write_ledger(self):
+        for storage, file_name in [("json", "expenses.json"), ("sqlite", "expenses.db"), ("partitioned", "partitioned.json"),
+                                  ("binary", "expenses.bin")]:
+            with self.subTest(storage=storage):
+                expenses_path = os.path.join(self.test_dir, file_name)
+                write_ledger(expenses_path, 20, seed=1, storage=storage)
+                expenses = open_storage(expenses_path, storage)
+                rows = sorted(expenses.iter_expenses(), key=lambda row: int(row[0]))
+                self.assertEqual(rows, list(iter_generated(20, seed=1)))
+                expenses.close()
+
+    def test_find_regressions(self):
+        baseline = {"json add_expense @ 1000": {"seconds": 0.1, "peak_bytes": 1000},
+                    "json show_summary --month 3 @ 1000": {"seconds": 0.001, "peak_bytes": 100}}
+        results = {"json add_expense @ 1000": {"seconds": 0.2, "peak_bytes": 1000},
+                   "json show_summary --month 3 @ 1000": {"seconds": 0.003, "peak_bytes": 300},
+                   "json cli add @ 1000": {"seconds": 9, "peak_bytes": None}}
+        self.assertEqual(find_regressions(results, baseline, threshold=1.5), [
+            ("json add_expense @ 1000", "time", 0.1, 0.2),
+            ("json show_summary --month 3 @ 1000", "memory", 100, 300),
+        ])
+        self.assertEqual(find_regressions(results, baseline, threshold=5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
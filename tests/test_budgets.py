@@ -0,0 +1,121 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+import budgets
+from budgets import DayIndex, parse_period, period_bounds
+from commands import add_expense, budget_status, delete_expense, import_expenses, set_budget, update_expense
+from storage import open_storage, read_json, write_json
+
+
+class TestBudgetRules(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        self.today = date.today()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_periods(self):
+        self.assertEqual(parse_period("month"), "month")
+        self.assertEqual(parse_period("30d"), 30)
+        for period in ("0d", "367d", "d", "week", "-7d"):
+            with self.assertRaises(ValueError):
+                parse_period(period)
+        self.assertEqual(period_bounds("month", date(2024, 2, 14)), (date(2024, 2, 1), date(2024, 2, 29)))
+        self.assertEqual(period_bounds("quarter", date(2024, 11, 3)), (date(2024, 10, 1), date(2024, 12, 31)))
+        self.assertEqual(period_bounds(7, date(2024, 3, 2)), (date(2024, 2, 25), date(2024, 3, 2)))
+
+    def test_set_budget_rules(self):
+        set_budget(self.budget_path, 6, 100)
+        self.assertIn("Food over the last 30 days", set_budget(self.budget_path, None, 300, category="Food", period="30d"))
+        set_budget(self.budget_path, None, 900, period="quarter")
+        self.assertEqual(read_json(self.budget_path), {"6": 100.0, "rules": {"Food": {"30d": 300.0}, "*": {"quarter": 900.0}}})
+        with self.assertRaises(ValueError):
+            set_budget(self.budget_path, 6, 100, category="Food")
+        with self.assertRaises(ValueError):
+            set_budget(self.budget_path, None, 100, period="fortnight")
+        with self.assertRaises(ValueError):
+            set_budget(self.budget_path, None, 100)
+
+    def test_rolling_windows_follow_writes_and_days(self):
+        # Every window, updated in place, must match a sum over the days it covers.
+        rng = random.Random(3)
+        expenses = open_storage(self.expenses_path)
+        index = DayIndex.load(expenses)
+        rows = {}
+        end = date(2024, 1, 1).toordinal()
+        for step in range(400):
+            if rows and rng.random() < 0.3:
+                expense_id = rng.choice(list(rows))
+                index.apply(expense_id, rows.pop(expense_id), None)
+            else:
+                expense_id = step
+                day = date.fromordinal(end - rng.randrange(40))
+                new = {"date": day.strftime("%d-%m-%Y"), "amount": rng.randrange(1, 500) / 4, "category": rng.choice(["Food", "Rent"])}
+                index.apply(expense_id, rows.get(expense_id), new)
+                rows[expense_id] = new
+            end += rng.choice([0, 0, 1, 3, 50])
+            for category in ("Food", "*"):
+                for length in (7, 30):
+                    expected = sum(round(row["amount"] * 100) for row in rows.values()
+                                   if category in ("*", row["category"])
+                                   and end - length < date(*map(int, reversed(row["date"].split("-")))).toordinal() <= end)
+                    self.assertEqual(index.window_total(category, length, end), expected)
+
+    def test_writes_only_check_the_rules_they_touch(self):
+        set_budget(self.budget_path, None, 50, category="Food", period="7d")
+        set_budget(self.budget_path, None, 10, category="Rent")
+        set_budget(self.budget_path, None, 1000, period="quarter")
+        response = add_expense(self.expenses_path, self.budget_path, "Lunch", 30, "Food")
+        self.assertIsNone(response["warning"])
+        with mock.patch.object(budgets, "rule_usage", wraps=budgets.rule_usage) as rule_usage:
+            response = add_expense(self.expenses_path, self.budget_path, "Dinner", 30, "Food")
+        self.assertEqual(response["warning"], "[WARN] You exceeded the budget for Food over the last 7 days ($60.00 of $50.00)")
+        self.assertEqual(sorted(call.args[2] for call in rule_usage.call_args_list), ["*", "Food"])
+        response = update_expense(self.expenses_path, self.budget_path, 2, category="Rent")
+        self.assertIn("[WARN] You exceeded the budget for Rent in", response["warning"])
+        delete_expense(self.expenses_path, 1)
+        expenses = open_storage(self.expenses_path)
+        stored = read_json(DayIndex.index_path(expenses))
+        self.assertEqual(stored["source"], expenses.identity())
+        self.assertEqual(stored["days"], {str(self.today.toordinal()): {"Rent": 3000}})
+
+    def test_import_warns_once_per_period(self):
+        set_budget(self.budget_path, None, 15, category="Food", period="30d")
+        input_path = os.path.join(self.test_dir, "import.csv")
+        with open(input_path, "w", encoding="utf-8") as file:
+            file.write("date,description,amount,category\n")
+            for offset in range(3):
+                file.write(f"{(self.today - timedelta(days=offset)):%d-%m-%Y},Row {offset},10,Food\n")
+        response = import_expenses(self.expenses_path, self.budget_path, input_path)
+        self.assertEqual(response.count("[WARN]"), 1)
+        self.assertIn("Food over the last 30 days ($30.00 of $15.00)", response)
+
+    def test_status(self):
+        self.assertEqual(budget_status(self.expenses_path, self.budget_path), "No budgets configured.")
+        write_json({
+            "1": {"date": "28-12-2023", "description": "Party", "amount": 40.0, "category": "Food"},
+            "2": {"date": "02-01-2024", "description": "Groceries", "amount": 25.0, "category": "Food"},
+            "3": {"date": "03-01-2024", "description": "Rent", "amount": 500.0, "category": "Rent"},
+        }, self.expenses_path)
+        set_budget(self.budget_path, 1, 1000, year=2024)
+        set_budget(self.budget_path, None, 50, category="Food", period="7d")
+        set_budget(self.budget_path, None, 400, category="Rent", period="quarter")
+        lines = budget_status(self.expenses_path, self.budget_path, today=date(2024, 1, 3)).splitlines()
+        self.assertEqual([line.split("  ")[0] for line in lines[1:]],
+                         ["January 2024", "Food over the last 7 days", "Rent in Q1 2024"])
+        self.assertTrue(lines[1].endswith("$525.00      $1000.00    52.5%"))
+        self.assertTrue(lines[2].endswith("$65.00        $50.00   130.0%  [OVER]"))
+        self.assertTrue(lines[3].endswith("$500.00       $400.00   125.0%  [OVER]"))
+        self.assertTrue(os.path.exists(DayIndex.index_path(open_storage(self.expenses_path))))
+
+
+if __name__ == "__main__":
+    unittest.main()
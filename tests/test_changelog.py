@@ -0,0 +1,126 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import exporters
+
+from changelog import ChangeLog
+from commands import (add_expense, compact_expenses, delete_expense, delete_expenses, export_changes, import_expenses,
+                      update_expense, update_expenses)
+from storage import open_storage, read_json, write_json
+
+
+class TestChangeLog(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        self.output_path = os.path.join(self.test_dir, "changes.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def export(self, storage="json"):
+        response = export_changes(self.expenses_path, self.output_path, storage)
+        with open(self.output_path, newline="") as file:
+            return response, [(row["id"], row["operation"], row["description"]) for row in csv.DictReader(file)]
+
+    def test_net_operations(self):
+        log = ChangeLog()
+        log.apply(1, None, {})
+        log.apply(1, {}, {})
+        log.apply(2, {}, {})
+        log.apply(3, {}, None)
+        log.apply(3, None, {})
+        log.apply(4, None, {})
+        log.apply(4, {}, None)
+        self.assertEqual(log.pending(), [("1", "insert", 2), ("2", "update", 3), ("3", "update", 5)])
+        log.advance()
+        self.assertEqual((log.pending(), log.watermark), ([], 7))
+
+    def test_exports_only_what_changed(self):
+        for storage in ("json", "journal", "sqlite"):
+            with self.subTest(storage=storage):
+                self.expenses_path = os.path.join(self.test_dir, f"{storage}.db" if storage == "sqlite" else f"{storage}.json")
+                for description in ("Lunch", "Taxi", "Rent"):
+                    add_expense(self.expenses_path, self.budget_path, description, 10, "Food", storage)
+                response, rows = self.export(storage)
+                self.assertIn("(3 row(s) in a full snapshot, csv)", response)
+                self.assertEqual([operation for _, operation, _ in rows], ["snapshot"] * 3)
+                self.assertEqual(self.export(storage)[1], [])
+
+                update_expense(self.expenses_path, self.budget_path, 2, description="Bus", storage=storage)
+                delete_expense(self.expenses_path, 3, storage)
+                add_expense(self.expenses_path, self.budget_path, "Coffee", 3, "Food", storage)
+                add_expense(self.expenses_path, self.budget_path, "Typo", 1, "Food", storage)
+                delete_expense(self.expenses_path, 4, storage)
+                response, rows = self.export(storage)
+                self.assertEqual(rows, [("2", "update", "Bus"), ("3", "update", "Coffee")])
+                self.assertIn("Watermark: 5", response)
+                self.assertEqual(self.export(storage)[1], [])
+
+    def test_bulk_writes_and_compaction_are_logged(self):
+        write_json({"1": {"date": "05-01-2024", "description": "Groceries", "amount": 100.0, "category": "Food"}}, self.expenses_path)
+        self.export()
+        input_path = os.path.join(self.test_dir, "import.csv")
+        with open(input_path, "w", encoding="utf-8") as file:
+            file.write("date,description,amount,category\n05-02-2024,Gas,50,Transport\n06-02-2024,Toll,5,Transport\n")
+        import_expenses(self.expenses_path, self.budget_path, input_path, storage="journal")
+        update_expenses(self.expenses_path, self.budget_path, where_category="Food", description="Market", storage="journal")
+        delete_expenses(self.expenses_path, start=None, end=None, year=None, category="Transport", storage="journal")
+        compact_expenses(self.expenses_path)
+        self.assertEqual(self.export()[1], [("1", "update", "Market")])
+
+    def test_writes_behind_the_log_force_a_snapshot(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20, "Food")
+        self.export()
+        write_json({"1": {"date": "05-01-2024", "description": "Edited", "amount": 1.0, "category": "Food"}}, self.expenses_path)
+        response, rows = self.export()
+        self.assertIn("full snapshot", response)
+        self.assertEqual(rows, [("1", "snapshot", "Edited")])
+
+    def test_failed_export_keeps_the_watermark(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20, "Food")
+        self.export()
+        add_expense(self.expenses_path, self.budget_path, "Dinner", 30, "Food")
+        with self.assertRaises(RuntimeError):
+            export_changes(self.expenses_path, os.path.join(self.test_dir, "missing", "changes.csv"))
+        stored = read_json(ChangeLog.index_path(open_storage(self.expenses_path)))
+        self.assertEqual((stored["watermark"], stored["changes"]), (0, {"2": [1, "insert"]}))
+        self.assertEqual(self.export()[1], [("2", "insert", "Dinner")])
+
+    @unittest.skipIf(exporters.pyarrow is None, "pyarrow is not installed")
+    def test_columnar_delta_export(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20, "Food")
+        export_changes(self.expenses_path, self.output_path)
+        add_expense(self.expenses_path, self.budget_path, "Dinner", 30, "Food")
+        delete_expense(self.expenses_path, 1)
+        for file_format in ("parquet", "arrow"):
+            with self.subTest(file_format=file_format):
+                output_path = os.path.join(self.test_dir, f"changes.{file_format}")
+                with mock.patch.object(ChangeLog, "advance"):
+                    response = export_changes(self.expenses_path, output_path)
+                self.assertIn(f"(2 change(s), sequence 1-2, {file_format})", response)
+                if file_format == "parquet":
+                    table = exporters.pyarrow.parquet.read_table(output_path)
+                else:
+                    table = exporters.pyarrow.ipc.open_file(output_path).read_all()
+                self.assertEqual(table.schema.field("sequence").type, exporters.pyarrow.int64())
+                self.assertEqual([(row["id"], row["operation"], row["sequence"]) for row in table.to_pylist()],
+                                 [(2, "insert", 1), (1, "delete", 2)])
+
+    @unittest.skipIf(exporters.pyarrow is None, "pyarrow is not installed")
+    def test_failed_columnar_export_leaves_no_file(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20, "Food")
+        output_path = os.path.join(self.test_dir, "changes.parquet")
+        with mock.patch.object(exporters, "arrow_batch", side_effect=exporters.pyarrow.ArrowTypeError("bad column")):
+            with self.assertRaises(RuntimeError):
+                export_changes(self.expenses_path, output_path)
+        self.assertFalse(os.path.exists(output_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,9 @@ import json
 import tempfile
 import subprocess
 import unittest
+from datetime import datetime
+
+from benchmarks.startup import parse_importtime
 
 class TestCLI(unittest.TestCase):
     def setUp(self):
@@ -38,6 +41,84 @@ class TestCLI(unittest.TestCase):
         self.assertEqual(result.returncode, 0)
         self.assertIn("Coffee", result.stdout)
 
+    def test_profile_cli(self):
+        result = self.run_cli(["add", "--description", "Lunch", "--amount", "15.5", "--profile"])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("Expense added successfully", result.stdout)
+        self.assertIn("[PROFILE] build_parser", result.stderr)
+        self.assertIn("[PROFILE] add", result.stderr)
+
+        result = subprocess.run([sys.executable, self.script, "summary", "--expenses_path", self.expenses_path],
+                                capture_output=True, text=True, env=dict(os.environ, EXPENSE_TRACKER_PROFILE="json"))
+        self.assertEqual(result.returncode, 0)
+        metrics = json.loads(result.stderr)
+        self.assertEqual(metrics["phases"]["summary"]["calls"], 1)
+
+    def test_commands_only_import_what_they_need(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "5"])
+        # Backends, indexes and formats other than the ones a plain JSON ledger uses for the command.
+        unused = {"sqlite3", "csv", "sketches", "statsindex", "searchindex", "changelog", "reports", "exporters", "batch"}
+        cases = [
+            (["summary"], unused | {"budgets", "concurrent.futures", "inspect", "tracemalloc", "socket", "tempfile", "calendar"}),
+            (["list", "--limit", "1"], unused | {"budgets", "concurrent.futures", "inspect", "tracemalloc", "socket", "tempfile"}),
+            (["add", "--description", "Tea", "--amount", "2"], unused | {"concurrent.futures", "inspect", "tracemalloc", "socket"}),
+        ]
+        for argv, unwanted in cases:
+            with self.subTest(command=argv[0]):
+                result = subprocess.run([sys.executable, "-X", "importtime", self.script] + argv + ["--expenses_path", self.expenses_path],
+                                        capture_output=True, text=True, env=dict(os.environ, EXPENSE_TRACKER_NO_DAEMON="1"))
+                self.assertEqual(result.returncode, 0)
+                modules = {name for name, _, _, _ in parse_importtime(result.stderr)}
+                self.assertIn("commands", modules)
+                self.assertEqual(modules & unwanted, set())
+
+    def test_summary_date_range_cli(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "5"])
+        today = datetime.now().strftime("%d-%m-%Y")
+        result = self.run_cli(["summary", "--from", today, "--to", today])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(f"from {today} until {today}: $5.00", result.stdout)
+        result = self.run_cli(["summary", "--year", "1999"])
+        self.assertIn("Total expenses in 1999: $0.00", result.stdout)
+
+    def test_report_cli(self):
+        for description, amount, category in [("Coffee", "5", "Food"), ("Rent", "900", "Home"), ("Dinner", "60", "Food")]:
+            self.run_cli(["add", "--description", description, "--amount", amount, "--category", category])
+        result = self.run_cli(["report", "--group-by", "category", "--metrics", "sum,count,max", "--format", "csv"])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.splitlines(), ["category,sum,count,max", "Food,65.0,2,60.0", "Home,900.0,1,900.0"])
+        result = self.run_cli(["report", "--group-by", "colour"])
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Unknown group-by field", result.stderr)
+
+    def test_bulk_update_and_delete_cli(self):
+        for description, amount, category in [("Coffee", "5", None), ("Taxi", "20", None), ("Dinner", "60", "Food")]:
+            self.run_cli(["add", "--description", description, "--amount", amount] + (["--category", category] if category else []))
+        result = self.run_cli(["update", "--where-category", "Uncategorized", "--set-category", "Travel", "--dry-run"])
+        self.assertEqual(result.stdout.strip(), "2 expense(s) match. Dry run, nothing was updated.")
+        result = self.run_cli(["update", "--where-category", "Uncategorized", "--set-category", "Travel"])
+        self.assertEqual(result.stdout.strip(), "Updated 2 expense(s)")
+        result = self.run_cli(["delete", "--category", "Travel"])
+        self.assertEqual(result.stdout.strip(), "Deleted 2 expense(s) ($25.00)")
+        result = self.run_cli(["delete", "--id", "3", "--category", "Food"])
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("cannot be combined", result.stderr)
+
+    def test_list_top_expenses_cli(self):
+        for description, amount in [("Coffee", "5"), ("Rent", "900"), ("Dinner", "60")]:
+            self.run_cli(["add", "--description", description, "--amount", amount])
+        result = self.run_cli(["list", "--sort", "amount", "--reverse", "--limit", "2"])
+        self.assertEqual(result.returncode, 0)
+        lines = result.stdout.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("Rent", lines[1])
+        self.assertIn("Dinner", lines[2])
+
+    def test_list_invalid_date_argument(self):
+        result = self.run_cli(["list", "--from", "2024-01-01"])
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("expected DD-MM-YYYY", result.stderr)
+
     def test_summary_cli(self):
         self.run_cli(["add", "--description", "Food", "--amount", "25"])
         result = self.run_cli(["summary"])
@@ -49,6 +130,11 @@ class TestCLI(unittest.TestCase):
         self.assertNotEqual(result.returncode, 0)
         self.assertIn("invalid choice", result.stderr)
 
+    def test_stats_invalid_month_argument(self):
+        result = self.run_cli(["stats", "--month", "13"])
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("invalid choice", result.stderr)
+
     def test_delete_expense_cli(self):
         self.run_cli(["add", "--description", "ToDelete", "--amount", "1"])
         result = self.run_cli(["delete", "--id", "1"])
@@ -77,11 +163,52 @@ class TestCLI(unittest.TestCase):
         self.assertEqual(result.returncode, 0)
         self.assertIn("The expenses were exported successfully", result.stdout)
 
+    def test_export_gzip_by_category(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "4", "--category", "Food"])
+        self.run_cli(["add", "--description", "Taxi", "--amount", "9", "--category", "Transport"])
+        result = self.run_cli(["export", "--file-path", self.export_path + ".gz", "--category", "Food"])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("(1 row(s), csv)", result.stdout)
+
     def test_export_with_no_expenses(self):
         result = self.run_cli(["export", "--file-path", self.export_path])
         self.assertEqual(result.returncode, 0)
         self.assertIn("No expenses to export", result.stdout)
 
+    def test_journal_storage_and_compact(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "4", "--storage", "journal"])
+        self.assertFalse(os.path.exists(self.expenses_path))
+        result = self.run_cli(["compact"])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("Compacted 1 journal record(s)", result.stdout)
+        with open(self.expenses_path) as f:
+            expenses = json.load(f)
+        self.assertEqual(expenses["1"]["description"], "Coffee")
+
+    def test_migrate_to_sqlite(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "4", "--category", "Food"])
+        database_path = os.path.join(self.test_dir, "test_expenses.db")
+        result = self.run_cli(["migrate", "--target", database_path])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("Migrated 1 expense(s)", result.stdout)
+        command = [sys.executable, self.script, "list", "--storage", "sqlite", "--expenses_path", database_path]
+        result = subprocess.run(command, capture_output=True, text=True)
+        self.assertIn("Coffee", result.stdout)
+
+    def test_rebuild_index_check(self):
+        self.run_cli(["add", "--description", "Coffee", "--amount", "4"])
+        result = self.run_cli(["rebuild-index", "--check"])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("The totals index is consistent with the ledger.", result.stdout)
+
+    def test_import_csv(self):
+        input_path = os.path.join(self.test_dir, "bank.csv")
+        with open(input_path, "w") as f:
+            f.write("date,description,amount,category\n2024-03-01,Coffee,4.5,Food\n")
+        result = self.run_cli(["import", "--file-path", input_path, "--date-format", "%Y-%m-%d"])
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("Imported 1 expense(s)", result.stdout)
+
     def test_no_command_shows_help(self):
         result = self.run_cli([])
         self.assertNotEqual(result.returncode, 0)
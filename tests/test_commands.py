@@ -1,13 +1,17 @@
 import calendar
-from datetime import datetime
+from datetime import date, datetime
 import os
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 
-from commands import (add_expense, list_expenses, show_summary, delete_expense, 
-                      read_json, write_json, update_expense,
-                      set_budget, export_expenses)
+import storage
+from commands import (add_expense, list_expenses, show_summary, delete_expense, delete_expenses,
+                      read_json, write_json, update_expense, update_expenses,
+                      set_budget, export_expenses, compact_expenses,
+                      read_journal, get_journal_path, import_expenses, iter_list_lines)
+from storage import read_expenses
 
 class TestExpenseTracker(unittest.TestCase):
     def setUp(self):
@@ -278,3 +282,172 @@ class TestExpenseTracker(unittest.TestCase):
     def test_export_with_no_expenses(self):
         response = export_expenses(self.expenses_path, self.export_path)
         self.assertIn("No expenses to export", response)
+
+    def test_journal_mode_appends_instead_of_rewriting(self):
+        # In journal mode the JSON snapshot is left untouched and each change is appended.
+        self._create_expenses()
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 4, "Food", storage="journal")
+        update_expense(self.expenses_path, self.budget_path, 1, amount=80, storage="journal")
+        delete_expense(self.expenses_path, 3, storage="journal")
+        self.assertEqual(len(read_json(self.expenses_path)), 3)
+        self.assertEqual(len(read_journal(get_journal_path(self.expenses_path))), 3)
+
+        expenses = read_expenses(self.expenses_path)
+        self.assertEqual(sorted(expenses), ["1", "2", "4"])
+        self.assertEqual(expenses["1"]["amount"], 80)
+        self.assertIn("Total expenses: $134.00", show_summary(self.expenses_path))
+
+    def test_journal_ids_keep_increasing(self):
+        add_expense(self.expenses_path, self.budget_path, "First", 1, storage="journal")
+        response = add_expense(self.expenses_path, self.budget_path, "Second", 2, storage="journal")
+        self.assertIn("(ID: 2)", response["message"])
+
+    def test_compact_folds_journal_into_snapshot(self):
+        self._create_expenses()
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 4, "Food", storage="journal")
+        delete_expense(self.expenses_path, 2, storage="journal")
+        response = compact_expenses(self.expenses_path)
+        self.assertIn("Compacted 2 journal record(s)", response)
+        self.assertFalse(os.path.exists(get_journal_path(self.expenses_path)))
+        self.assertEqual(sorted(read_json(self.expenses_path)), ["1", "3", "4"])
+
+    def test_compact_without_journal(self):
+        self._create_expenses()
+        self.assertIn("Nothing to compact", compact_expenses(self.expenses_path))
+
+    def test_json_write_absorbs_pending_journal(self):
+        # A full rewrite already contains the journal changes, so the journal is dropped.
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 4, storage="journal")
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 10)
+        self.assertFalse(os.path.exists(get_journal_path(self.expenses_path)))
+        self.assertEqual(len(read_json(self.expenses_path)), 2)
+
+    def test_torn_journal_tail_is_ignored(self):
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 4, storage="journal")
+        with open(get_journal_path(self.expenses_path), "a", encoding="utf-8") as file:
+            file.write('{"op": "put", "id": "2", "exp')
+        self.assertEqual(len(read_expenses(self.expenses_path)), 1)
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 10, storage="journal")
+        self.assertEqual(sorted(read_expenses(self.expenses_path)), ["1", "2"])
+
+    def _write_file(self, name, content):
+        path = os.path.join(self.test_dir, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def test_import_csv_in_batches(self):
+        self._create_expenses()
+        input_path = self._write_file("bank.csv", "date,description,amount,category\n"
+                                      "01-03-2024,Coffee,4.5,Food\n"
+                                      "02-03-2024,,10,Food\n"
+                                      "03-03-2024,Taxi,-3,Transport\n"
+                                      "04-03-2024,Train,12,\n"
+                                      "31-02-2024,Cinema,15,Leisure\n"
+                                      "05-03-2024,Books,20,Leisure\n")
+        response = import_expenses(self.expenses_path, self.budget_path, input_path, batch_size=2)
+        self.assertIn("Imported 3 expense(s) in 2 batch(es) (IDs 4-6), rejected 3 row(s)", response)
+        self.assertIn("line 3: Description cannot be empty.", response)
+        self.assertIn("line 4: Invalid amount: Amount cannot be negative.", response)
+        self.assertIn("line 6: Invalid date: 31-02-2024", response)
+        expenses = read_json(self.expenses_path)
+        self.assertEqual(expenses["5"], {"date": "04-03-2024", "description": "Train", "amount": 12.0, "category": "Uncategorized"})
+        self.assertEqual(len(expenses), 6)
+
+    def test_import_jsonl_with_date_format(self):
+        input_path = self._write_file("bank.jsonl", '{"date": "2024-03-01", "description": "Coffee", "amount": 4.5}\n'
+                                      'not json\n'
+                                      '\n'
+                                      '{"date": "2024-03-02", "description": "Lunch", "amount": "12"}\n')
+        response = import_expenses(self.expenses_path, self.budget_path, input_path, date_format="%Y-%m-%d", storage="journal")
+        self.assertIn("Imported 2 expense(s) in 1 batch(es) (IDs 1-2), rejected 1 row(s)", response)
+        self.assertIn("line 2: Invalid JSON", response)
+        self.assertEqual(read_expenses(self.expenses_path)["2"]["date"], "02-03-2024")
+
+    def test_import_reports_exceeded_budgets(self):
+        set_budget(self.budget_path, 3, 10)
+        input_path = self._write_file("bank.csv", "date,description,amount\n01-03-2024,Dinner,40\n")
+        response = import_expenses(self.expenses_path, self.budget_path, input_path)
+        self.assertIn("[WARN] You exceeded the budget for March", response)
+
+    def test_import_missing_file(self):
+        with self.assertRaises(ValueError) as cm:
+            import_expenses(self.expenses_path, self.budget_path, os.path.join(self.test_dir, "missing.csv"))
+        self.assertIn("File not found", str(cm.exception))
+
+    def _create_dated_expenses(self):
+        write_json({
+            "1": {"date": "05-01-2024", "description": "Rent", "amount": 900.0, "category": "Home"},
+            "2": {"date": "02-01-2024", "description": "Coffee", "amount": 4.0, "category": "Food"},
+            "3": {"date": "20-02-2024", "description": "Dinner", "amount": 60.0, "category": "Food"},
+            "4": {"date": "11-03-2024", "description": "Train", "amount": 25.0, "category": "Transport"},
+        }, self.expenses_path)
+
+    def _listed_ids(self, **kwargs):
+        lines = list(iter_list_lines(self.expenses_path, **kwargs))
+        return [line.split()[0] for line in lines[1:]]
+
+    def test_list_is_streamed_line_by_line(self):
+        self._create_dated_expenses()
+        lines = iter_list_lines(self.expenses_path)
+        self.assertIn("Description", next(lines))
+        self.assertTrue(next(lines).startswith("1 "))
+
+    def test_list_with_limit_and_offset(self):
+        self._create_dated_expenses()
+        self.assertEqual(self._listed_ids(limit=2), ["1", "2"])
+        self.assertEqual(self._listed_ids(limit=2, offset=3), ["4"])
+        self.assertEqual(self._listed_ids(reverse=True, limit=1), ["4"])
+
+    def test_list_sorted(self):
+        self._create_dated_expenses()
+        self.assertEqual(self._listed_ids(sort="date"), ["2", "1", "3", "4"])
+        self.assertEqual(self._listed_ids(sort="amount", reverse=True), ["1", "3", "4", "2"])
+        self.assertEqual(self._listed_ids(sort="amount", reverse=True, limit=2), ["1", "3"])
+        self.assertEqual(self._listed_ids(sort="amount", limit=2, offset=1), ["4", "3"])
+
+    def test_list_by_date_range(self):
+        self._create_dated_expenses()
+        self.assertEqual(self._listed_ids(start=date(2024, 1, 5), end=date(2024, 2, 20)), ["1", "3"])
+        self.assertEqual(self._listed_ids(category="Food", start=date(2024, 1, 3)), ["3"])
+
+    def test_list_rejects_negative_limit(self):
+        with self.assertRaises(ValueError):
+            list_expenses(self.expenses_path, limit=-1)
+
+    def test_bulk_update_by_filter(self):
+        self._create_dated_expenses()
+        set_budget(self.budget_path, 2, 50)
+        self.assertEqual(update_expenses(self.expenses_path, self.budget_path, where_category="Food", category="Dining", dry_run=True),
+                         "2 expense(s) match. Dry run, nothing was updated.")
+        self.assertEqual(read_json(self.expenses_path)["2"]["category"], "Food")
+        with mock.patch.object(storage, "write_json", wraps=storage.write_json) as write:
+            response = update_expenses(self.expenses_path, self.budget_path, where_category="Food", start=date(2024, 1, 1), end=date(2024, 2, 29), category="Dining")
+        self.assertEqual(response, "Updated 2 expense(s)\n[WARN] You exceeded the budget for February")
+        self.assertEqual([call.args[1] for call in write.call_args_list].count(self.expenses_path), 1)
+        expenses = read_json(self.expenses_path)
+        self.assertEqual([expenses[expense_id]["category"] for expense_id in "1234"], ["Home", "Dining", "Dining", "Transport"])
+        self.assertIn("Total expenses with Dining in 2024: $64.00", show_summary(self.expenses_path, category="Dining", year=2024))
+        self.assertEqual(update_expenses(self.expenses_path, self.budget_path, year=2023, amount=1), "Updated 0 expense(s)")
+
+    def test_bulk_update_needs_a_filter_and_a_field(self):
+        self._create_dated_expenses()
+        with self.assertRaises(ValueError):
+            update_expenses(self.expenses_path, self.budget_path, category="Dining")
+        with self.assertRaises(ValueError):
+            update_expenses(self.expenses_path, self.budget_path, where_category="Food")
+        with self.assertRaises(ValueError):
+            update_expenses(self.expenses_path, self.budget_path, where_category="Food", amount=-1)
+        self.assertEqual(read_json(self.expenses_path)["2"]["category"], "Food")
+
+    def test_bulk_delete_by_filter(self):
+        self._create_dated_expenses()
+        self.assertEqual(delete_expenses(self.expenses_path, year=2024, end=date(2024, 2, 29), dry_run=True),
+                         "3 expense(s) match ($964.00). Dry run, nothing was deleted.")
+        self.assertEqual(len(read_json(self.expenses_path)), 4)
+        self.assertEqual(delete_expenses(self.expenses_path, category="Food"), "Deleted 2 expense(s) ($64.00)")
+        self.assertEqual(sorted(read_json(self.expenses_path)), ["1", "4"])
+        self.assertIn("Total expenses in 2024: $925.00", show_summary(self.expenses_path, year=2024))
+        self.assertEqual(delete_expenses(self.expenses_path, category="Food"), "Deleted 0 expense(s) ($0.00)")
+        with self.assertRaises(ValueError):
+            delete_expenses(self.expenses_path)
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import daemon
+from benchmarks.startup import parse_importtime
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.script = os.path.abspath("expense-tracker.py")
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        self.socket_path = os.path.join(self.test_dir, "daemon.sock")
+        self.env = dict(os.environ, EXPENSE_TRACKER_SOCKET=self.socket_path)
+        self.server = subprocess.Popen([sys.executable, self.script, "serve", "--flush-interval", "20"],
+                                       env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        deadline = time.time() + 10
+        while not daemon.is_running(self.socket_path):
+            if time.time() > deadline or self.server.poll() is not None:
+                self.fail(f"daemon did not start: {self.server.stderr.read()}")
+            time.sleep(0.02)
+
+    def tearDown(self):
+        if self.server.poll() is None:
+            self.server.terminate()
+            self.server.wait(timeout=10)
+        self.server.stdout.close()
+        self.server.stderr.close()
+        shutil.rmtree(self.test_dir)
+
+    def run_cli(self, args, env=None):
+        command = [sys.executable, self.script] + args + ["--expenses_path", self.expenses_path, "--budget_path", self.budget_path]
+        return subprocess.run(command, capture_output=True, text=True, env=env or self.env)
+
+    def test_commands_are_forwarded_to_the_daemon(self):
+        result = self.run_cli(["add", "--description", "Lunch", "--amount", "20", "--category", "Food"])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Expense added successfully (ID: 1)", result.stdout)
+        # Writes are acknowledged only after their group commit, so the file is already up to date.
+        with open(self.expenses_path) as f:
+            self.assertEqual(json.load(f)["1"]["description"], "Lunch")
+        result = self.run_cli(["summary", "--category", "Food"])
+        self.assertIn("Total expenses with Food: $20.00", result.stdout)
+
+    def test_forwarding_does_not_import_the_application(self):
+        self.run_cli(["add", "--description", "Lunch", "--amount", "20"])
+        command = [sys.executable, "-X", "importtime", self.script, "summary", "--expenses_path", self.expenses_path]
+        result = subprocess.run(command, capture_output=True, text=True, env=self.env)
+        self.assertIn("Total expenses: $20.00", result.stdout)
+        modules = {name for name, _, _, _ in parse_importtime(result.stderr)}
+        self.assertIn("client", modules)
+        self.assertEqual(modules & {"cli", "argparse", "commands", "storage", "profiling"}, set())
+
+    def test_errors_come_back_from_the_daemon(self):
+        result = self.run_cli(["update", "--expense_id", "7", "--amount", "1"])
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Expense with ID 7 not found", result.stderr)
+        result = self.run_cli(["summary", "--month", "13"])
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("invalid choice", result.stderr)
+
+    def test_daemon_notices_direct_writes(self):
+        self.run_cli(["add", "--description", "Lunch", "--amount", "20"])
+        direct = dict(self.env, EXPENSE_TRACKER_NO_DAEMON="1")
+        self.run_cli(["add", "--description", "Dinner", "--amount", "30"], env=direct)
+        result = self.run_cli(["list"])
+        self.assertIn("Dinner", result.stdout)
+
+    def test_concurrent_writes_share_group_commits(self):
+        clients = [subprocess.Popen([sys.executable, self.script, "add", "--description", f"Coffee {n}", "--amount", "1",
+                                     "--expenses_path", self.expenses_path, "--budget_path", self.budget_path],
+                                    env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                   for n in range(8)]
+        for client in clients:
+            client.communicate(timeout=30)
+            self.assertEqual(client.returncode, 0)
+        with open(self.expenses_path) as f:
+            self.assertEqual(sorted(map(int, json.load(f))), list(range(1, 9)))
+
+    def test_stops_on_sigterm_and_removes_socket(self):
+        self.server.send_signal(signal.SIGTERM)
+        self.assertEqual(self.server.wait(timeout=10), 0)
+        self.assertFalse(os.path.exists(self.socket_path))
+        result = self.run_cli(["add", "--description", "Lunch", "--amount", "20"])
+        self.assertIn("Expense added successfully", result.stdout)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+from commands import (add_expense, delete_expense, export_expenses, list_expenses, rebuild_totals, set_budget,
+                      show_summary, update_expense, get_budget, check_if_budget_exceed)
+from aggregates import AggregateIndex
+from dateindex import DateIndex, day_ordinal, iter_range
+from storage import open_storage, read_json, write_json
+
+
+class TestDateIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        self.this_year = datetime.now().year
+        write_json({
+            "1": {"date": "15-01-2023", "description": "Old lunch", "amount": 10, "category": "Food"},
+            "2": {"date": f"10-01-{self.this_year}", "description": "Lunch", "amount": 20, "category": "Food"},
+            "3": {"date": "31-03-2024", "description": "Taxi", "amount": 30, "category": "Transport"},
+            "4": {"date": "01-04-2024", "description": "Dinner", "amount": 40, "category": "Food"},
+            "5": {"date": "01-04-2024", "description": "Cinema", "amount": 50, "category": "Leisure"},
+            "6": {"date": "not a date", "description": "Broken", "amount": 60, "category": "Food"},
+        }, self.expenses_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_build_and_range(self):
+        index = DateIndex.build(open_storage(self.expenses_path))
+        self.assertEqual(index.ids[:4], [1, 3, 4, 5])
+        self.assertEqual(index.days, sorted(index.days))
+        self.assertEqual(index.ids_between(date(2024, 3, 31), date(2024, 4, 1)), [3, 4, 5])
+        self.assertEqual(index.ids_between(start=date(2024, 4, 2)), [2])
+        self.assertEqual(index.ids_between(end=date(2023, 12, 31)), [1])
+        self.assertEqual(day_ordinal("01-04-2024"), date(2024, 4, 1).toordinal())
+        self.assertIsNone(day_ordinal("not a date"))
+        self.assertIsNone(day_ordinal(None))
+
+    def test_range_queries_only_touch_matching_rows(self):
+        expenses = open_storage(self.expenses_path)
+        with mock.patch.object(expenses, "iter_expenses", wraps=expenses.iter_expenses) as scan:
+            rows = list(iter_range(expenses, start=date(2024, 4, 1), end=date(2024, 4, 1), category="Food"))
+            self.assertEqual(scan.call_count, 1)
+            self.assertEqual(rows, [("4", expenses.get("4"))])
+        self.assertTrue(os.path.exists(DateIndex.index_path(expenses)))
+        expenses = open_storage(self.expenses_path)
+        with mock.patch.object(expenses, "iter_expenses", side_effect=AssertionError("full scan")):
+            self.assertEqual([expense_id for expense_id, _ in iter_range(expenses, start=date(2024, 1, 1), end=date(2024, 12, 31))], ["3", "4", "5"])
+
+    def test_writers_keep_the_index_in_sync(self):
+        list_expenses(self.expenses_path, year=2024)
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 3)
+        update_expense(self.expenses_path, self.budget_path, 3, amount=35)
+        delete_expense(self.expenses_path, 4)
+        expenses = open_storage(self.expenses_path)
+        stored = DateIndex.load(expenses)
+        self.assertFalse(stored.dirty)
+        rebuilt = DateIndex.build(expenses)
+        self.assertEqual((stored.days, stored.ids), (rebuilt.days, rebuilt.ids))
+
+    def test_writers_do_not_create_the_index(self):
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 3)
+        self.assertFalse(os.path.exists(self.expenses_path + ".dates.json"))
+        rebuild_totals(self.expenses_path)
+        self.assertTrue(os.path.exists(self.expenses_path + ".dates.json"))
+
+    def test_list_and_export_by_year_and_range(self):
+        response = list_expenses(self.expenses_path, year=2024, start=date(2024, 4, 1))
+        self.assertNotIn("Taxi", response)
+        self.assertIn("Dinner", response)
+        self.assertIn("Cinema", response)
+        self.assertNotIn("Lunch", response)
+        export_path = os.path.join(self.test_dir, "export.csv")
+        response = export_expenses(self.expenses_path, export_path, year=2024, category="Food")
+        self.assertIn("(1 row(s), csv)", response)
+
+    def test_summary_is_year_aware(self):
+        self.assertIn("Total expenses for January: $20.00", show_summary(self.expenses_path, month=1))
+        self.assertIn("Total expenses for January 2023: $10.00", show_summary(self.expenses_path, month=1, year=2023))
+        self.assertIn("Total expenses in 2024: $120.00", show_summary(self.expenses_path, year=2024))
+        response = show_summary(self.expenses_path, start=date(2024, 3, 31), end=date(2024, 4, 1), category="Food")
+        self.assertEqual(response, "Total expenses with Food from 31-03-2024 until 01-04-2024: $40.00")
+        self.assertIn("$50.00", show_summary(self.expenses_path, year=2024, start=date(2024, 4, 1), category="Leisure"))
+
+    def test_sqlite_ranges(self):
+        sqlite_path = os.path.join(self.test_dir, "test_expenses.db")
+        target = open_storage(sqlite_path, "sqlite")
+        for expense_id, expense in open_storage(self.expenses_path).iter_expenses():
+            target.put(expense_id, expense)
+        target.commit()
+        response = show_summary(sqlite_path, year=2024, start=date(2024, 4, 1), storage="sqlite")
+        self.assertIn("$90.00", response)
+        self.assertFalse(os.path.exists(sqlite_path + ".dates.json"))
+
+    def test_year_month_budgets(self):
+        set_budget(self.budget_path, 4, 100)
+        set_budget(self.budget_path, 4, 80, year=2024)
+        self.assertEqual(read_json(self.budget_path), {"4": 100.0, "2024-04": 80.0})
+        self.assertEqual(get_budget(self.budget_path, 4, 2024), 80.0)
+        self.assertEqual(get_budget(self.budget_path, 4, 2025), 100.0)
+        self.assertEqual(get_budget(self.budget_path, 4), 100.0)
+        totals = AggregateIndex.load(open_storage(self.expenses_path))
+        self.assertIn("[WARN]", check_if_budget_exceed(self.budget_path, totals, 4, 2024))
+        self.assertIsNone(check_if_budget_exceed(self.budget_path, totals, 4, 2023))
+        with self.assertRaises(ValueError):
+            set_budget(self.budget_path, 13, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
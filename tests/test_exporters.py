@@ -0,0 +1,84 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+import exporters
+from commands import export_expenses
+from exporters import guess_export_options
+from storage import write_json
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        write_json({
+            "1": {"date": "05-01-2024", "description": "Rent", "amount": 900.0, "category": "Home"},
+            "2": {"date": "02-01-2024", "description": "Coffee", "amount": 4.0, "category": "Food"},
+            "3": {"date": "20-02-2024", "description": "Dinner", "amount": 60.0, "category": "Food"},
+        }, self.expenses_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _path(self, name):
+        return os.path.join(self.test_dir, name)
+
+    def test_guess_export_options(self):
+        self.assertEqual(guess_export_options("out.csv"), ("csv", None))
+        self.assertEqual(guess_export_options("out.jsonl.gz"), ("jsonl", "gzip"))
+        self.assertEqual(guess_export_options("out.parquet"), ("parquet", None))
+        self.assertEqual(guess_export_options("out.csv", compression="gzip"), ("csv", "gzip"))
+        with self.assertRaises(ValueError):
+            guess_export_options("out.csv", file_format="xml")
+
+    def test_csv_has_id_column_and_is_chunked(self):
+        response = export_expenses(self.expenses_path, self._path("out.csv"), chunk_size=2)
+        self.assertIn("(3 row(s), csv)", response)
+        with open(self._path("out.csv"), newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["id"] for row in rows], ["1", "2", "3"])
+        self.assertEqual(rows[0], {"id": "1", "date": "05-01-2024", "description": "Rent", "amount": "900.0", "category": "Home"})
+
+    def test_gzip_jsonl_with_filters(self):
+        response = export_expenses(self.expenses_path, self._path("out.jsonl.gz"), category="Food", start=date(2024, 1, 3))
+        self.assertIn("(1 row(s), jsonl)", response)
+        with gzip.open(self._path("out.jsonl.gz"), "rt") as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(rows, [{"id": "3", "date": "20-02-2024", "description": "Dinner", "amount": 60.0, "category": "Food"}])
+
+    def test_month_filter(self):
+        self.assertIn("(2 row(s), csv)", export_expenses(self.expenses_path, self._path("out.csv"), month=1))
+
+    def test_missing_optional_packages(self):
+        with mock.patch.object(exporters, "zstandard", None):
+            with self.assertRaises(RuntimeError) as cm:
+                export_expenses(self.expenses_path, self._path("out.csv.zst"))
+            self.assertIn("zstandard", str(cm.exception))
+        with mock.patch.object(exporters, "pyarrow", None):
+            with self.assertRaises(RuntimeError) as cm:
+                export_expenses(self.expenses_path, self._path("out.parquet"))
+            self.assertIn("pyarrow", str(cm.exception))
+
+    @unittest.skipIf(exporters.pyarrow is None, "pyarrow is not installed")
+    def test_arrow_and_parquet(self):
+        export_expenses(self.expenses_path, self._path("out.arrow"), chunk_size=2)
+        table = exporters.pyarrow.ipc.open_file(self._path("out.arrow")).read_all()
+        self.assertEqual(table.column("id").to_pylist(), [1, 2, 3])
+        self.assertEqual(table.column("date").to_pylist()[0], date(2024, 1, 5))
+        export_expenses(self.expenses_path, self._path("out.parquet"), category="Food")
+        table = exporters.pyarrow.parquet.read_table(self._path("out.parquet"))
+        self.assertEqual(table.column("description").to_pylist(), ["Coffee", "Dinner"])
+
+    @unittest.skipIf(exporters.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        export_expenses(self.expenses_path, self._path("out.csv.zst"))
+        with open(self._path("out.csv.zst"), "rb") as file:
+            content = exporters.zstandard.ZstdDecompressor().stream_reader(file).read().decode()
+        self.assertTrue(content.startswith("id,date,description,amount,category"))
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import storage as storage_module
+from commands import export_expenses, list_expenses, report_expenses, show_summary
+from jsonstream import ObjectReader, iter_json_object
+from storage import append_journal, delete_record, open_storage, put_record, read_expenses, write_json
+
+
+class TestObjectReader(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        content = {"1": {"description": 'Café "au" lait\\', "amount": 3.25, "tags": [1, {"x": None}]},
+                   "2": {"description": "", "amount": 12345678901234567890}, "3": -0.5}
+        for text in (json.dumps(content), json.dumps(content, indent=4)):
+            for chunk_size in (1, 2, 3, 7, 1 << 16):
+                with self.subTest(chunk_size=chunk_size):
+                    self.assertEqual(list(ObjectReader(io.StringIO(text), chunk_size)), list(content.items()))
+        self.assertEqual(list(ObjectReader(io.StringIO(" {\n} "), 1)), [])
+
+    def test_invalid_documents(self):
+        for text in ["", "[1]", '{"a": 1', '{"a" 1}', '{"a": 1,}', '{"a": 1 "b": 2}', '{"a": 1} x']:
+            with self.subTest(text=text):
+                with self.assertRaises(json.JSONDecodeError):
+                    list(ObjectReader(io.StringIO(text), 2))
+
+
+class TestStreamedLedger(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "expenses.json")
+        self.expenses = {
+            "1": {"date": "05-01-2024", "description": "Groceries", "amount": 100.0, "category": "Food"},
+            "2": {"date": "10-02-2024", "description": "Gas", "amount": 50.0, "category": "Transport"},
+            "3": {"date": "12-01-2025", "description": "Pizza", "amount": 25.5, "category": "Food"},
+            "4": {"date": "20-03-2024", "description": "Cinema", "amount": 12.0, "category": "Leisure"},
+        }
+        write_json(self.expenses, self.expenses_path)
+        patcher = mock.patch.object(storage_module, "STREAM_MIN_BYTES", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_missing_and_corrupt_files(self):
+        self.assertEqual(list(iter_json_object(os.path.join(self.test_dir, "missing.json"))), [])
+        with open(self.expenses_path, "w", encoding="utf-8") as file:
+            file.write('{"1": {"amount": 1}, "2": ')
+        with self.assertRaises(RuntimeError):
+            list(iter_json_object(self.expenses_path, chunk_size=4))
+
+    def test_journal_is_replayed_in_order(self):
+        rng = random.Random(7)
+        for trial in range(50):
+            with self.subTest(trial=trial):
+                write_json(self.expenses, self.expenses_path)
+                records = []
+                for _ in range(rng.randrange(12)):
+                    expense_id = str(rng.randrange(1, 8))
+                    if rng.random() < 0.4:
+                        records.append(delete_record(expense_id))
+                    else:
+                        records.append(put_record(expense_id, {"description": f"Edit {len(records)}", "amount": 1}))
+                append_journal(records, self.expenses_path + ".journal")
+                expenses = open_storage(self.expenses_path, "journal")
+                self.assertTrue(expenses.streaming)
+                self.assertEqual(list(expenses.iter_expenses()), list(read_expenses(self.expenses_path).items()))
+                os.remove(self.expenses_path + ".journal")
+
+    def test_read_only_commands_never_load_the_ledger(self):
+        with mock.patch.object(storage_module, "read_expenses", side_effect=AssertionError("loaded")):
+            self.assertEqual(show_summary(self.expenses_path), "Total expenses: $187.50")
+            self.assertEqual(show_summary(self.expenses_path, year=2024, category="Food"), "Total expenses with Food in 2024: $100.00")
+            lines = list_expenses(self.expenses_path, year=2024, sort="amount").splitlines()
+            self.assertEqual([line.split()[0] for line in lines[1:]], ["4", "2", "1"])
+            report = report_expenses(self.expenses_path, group_by="category", output_format="csv", workers=2)
+            self.assertEqual(report.splitlines(), ["category,sum", "Food,125.5", "Leisure,12.0", "Transport,50.0"])
+            output_path = os.path.join(self.test_dir, "food.jsonl")
+            self.assertIn("(2 row(s), jsonl)", export_expenses(self.expenses_path, output_path, category="Food"))
+        write_json({}, self.expenses_path)
+        self.assertEqual(list_expenses(self.expenses_path), "No expenses found")
+
+    def test_writes_load_the_ledger(self):
+        expenses = open_storage(self.expenses_path)
+        self.assertTrue(expenses.streaming)
+        self.assertEqual(expenses.count(), 4)
+        expenses.put(5, {"date": "01-04-2024", "description": "Book", "amount": 8, "category": "Leisure"})
+        self.assertFalse(expenses.streaming)
+        self.assertEqual([expense_id for expense_id, _ in expenses.iter_expenses(category="Leisure")], ["4", "5"])
+        with mock.patch.object(storage_module, "STREAM_MIN_BYTES", 1 << 40):
+            self.assertFalse(open_storage(self.expenses_path).streaming)
+
+
+if __name__ == "__main__":
+    unittest.main()
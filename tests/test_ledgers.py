@@ -0,0 +1,90 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from commands import export_expenses, migrate_expenses, report_expenses, show_summary
+from ledgers import expand_ledgers, is_multi_ledger, map_ledgers
+from storage import write_json
+
+
+def count_rows(expenses):
+    return expenses.count()
+
+
+class TestLedgers(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.teams_dir = os.path.join(self.test_dir, "teams")
+        os.mkdir(self.teams_dir)
+        self.ledgers = {
+            "design": {"1": {"date": "05-01-2024", "description": "Fonts", "amount": 40.0, "category": "Software"},
+                       "2": {"date": "20-02-2024", "description": "Lunch", "amount": 15.5, "category": "Food"}},
+            "infra": {"1": {"date": "10-01-2024", "description": "AWS", "amount": 300.0, "category": "Software"}},
+            "sales": {"1": {"date": "15-03-2023", "description": "Dinner", "amount": 80.0, "category": "Food"},
+                      "2": {"date": "16-03-2024", "description": "Train", "amount": 25.0, "category": "Travel"}},
+        }
+        for name, expenses in self.ledgers.items():
+            write_json(expenses, os.path.join(self.teams_dir, f"{name}.json"))
+        for suffix in (".totals.json", ".days.json", ".changes.json"):
+            write_json({"version": 1}, os.path.join(self.teams_dir, f"infra.json{suffix}"))
+        write_json({"1": {"date": "01-01-2024", "description": "Hidden", "amount": 1.0, "category": "Food"}}, os.path.join(self.teams_dir, ".draft.json"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_expand_ledgers(self):
+        names = [os.path.basename(path) for path in expand_ledgers(self.teams_dir, "json")]
+        self.assertEqual(names, ["design.json", "infra.json", "sales.json"])
+        names = [os.path.basename(path) for path in expand_ledgers(os.path.join(self.teams_dir, "[ds]*.json"), "json")]
+        self.assertEqual(names, ["design.json", "sales.json"])
+        with self.assertRaises(ValueError):
+            expand_ledgers(self.teams_dir, "sqlite")
+
+    def test_partitioned_ledgers(self):
+        partitioned_dir = os.path.join(self.test_dir, "partitioned")
+        os.mkdir(partitioned_dir)
+        for name in self.ledgers:
+            migrate_expenses(os.path.join(self.teams_dir, f"{name}.json"), os.path.join(partitioned_dir, name), "json", "partitioned")
+        self.assertTrue(is_multi_ledger(partitioned_dir, "partitioned"))
+        self.assertFalse(is_multi_ledger(os.path.join(partitioned_dir, "infra"), "partitioned"))
+        self.assertFalse(is_multi_ledger(os.path.join(self.teams_dir, "infra.json"), "json"))
+        self.assertEqual(len(expand_ledgers(partitioned_dir, "partitioned")), 3)
+        self.assertIn("across 3 ledger(s): $460.50", show_summary(partitioned_dir, storage="partitioned"))
+
+    def test_summary_merges_every_ledger(self):
+        self.assertEqual(show_summary(self.teams_dir), "Total expenses across 3 ledger(s): $460.50")
+        self.assertEqual(show_summary(self.teams_dir, year=2024, category="Software"), "Total expenses with Software in 2024 across 3 ledger(s): $340.00")
+        response = show_summary(self.teams_dir, year=2024, workers=2, per_ledger=True)
+        lines = response.splitlines()
+        self.assertEqual(lines[0], "Total expenses in 2024 across 3 ledger(s): $380.50")
+        self.assertEqual(lines[1], "Per ledger:")
+        self.assertTrue(lines[2].startswith("  design.json  $55.50  ("))
+        self.assertTrue(lines[4].startswith("  sales.json   $25.00  ("))
+
+    def test_worker_pool_keeps_the_ledger_order(self):
+        paths = expand_ledgers(self.teams_dir, "json")
+        results = map_ledgers(count_rows, paths, "json", workers=2)
+        self.assertEqual([(path, rows) for path, rows, _ in results], list(zip(paths, [2, 1, 2])))
+        self.assertTrue(all(seconds >= 0 for _, _, seconds in results))
+
+    def test_report_merges_cells(self):
+        report = report_expenses(self.teams_dir, group_by="category", metrics="sum,count,max", output_format="csv", workers=2)
+        self.assertEqual(report.splitlines(), ["category,sum,count,max", "Food,95.5,2,80.0", "Software,340.0,2,300.0", "Travel,25.0,1,25.0"])
+        report = report_expenses(self.teams_dir, group_by="year", per_ledger=True)
+        self.assertIn("  infra.json   1 row(s), $300.00", report)
+        with self.assertRaises(ValueError):
+            report_expenses(self.teams_dir, output_format="json", per_ledger=True)
+
+    def test_export_tags_rows_with_their_ledger(self):
+        output_path = os.path.join(self.test_dir, "all.csv")
+        response = export_expenses(self.teams_dir, output_path, year=2024)
+        self.assertIn("(4 row(s) from 3 ledger(s), csv)", response)
+        with open(output_path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([(row["id"], row["ledger"]) for row in rows], [("1", "design.json"), ("2", "design.json"), ("1", "infra.json"), ("2", "sales.json")])
+
+
+if __name__ == "__main__":
+    unittest.main()
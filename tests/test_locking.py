@@ -0,0 +1,137 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import locking
+from commands import add_expense, delete_expense, set_budget
+from storage import acquire_lock, read_json, release_lock, write_json
+
+WRITERS = 4
+WRITES_PER_WRITER = 15
+
+
+def add_many(expenses_path, budget_path, storage, writer):
+    for i in range(WRITES_PER_WRITER):
+        add_expense(expenses_path, budget_path, f"Writer {writer} #{i}", 1.25, storage=storage)
+
+
+def add_from(directory, expenses_path, budget_path):
+    os.chdir(directory)
+    add_expense(expenses_path, budget_path, "Queued", 4)
+
+
+class TestLocking(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _run_writers(self, storage):
+        processes = [multiprocessing.Process(target=add_many, args=(self.expenses_path, self.budget_path, storage, writer))
+                     for writer in range(WRITERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+    def _assert_no_lost_updates(self, expenses):
+        self.assertEqual(sorted(int(expense_id) for expense_id in expenses), list(range(1, WRITERS * WRITES_PER_WRITER + 1)))
+        descriptions = {expense["description"] for expense in expenses.values()}
+        self.assertEqual(len(descriptions), WRITERS * WRITES_PER_WRITER)
+
+    def test_concurrent_writers_with_group_commit(self):
+        self._run_writers("json")
+        self._assert_no_lost_updates(read_json(self.expenses_path))
+        totals = read_json(self.expenses_path + ".totals.json")
+        self.assertEqual(sum(cell[1] for categories in totals["totals"].values() for cell in categories.values()), WRITERS * WRITES_PER_WRITER)
+        self.assertEqual(os.listdir(self.expenses_path + locking.QUEUE_SUFFIX), [])
+
+    def test_concurrent_writers_with_plain_locks(self):
+        with mock.patch.dict(os.environ, {locking.GROUP_COMMIT_ENV: "0"}):
+            self._run_writers("journal")
+        expenses = read_json(self.expenses_path)
+        with open(self.expenses_path + ".journal", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                expenses[record["id"]] = record["expense"]
+        self._assert_no_lost_updates(expenses)
+        self.assertFalse(os.path.exists(self.expenses_path + locking.QUEUE_SUFFIX))
+
+    def test_group_commit_reports_errors(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 10)
+        self.assertEqual(delete_expense(self.expenses_path, 9), "Could not find an expense with id 9")
+        with self.assertRaises(ValueError):
+            add_expense(self.expenses_path, self.budget_path, "Lunch", -1)
+        self.assertEqual(list(read_json(self.expenses_path)), ["1"])
+
+    def test_queued_writes_share_one_flush(self):
+        queue_path = self.expenses_path + locking.QUEUE_SUFFIX
+        os.makedirs(queue_path)
+        for i, description in enumerate(["Coffee", "Taxi"]):
+            arguments = {"expenses_path": self.expenses_path, "budget_path": self.budget_path, "description": description,
+                         "amount": 3, "category": None, "storage": "json"}
+            write_json({"function": "add_expense", "arguments": arguments}, os.path.join(queue_path, f"{i:020d}-{os.getpid()}-x.request"))
+        with mock.patch("storage.JsonStorage.write", autospec=True, side_effect=lambda store: write_json(store.expenses, store.path)) as write:
+            response = add_expense(self.expenses_path, self.budget_path, "Lunch", 10)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(response["message"], "Expense added successfully (ID: 3)")
+        self.assertEqual([expense["description"] for expense in read_json(self.expenses_path).values()], ["Coffee", "Taxi", "Lunch"])
+        self.assertEqual(len(os.listdir(queue_path)), 2)
+
+    def test_failed_flush_fails_every_queued_write(self):
+        with mock.patch("storage.JsonStorage.write", side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError) as raised:
+                add_expense(self.expenses_path, self.budget_path, "Lunch", 10)
+        self.assertIn("disk full", str(raised.exception))
+        self.assertFalse(os.path.exists(self.expenses_path))
+
+    def test_uncontended_write_skips_the_queue(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 10)
+        self.assertEqual(list(read_json(self.expenses_path)), ["1"])
+        self.assertFalse(os.path.exists(self.expenses_path + locking.QUEUE_SUFFIX))
+
+    def test_queued_paths_do_not_depend_on_the_drainer_directory(self):
+        # The writer queues "e.json" from sub/; the lock holder drains it from the parent directory.
+        sub_dir = os.path.join(self.test_dir, "sub")
+        os.mkdir(sub_dir)
+        expenses_path = os.path.join(sub_dir, "e.json")
+        queue_path = expenses_path + locking.QUEUE_SUFFIX
+        previous_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        self.addCleanup(os.chdir, previous_dir)
+        lock_file = acquire_lock(expenses_path)
+        writer = multiprocessing.Process(target=add_from, args=(sub_dir, "e.json", "b.json"))
+        try:
+            writer.start()
+            for _ in range(500):
+                if locking.has_queued(queue_path):
+                    break
+                writer.join(0.01)
+            self.assertTrue(locking.has_queued(queue_path))
+            locking.drain_queue(expenses_path, queue_path)
+        finally:
+            release_lock(lock_file)
+        writer.join(60)
+        self.assertEqual(writer.exitcode, 0)
+        self.assertEqual([expense["description"] for expense in read_json(expenses_path).values()], ["Queued"])
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "e.json")))
+
+    def test_write_json_replaces_atomically(self):
+        set_budget(self.budget_path, 6, 100)
+        with mock.patch("json.dump", side_effect=OSError("interrupted")):
+            with self.assertRaises(RuntimeError):
+                set_budget(self.budget_path, 6, 200)
+        self.assertEqual(read_json(self.budget_path), {"6": 100.0})
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["test_budgets.json", "test_budgets.json.lock"])
+
+
+if __name__ == "__main__":
+    unittest.main()
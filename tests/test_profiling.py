@@ -0,0 +1,66 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import profiling
+from commands import add_expense, list_expenses
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+
+    def tearDown(self):
+        profiling.stop()
+        shutil.rmtree(self.test_dir)
+
+    def test_requested_format(self):
+        with mock.patch.dict(os.environ, {profiling.PROFILE_ENV: ""}):
+            self.assertIsNone(profiling.requested_format())
+            self.assertEqual(profiling.requested_format(flag=True), "summary")
+            self.assertEqual(profiling.requested_format(file_format="json"), "json")
+            self.assertEqual(profiling.requested_format(dump_prefix="out"), "summary")
+        for value, expected in [("1", "summary"), ("json", "json"), ("0", None), ("off", None)]:
+            with mock.patch.dict(os.environ, {profiling.PROFILE_ENV: value}):
+                self.assertEqual(profiling.requested_format(), expected)
+
+    def test_phases_are_only_recorded_while_profiling(self):
+        add_expense(self.expenses_path, self.budget_path, "Lunch", 20)
+        self.assertFalse(profiling.is_active())
+        profiling.start()
+        add_expense(self.expenses_path, self.budget_path, "Dinner", 30)
+        list_expenses(self.expenses_path)
+        output = io.StringIO()
+        profile = profiling.stop(output, "json")
+        self.assertFalse(profiling.is_active())
+        phases = json.loads(output.getvalue())["phases"]
+        self.assertEqual(phases["format_rows"]["calls"], 2)
+        self.assertGreaterEqual(phases["read_json"]["calls"], 2)
+        self.assertGreaterEqual(phases["write_json"]["calls"], 2)
+        self.assertIn("parse_date", phases)
+        self.assertNotIn("alloc_kib", phases["read_json"])
+        self.assertEqual(profile.to_dict()["phases"], phases)
+
+    def test_summary_and_dump(self):
+        prefix = os.path.join(self.test_dir, "profile")
+        profiling.start(prefix)
+        with profiling.phase("work"):
+            list_expenses(self.expenses_path)
+        output = io.StringIO()
+        profiling.stop(output)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(all(line.startswith("[PROFILE]") for line in lines))
+        self.assertTrue(any(line.split()[1] == "work" for line in lines))
+        self.assertIn("alloc KiB", lines[0])
+        self.assertTrue(os.path.exists(prefix + ".prof"))
+        self.assertTrue(os.path.exists(prefix + ".tracemalloc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+import reports
+from commands import report_expenses
+from reports import aggregate, aggregate_partition, merge_partitions, parse_report_fields
+from storage import write_json
+
+
+class TestReports(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        write_json({
+            "1": {"date": "01-01-2024", "description": "Lunch", "amount": 10, "category": "Food"},
+            "2": {"date": "02-01-2024", "description": "Dinner", "amount": 30.5, "category": "Food"},
+            "3": {"date": "15-02-2024", "description": "Taxi", "amount": 12, "category": "Transport"},
+            "4": {"date": "20-02-2024", "description": "Groceries", "amount": 50, "category": "Food"},
+            "5": {"date": "20-02-2023", "description": "Old taxi", "amount": 8, "category": "Transport"},
+            "6": {"date": "bad", "description": "Broken", "amount": 1, "category": "Food"},
+        }, self.expenses_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_parse_report_fields(self):
+        self.assertEqual(parse_report_fields("category, month", reports.GROUP_KEYS, "field"), ["category", "month"])
+        self.assertEqual(parse_report_fields("", reports.GROUP_KEYS, "field"), [])
+        with self.assertRaises(ValueError):
+            parse_report_fields("category,colour", reports.GROUP_KEYS, "field")
+        with self.assertRaises(ValueError):
+            parse_report_fields("sum,sum", reports.METRICS, "metric")
+
+    def test_pivot_in_one_pass(self):
+        response = report_expenses(self.expenses_path, "category,month", "sum,count,mean,min,max", output_format="json")
+        self.assertEqual(json.loads(response), [
+            {"category": "Food", "month": "2024-01", "sum": 40.5, "count": 2, "mean": 20.25, "min": 10.0, "max": 30.5},
+            {"category": "Food", "month": "2024-02", "sum": 50.0, "count": 1, "mean": 50.0, "min": 50.0, "max": 50.0},
+            {"category": "Transport", "month": "2023-02", "sum": 8.0, "count": 1, "mean": 8.0, "min": 8.0, "max": 8.0},
+            {"category": "Transport", "month": "2024-02", "sum": 12.0, "count": 1, "mean": 12.0, "min": 12.0, "max": 12.0},
+        ])
+
+    def test_formats_and_filters(self):
+        response = report_expenses(self.expenses_path, "week", "count", output_format="csv", year=2024, category="Food")
+        self.assertEqual(response, "week,count\n2024-W01,2\n2024-W08,1")
+        table = report_expenses(self.expenses_path, "", "sum,count")
+        self.assertEqual(table.splitlines()[0].split(), ["sum", "count"])
+        self.assertEqual(table.splitlines()[1].split(), ["110.50", "5"])
+        self.assertIn("Skipped 1 expense(s)", table)
+        self.assertEqual(report_expenses(self.expenses_path, "day", "sum", start=date(2025, 1, 1)), "No expenses found")
+        with self.assertRaises(ValueError):
+            report_expenses(self.expenses_path, "category", "")
+        with self.assertRaises(ValueError):
+            report_expenses(self.expenses_path, "category", "median")
+
+    def test_partitions_merge_exactly(self):
+        rows = [(f"{day:02d}-0{month}-2024", day * 1.25 + month, ["Food", "Rent", None][day % 3]) for day in range(1, 29) for month in range(1, 4)]
+        expected = aggregate_partition(rows, ["category", "month"])
+        partials = [aggregate_partition(rows[i:i + 10], ["category", "month"]) for i in range(0, len(rows), 10)]
+        self.assertEqual(merge_partitions(partials), expected)
+        with mock.patch.object(reports, "PARALLEL_MIN_ROWS", 0):
+            self.assertEqual(aggregate(rows, ["category", "month"], workers=2), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
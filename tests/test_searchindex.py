@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from commands import add_expense, delete_expense, import_expenses, rebuild_totals, search_expenses, update_expense
+from searchindex import SearchIndex, decode_array, encode_array, parse_query, tokenize
+from storage import open_storage, read_json, write_json
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        write_json({
+            "1": {"date": "15-01-2024", "description": "Uber ride", "amount": 12.5, "category": "Transport"},
+            "2": {"date": "16-01-2024", "description": "UBER Eats dinner", "amount": 30, "category": "Food"},
+            "3": {"date": "01-02-2024", "description": "AWS invoice", "amount": 99.99, "category": "Work"},
+            "4": {"date": "02-02-2024", "description": "aws-s3 storage", "amount": 5, "category": "Work"},
+            "5": {"date": "03-02-2024", "description": "Café au lait", "amount": 3, "category": "Food"},
+        }, self.expenses_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_tokenize_and_parse_query(self):
+        self.assertEqual(tokenize("AWS-S3 storage, Café"), {"aws", "s3", "storage", "café"})
+        self.assertEqual(parse_query("Uber ea*"), [("uber", False), ("ea", True)])
+        self.assertEqual(parse_query("aws-s*"), [("aws", False), ("s", True)])
+        with self.assertRaises(ValueError):
+            parse_query(" * ")
+        self.assertEqual(decode_array(encode_array([1, 5, 2**40])).tolist(), [1, 5, 2**40])
+
+    def test_search(self):
+        index = SearchIndex.build(open_storage(self.expenses_path))
+        self.assertEqual(index.search("uber"), [1, 2])
+        self.assertEqual(index.search("uber eats"), [2])
+        self.assertEqual(index.search("aw*"), [3, 4])
+        self.assertEqual(index.search("aws s3*"), [4])
+        self.assertEqual(index.search("CAFÉ"), [5])
+        self.assertEqual(index.search("ub"), [])
+        self.assertEqual(index.search("uber nothing"), [])
+        index.apply(6, None, {"description": "Uber pool"})
+        index.apply(1, {"description": "Uber ride"}, None)
+        self.assertEqual(index.search("uber"), [2, 6])
+        self.assertEqual(index.search("po*"), [6])
+        self.assertEqual(index.search("ride"), [])
+
+    def test_search_command(self):
+        response = search_expenses(self.expenses_path, "uber")
+        self.assertIn("Uber ride", response)
+        self.assertIn("UBER Eats dinner", response)
+        self.assertNotIn("AWS", response)
+        self.assertIn("Found 2 expense(s) matching 'uber': $42.50", response)
+        limited = search_expenses(self.expenses_path, "aws*", limit=1)
+        self.assertIn("... and 1 more", limited)
+        self.assertIn("Found 2 expense(s) matching 'aws*': $104.99", limited)
+        self.assertEqual(search_expenses(self.expenses_path, "taxi"), "No expenses found matching 'taxi'")
+        self.assertTrue(os.path.exists(SearchIndex.index_path(open_storage(self.expenses_path))))
+
+    def test_persisted_index_is_reused(self):
+        search_expenses(self.expenses_path, "uber")
+        content = read_json(self.expenses_path + ".search.json")
+        self.assertEqual(content["terms"].split("\n"), sorted(content["terms"].split("\n")))
+        self.assertIn("uber", content["terms"].split("\n"))
+        with mock.patch.object(SearchIndex, "build", side_effect=AssertionError("rebuilt")):
+            self.assertIn("Found 2 expense(s)", search_expenses(self.expenses_path, "aws*"))
+
+    def test_writers_keep_the_index_in_sync(self):
+        search_expenses(self.expenses_path, "uber")
+        with mock.patch.object(SearchIndex, "build", side_effect=AssertionError("rebuilt")):
+            add_expense(self.expenses_path, self.budget_path, "Uber airport", 40)
+            update_expense(self.expenses_path, self.budget_path, 1, description="Taxi ride")
+            delete_expense(self.expenses_path, 3)
+            self.assertIn("Found 2 expense(s) matching 'uber': $70.00", search_expenses(self.expenses_path, "uber"))
+            self.assertIn("Taxi ride", search_expenses(self.expenses_path, "ride"))
+            self.assertEqual(search_expenses(self.expenses_path, "invoice"), "No expenses found matching 'invoice'")
+        expenses = open_storage(self.expenses_path)
+        stored = SearchIndex.load(expenses)
+        rebuilt = SearchIndex.build(expenses)
+        self.assertEqual((stored.terms, stored.counts, stored.postings), (rebuilt.terms, rebuilt.counts, rebuilt.postings))
+
+    def test_writers_do_not_create_the_index(self):
+        add_expense(self.expenses_path, self.budget_path, "Coffee", 3)
+        rebuild_totals(self.expenses_path)
+        self.assertFalse(os.path.exists(self.expenses_path + ".search.json"))
+        jsonl_path = os.path.join(self.test_dir, "import.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as file:
+            file.write('{"description": "Uber pool", "amount": 8}\n')
+        search_expenses(self.expenses_path, "coffee")
+        import_expenses(self.expenses_path, self.budget_path, jsonl_path)
+        with mock.patch.object(SearchIndex, "build", side_effect=AssertionError("rebuilt")):
+            self.assertIn("Found 3 expense(s) matching 'uber'", search_expenses(self.expenses_path, "uber"))
+
+    def test_outside_edits_rebuild_the_index(self):
+        search_expenses(self.expenses_path, "uber")
+        expenses = read_json(self.expenses_path)
+        expenses["9"] = {"date": "01-03-2024", "description": "Uber pool", "amount": 7.5, "category": "Transport"}
+        write_json(expenses, self.expenses_path)
+        self.assertIn("Found 3 expense(s) matching 'uber': $50.00", search_expenses(self.expenses_path, "uber"))
+
+    def test_search_on_sqlite(self):
+        expenses_path = os.path.join(self.test_dir, "expenses.db")
+        add_expense(expenses_path, self.budget_path, "Uber ride", 10, storage="sqlite")
+        self.assertIn("Found 1 expense(s)", search_expenses(expenses_path, "uber", storage="sqlite"))
+        add_expense(expenses_path, self.budget_path, "Uber back", 12, storage="sqlite")
+        self.assertIn("Found 2 expense(s) matching 'uber': $22.00", search_expenses(expenses_path, "uber", storage="sqlite"))
+
+
+if __name__ == "__main__":
+    unittest.main()
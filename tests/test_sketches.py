@@ -0,0 +1,65 @@
+import random
+import statistics
+import unittest
+
+from sketches import HyperLogLog, Moments, TDigest
+
+
+class TestSketches(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.values = [round(rng.lognormvariate(3, 1), 2) for _ in range(20000)]
+
+    def test_moments_merge_like_one_pass(self):
+        whole, parts = Moments(), [Moments() for _ in range(3)]
+        for position, value in enumerate(self.values):
+            whole.add(value)
+            parts[position % 3].add(value)
+        merged = Moments()
+        for part in parts:
+            merged.merge(part)
+        self.assertEqual(merged.count, len(self.values))
+        self.assertAlmostEqual(merged.mean, statistics.fmean(self.values), places=6)
+        self.assertAlmostEqual(merged.stddev(), statistics.stdev(self.values), places=6)
+        self.assertAlmostEqual(whole.stddev(), merged.stddev(), places=6)
+
+    def test_tdigest_quantiles(self):
+        ordered = sorted(self.values)
+        whole, parts = TDigest(100), [TDigest(100) for _ in range(8)]
+        for position, value in enumerate(self.values):
+            whole.add(value)
+            parts[position % 8].add(value)
+        merged = TDigest.from_json(TDigest(100).to_json())
+        for part in parts:
+            merged.merge(TDigest.from_json(part.to_json()))
+        for digest in (whole, merged):
+            self.assertEqual(digest.count(), len(self.values))
+            self.assertLess(len(digest.centroids), 200)
+            for q in (0.5, 0.95, 0.99):
+                exact = ordered[int(q * len(ordered))]
+                self.assertLess(abs(digest.quantile(q) / exact - 1), 0.03, q)
+            self.assertEqual((digest.quantile(0), digest.quantile(1)), (ordered[0], ordered[-1]))
+        small = TDigest()
+        for value in (5, 1, 3, 2, 4):
+            small.add(value)
+        self.assertEqual([small.quantile(q) for q in (0, 0.5, 1)], [1, 3, 5])
+        with self.assertRaises(ValueError):
+            TDigest(5)
+
+    def test_hyperloglog(self):
+        for precision, distinct in ((10, 40), (10, 5000), (14, 50000)):
+            with self.subTest(precision=precision, distinct=distinct):
+                left, right = HyperLogLog(precision), HyperLogLog(precision)
+                for position in range(distinct * 2):
+                    (left if position % 2 else right).add(f"Merchant {position % distinct}")
+                left.merge(HyperLogLog.from_json(right.to_json()))
+                self.assertLess(abs(left.estimate() / distinct - 1), 3 * 1.04 / (1 << precision) ** 0.5)
+        self.assertEqual(HyperLogLog.from_json(left.to_json()).registers, left.registers)
+        with self.assertRaises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+        with self.assertRaises(ValueError):
+            HyperLogLog(20)
+
+
+if __name__ == "__main__":
+    unittest.main()
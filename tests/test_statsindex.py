@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import statsindex
+from commands import add_expense, delete_expense, rebuild_totals, stats_expenses, stats_row, update_expense
+from statsindex import SpendSketch, StatsIndex
+from storage import open_storage, read_json, write_json
+
+
+class TestStatsIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.expenses_path = os.path.join(self.test_dir, "test_expenses.json")
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+        expenses = {}
+        for day in range(1, 21):
+            expenses[str(day)] = {"date": f"{day:02d}-01-2024", "description": f"Market {day % 4}", "amount": 10.0 + day % 5, "category": "Food"}
+        expenses["21"] = {"date": "21-01-2024", "description": "Caviar", "amount": 400.0, "category": "Food"}
+        expenses["22"] = {"date": "03-02-2024", "description": "Rent", "amount": 900.0, "category": "Rent"}
+        expenses["23"] = {"date": "04-02-2023", "description": "Market 1", "amount": 12.0, "category": "Food"}
+        write_json(expenses, self.expenses_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def stored(self):
+        expenses = open_storage(self.expenses_path)
+        return StatsIndex.load(expenses), expenses
+
+    def test_stats_table(self):
+        lines = stats_expenses(self.expenses_path, year=2024).splitlines()
+        self.assertEqual(lines[0].split(), ["category", "count", "mean", "stddev", "min", "p50", "p95", "max", "merchants"])
+        self.assertEqual(lines[1].split()[:2] + lines[1].split()[4:6] + lines[1].split()[7:], ["Food", "21", "10.00", "12.00", "400.00", "5"])
+        self.assertEqual(lines[2].split(), ["Rent", "1", "900.00", "0.00", "900.00", "900.00", "900.00", "900.00", "1"])
+        self.assertEqual(lines[3].split()[:2], ["All", "22"])
+        self.assertEqual(stats_expenses(self.expenses_path, category="Food", year=2023, output_format="csv").splitlines(),
+                         ["category,count,mean,stddev,min,p50,p95,max,merchants", "Food,1,12.0,0.0,12.0,12.0,12.0,12.0,1"])
+        self.assertEqual(stats_expenses(self.expenses_path, year=2022), "No expenses found")
+        with self.assertRaises(ValueError):
+            stats_expenses(self.expenses_path, month=13)
+
+    def test_outliers(self):
+        response = stats_expenses(self.expenses_path, outliers=True)
+        self.assertIn("1 outlier(s) more than 3 interquartile ranges", response)
+        self.assertIn("Caviar", response.splitlines()[-1])
+        self.assertNotIn("outlier(s)", stats_expenses(self.expenses_path, month=2, year=2024, outliers=True).splitlines()[-1])
+
+    def test_writes_keep_the_sketches_current(self):
+        stats_expenses(self.expenses_path)
+        add_expense(self.expenses_path, self.budget_path, "Bakery", 7, "Food")
+        index, expenses = self.stored()
+        self.assertEqual(index.source, expenses.identity())
+        self.assertFalse(index.stale)
+        update_expense(self.expenses_path, self.budget_path, 21, amount=20)
+        delete_expense(self.expenses_path, 22)
+        index, expenses = self.stored()
+        self.assertEqual(index.stale, {("2024-01", "Food"), ("2024-02", "Rent")})
+        # Only the two stale months are re-read, not the ledger.
+        with mock.patch.object(statsindex, "iter_range", wraps=statsindex.iter_range) as iter_range:
+            lines = stats_expenses(self.expenses_path, year=2024).splitlines()
+        self.assertEqual(iter_range.call_count, 2)
+        self.assertEqual(lines[1].split()[1], "21")
+        self.assertEqual(lines[1].split()[7], "20.00")
+        # A single category has no "All" row.
+        self.assertEqual(len(lines), 2)
+        rebuilt = StatsIndex.build(open_storage(self.expenses_path))
+        self.assertEqual(rebuilt.merged()["Food"].to_json()["moments"], self.stored()[0].merged()["Food"].to_json()["moments"])
+
+    def test_accuracy_settings_are_kept(self):
+        stats_expenses(self.expenses_path, compression=50, precision=6)
+        content = read_json(StatsIndex.index_path(open_storage(self.expenses_path)))
+        self.assertEqual((content["compression"], content["precision"]), (50, 6))
+        stats_expenses(self.expenses_path)
+        rebuild_totals(self.expenses_path)
+        content = read_json(StatsIndex.index_path(open_storage(self.expenses_path)))
+        self.assertEqual((content["compression"], content["precision"]), (50, 6))
+        with self.assertRaises(ValueError):
+            stats_expenses(self.expenses_path, precision=30)
+
+    def test_merchants_never_exceed_rows(self):
+        sketch = SpendSketch()
+        for position in range(32):
+            sketch.add(5.0, f"Shop {position}")
+        # The HyperLogLog estimates 33 distinct names here.
+        self.assertGreater(sketch.merchants.estimate(), 32)
+        self.assertEqual(stats_row("Shops", sketch)[-1], 32)
+
+    def test_sketches_merge_across_ledgers(self):
+        teams_dir = os.path.join(self.test_dir, "teams")
+        os.mkdir(teams_dir)
+        shutil.move(self.expenses_path, os.path.join(teams_dir, "design.json"))
+        write_json({"1": {"date": "05-01-2024", "description": "Market 9", "amount": 11.0, "category": "Food"}}, os.path.join(teams_dir, "infra.json"))
+        lines = stats_expenses(teams_dir, category="Food", year=2024, workers=2, outliers=True).splitlines()
+        self.assertEqual(lines[1].split()[:2] + lines[1].split()[-1:], ["Food", "22", "6"])
+        self.assertIn("design.json 21", lines[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+import storage as storage_module
+from commands import add_expense, delete_expense, list_expenses, migrate_expenses, show_summary, update_expense
+from storage import STORAGE_MODES, SqliteStorage, open_storage, read_json, write_json
+
+
+class TestStorageBackends(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.budget_path = os.path.join(self.test_dir, "test_budgets.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _path(self, storage):
+        return os.path.join(self.test_dir, f"expenses-{storage}.db" if storage == "sqlite" else f"expenses-{storage}.json")
+
+    def _fill(self, storage):
+        path = self._path(storage)
+        expenses = open_storage(path, storage)
+        expenses.put(1, {"date": "05-01-2024", "description": "Groceries", "amount": 100.0, "category": "Food"})
+        expenses.put(2, {"date": "10-02-2024", "description": "Gas", "amount": 50.0, "category": "Transport"})
+        expenses.put(3, {"date": "12-01-2025", "description": "Pizza", "amount": 25.5, "category": "Food"})
+        expenses.commit()
+        expenses.close()
+        return path
+
+    def test_backends_share_the_same_contract(self):
+        for storage in STORAGE_MODES:
+            with self.subTest(storage=storage):
+                expenses = open_storage(self._fill(storage), storage)
+                self.assertEqual(expenses.count(), 3)
+                self.assertEqual(expenses.next_id(), 4)
+                self.assertEqual(expenses.get("2")["description"], "Gas")
+                self.assertIsNone(expenses.get("99"))
+                self.assertEqual([expense_id for expense_id, _ in expenses.iter_expenses(category="Food")], ["1", "3"])
+                self.assertEqual([expense_id for expense_id, _ in expenses.iter_expenses(month=1)], ["1", "3"])
+                self.assertTrue(expenses.delete("1"))
+                self.assertFalse(expenses.delete("1"))
+                expenses.commit()
+                expenses.close()
+                self.assertEqual(open_storage(self._path(storage), storage).count(), 2)
+
+    def test_commands_run_on_sqlite(self):
+        path = self._path("sqlite")
+        add_expense(path, self.budget_path, "Lunch", 20, "Food", storage="sqlite")
+        add_expense(path, self.budget_path, "Taxi", 12.5, "Transport", storage="sqlite")
+        update_expense(path, self.budget_path, 1, amount=30, storage="sqlite")
+        self.assertIn("Total expenses: $42.50", show_summary(path, storage="sqlite"))
+        self.assertIn("Total expenses with Food: $30.00", show_summary(path, category="Food", storage="sqlite"))
+        self.assertNotIn("Taxi", list_expenses(path, category="Food", storage="sqlite"))
+        self.assertIn("Expense deleted successfully", delete_expense(path, 2, storage="sqlite"))
+        self.assertIn("No expenses found", list_expenses(self._path("empty-sqlite"), storage="sqlite"))
+
+    def test_sqlite_filters_use_indexes(self):
+        expenses = SqliteStorage(self._fill("sqlite"))
+        for query, param in [("category = ?", "Food"), ("month = ?", 1)]:
+            plan = expenses.connection.execute(f"EXPLAIN QUERY PLAN SELECT * FROM expenses WHERE {query}", (param,)).fetchall()
+            self.assertIn("USING INDEX", " ".join(row[-1] for row in plan))
+        expenses.close()
+
+    def test_migrate_json_to_sqlite_and_back(self):
+        source = self._fill("json")
+        target = self._path("sqlite")
+        response = migrate_expenses(source, target)
+        self.assertIn("Migrated 3 expense(s)", response)
+        back = os.path.join(self.test_dir, "back.json")
+        migrate_expenses(target, back, "sqlite", "json")
+        self.assertEqual(read_json(back), read_json(source))
+
+    def test_partitioned_layout(self):
+        path = self._fill("partitioned")
+        directory = os.path.join(self.test_dir, "expenses-partitioned")
+        self.assertEqual(sorted(os.listdir(directory)), ["2024-01.json", "2024-02.json", "2025-01.json", "manifest.json"])
+        manifest = read_json(os.path.join(directory, "manifest.json"))
+        self.assertEqual(manifest["next_id"], 4)
+        self.assertEqual({key: (stats["count"], stats["cents"]) for key, stats in manifest["partitions"].items()},
+                         {"2024-01": (1, 10000), "2024-02": (1, 5000), "2025-01": (1, 2550)})
+
+        with mock.patch.object(storage_module, "write_json", wraps=storage_module.write_json) as write:
+            expenses = open_storage(path, "partitioned")
+            expenses.put(2, {"date": "10-02-2024", "description": "Gas", "amount": 55.0, "category": "Transport"})
+            expenses.commit()
+        self.assertEqual([os.path.basename(call.args[1]) for call in write.call_args_list], ["2024-02.json", "manifest.json"])
+
+        with mock.patch.object(storage_module, "read_json", wraps=storage_module.read_json) as read:
+            expenses = open_storage(path, "partitioned")
+            rows = list(expenses.iter_expenses(start=date(2024, 2, 1), end=date(2024, 12, 31)))
+        self.assertEqual([expense["amount"] for _, expense in rows], [55.0])
+        self.assertEqual([os.path.basename(call.args[0]) for call in read.call_args_list], ["manifest.json", "2024-02.json"])
+
+        expenses = open_storage(path, "partitioned")
+        expenses.delete(3)
+        expenses.commit()
+        self.assertFalse(os.path.exists(os.path.join(directory, "2025-01.json")))
+        self.assertEqual(open_storage(path, "partitioned").next_id(), 4)
+
+    def test_partitioned_manifest_recovers_from_outside_edits(self):
+        path = self._fill("partitioned")
+        directory = os.path.join(self.test_dir, "expenses-partitioned")
+        write_json({"1": {"date": "05-01-2024", "description": "Groceries", "amount": 100.0, "category": "Food"},
+                    "7": {"date": "06-01-2024", "description": "Bakery", "amount": 4.0, "category": "Food"}}, os.path.join(directory, "2024-01.json"))
+        expenses = open_storage(path, "partitioned")
+        self.assertEqual(expenses.count(), 4)
+        self.assertEqual(expenses.next_id(), 8)
+        self.assertEqual(expenses.get(7)["description"], "Bakery")
+
+    def test_migrate_json_to_partitioned_and_back(self):
+        source = os.path.join(self.test_dir, "source.json")
+        write_json({"1": {"date": "05-01-2024", "description": "Groceries", "amount": 100.0, "category": "Food", "note": "kept"},
+                    "2": {"date": "not a date", "description": "Broken", "amount": 1, "category": "Food"},
+                    "5": {"date": "12-01-2025", "description": "Pizza", "amount": 25.5, "category": "Food"}}, source)
+        target = os.path.join(self.test_dir, "ledger")
+        self.assertIn("Migrated 3 expense(s)", migrate_expenses(source, target, "json", "partitioned"))
+        self.assertTrue(os.path.exists(os.path.join(target, "undated.json")))
+        self.assertIn("Total expenses: $125.50", show_summary(target, storage="partitioned"))
+        back = os.path.join(self.test_dir, "back.json")
+        migrate_expenses(target, back, "partitioned", "json")
+        self.assertEqual(read_json(back), read_json(source))
+
+    def test_binary_layout(self):
+        path = self._fill("binary")
+        with open(path, "rb") as file:
+            content = file.read()
+        magic, version, record_size, count, heap_size, _ = storage_module.BINARY_HEADER.unpack_from(content)
+        self.assertEqual((magic, version, record_size, count), (b"EXPB", 1, storage_module.BINARY_RECORD.size, 3))
+        records = list(storage_module.BINARY_RECORD.iter_unpack(content[storage_module.BINARY_HEADER.size:storage_module.BINARY_HEADER.size + 3 * storage_module.BINARY_RECORD.size]))
+        self.assertEqual([(record[0], record[1], record[3]) for record in records], [(1, 10000, 0), (2, 5000, 1), (3, 2550, 0)])
+        self.assertEqual(heap_size, len("GroceriesGasPizza"))
+
+        expenses = open_storage(path, "binary")
+        with mock.patch.object(storage_module.BinaryStorage, "record_expense", wraps=expenses.record_expense) as materialise:
+            rows = list(expenses.iter_expenses(category="Food", start=date(2025, 1, 1)))
+        self.assertEqual([expense["description"] for _, expense in rows], ["Pizza"])
+        self.assertEqual(materialise.call_count, 1)
+        self.assertEqual(sorted(expenses.iter_cells()), [("2024-01", "Food", 10000), ("2024-02", "Transport", 5000), ("2025-01", "Food", 2550)])
+        expenses.close()
+
+    def test_migrate_json_to_binary_and_back(self):
+        source = os.path.join(self.test_dir, "source.json")
+        write_json({"1": {"date": "05-01-2024", "description": "Grocéries", "amount": 100.0, "category": "Food"},
+                    "2": {"date": "not a date", "description": "Broken", "amount": 1, "category": "Food"},
+                    "3": {"date": "06-01-2024", "description": "Note", "amount": 0.1 + 0.2, "category": None, "note": "kept"},
+                    "5": {"date": "12-01-2025", "description": "Pizza", "amount": 25.5, "category": None}}, source)
+        target = os.path.join(self.test_dir, "expenses.bin")
+        self.assertIn("Migrated 4 expense(s)", migrate_expenses(source, target, "json", "binary"))
+        expenses = open_storage(target, "binary")
+        self.assertEqual(expenses.count(), 4)
+        self.assertEqual(expenses.record_count, 2)
+        self.assertEqual(sorted(expenses.extras), ["2", "3"])
+        self.assertEqual([expense_id for expense_id, _ in expenses.iter_expenses()], ["1", "2", "3", "5"])
+        self.assertEqual(expenses.get(3)["note"], "kept")
+        self.assertEqual(expenses.next_id(), 6)
+        expenses.close()
+        self.assertIn("Total expenses: $125.80", show_summary(target, storage="binary"))
+        back = os.path.join(self.test_dir, "back.json")
+        migrate_expenses(target, back, "binary", "json")
+        self.assertEqual(read_json(back), read_json(source))
+
+    def test_migrate_refuses_non_empty_target(self):
+        source = self._fill("json")
+        target = self._fill("sqlite")
+        with self.assertRaises(ValueError) as cm:
+            migrate_expenses(source, target)
+        self.assertIn("is not empty", str(cm.exception))
+
+    def test_unknown_storage(self):
+        with self.assertRaises(ValueError):
+            open_storage(self._path("json"), "csv")
+
+
+class TestJsonCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "expenses.json")
+        storage_module.clear_json_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        storage_module.clear_json_cache()
+
+    def _write(self, content, age=60):
+        # Cached entries are only trusted for files that have not changed in the last RACY_SECONDS.
+        write_json(content, self.path)
+        past = time.time() - age
+        os.utime(self.path, (past, past))
+
+    def test_unchanged_file_is_decoded_once(self):
+        self._write({"1": {"date": "05-01-2024", "amount": 1.5}})
+        first = read_json(self.path)
+        first["1"]["amount"] = 99
+        second = read_json(self.path)
+        self.assertEqual(second, {"1": {"date": "05-01-2024", "amount": 1.5}})
+        self.assertIsNot(second, read_json(self.path))
+        stats = storage_module.json_cache_stats()
+        self.assertEqual((stats["misses"], stats["hits"], stats["entries"]), (1, 2, 1))
+
+    def test_changed_file_is_decoded_again(self):
+        self._write({"1": {"amount": 1}})
+        read_json(self.path)
+        self._write({"1": {"amount": 2}})
+        self.assertEqual(read_json(self.path), {"1": {"amount": 2}})
+        self.assertEqual(storage_module.json_cache_stats()["misses"], 2)
+        write_json({"1": {"amount": 3}}, self.path)
+        self.assertEqual(read_json(self.path), {"1": {"amount": 3}})
+        self.assertEqual(read_json(self.path), {"1": {"amount": 3}})
+        self.assertEqual(storage_module.json_cache_stats()["hits"], 0)
+
+    def test_identity_sees_a_same_size_replace(self):
+        write_json({"1": {"amount": 1}}, self.path)
+        os.utime(self.path, ns=(10**18, 10**18))
+        before = storage_module.file_identity(self.path)
+        write_json({"1": {"amount": 2}}, self.path)
+        os.utime(self.path, ns=(10**18, 10**18))
+        self.assertNotEqual(storage_module.file_identity(self.path), before)
+
+    def test_snapshot(self):
+        self._write({"1": {"date": "05-01-2024", "amount": 1.5}, "2": {"date": "bad", "amount": 2}})
+        with mock.patch.dict(os.environ, {storage_module.SNAPSHOT_ENV: "1"}), mock.patch.object(storage_module, "SNAPSHOT_MIN_BYTES", 0):
+            content = read_json(self.path)
+            self.assertTrue(os.path.exists(self.path + ".snapshot"))
+            storage_module.clear_json_cache()
+            with mock.patch.object(storage_module.json, "load", side_effect=AssertionError("decoded")):
+                self.assertEqual(read_json(self.path), content)
+            self.assertEqual(storage_module.json_cache_stats()["snapshot_hits"], 1)
+            self.assertEqual(storage_module._parsed_dates, {"05-01-2024": datetime(2024, 1, 5)})
+
+            self._write({"1": {"date": "06-01-2024", "amount": 3.0}})
+            storage_module.clear_json_cache()
+            self.assertEqual(read_json(self.path), {"1": {"date": "06-01-2024", "amount": 3.0}})
+            self.assertEqual(storage_module.json_cache_stats()["misses"], 1)
+        storage_module.clear_json_cache()
+        with mock.patch.object(storage_module, "SNAPSHOT_MIN_BYTES", 0):
+            read_json(self.path)
+        self.assertEqual(storage_module.json_cache_stats()["snapshot_hits"], 0)
+
+    def test_parse_date_is_memoized(self):
+        with mock.patch.object(storage_module, "datetime", wraps=datetime) as wrapped:
+            self.assertEqual(storage_module.parse_date("05-01-2024"), datetime(2024, 1, 5))
+            self.assertEqual(storage_module.parse_date("05-01-2024"), datetime(2024, 1, 5))
+            self.assertIsNone(storage_module.parse_date("nope"))
+            self.assertIsNone(storage_module.parse_date("nope"))
+            self.assertIsNone(storage_module.parse_date(["05-01-2024"]))
+        self.assertEqual(wrapped.strptime.call_count, 2)